@@ -3,24 +3,64 @@ import discord
 from discord.ext import commands, tasks
 import json
 import os
+import sys
+import time
 import pathlib
+import atexit
+import io
+import functools
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import re
 import asyncio
 from discord.ui import Button, View, Modal, TextInput
 import requests
 
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))  # project root, for shared/
+from shared import log as shared_log
+from shared.log import get_logger
+from shared.metrics import Counter, Gauge, Registry
+from shared.logstore import (
+    LOCAL_TIMEZONE_OFFSET, LogDictionary, append_binary, archive_closed_days, binary_path, delete_log, list_logs,
+    physical_path, read_raw, stored_size, write_binary, write_json_lines,
+)
+from shared.logtext import append_trimmed, iter_text, text_available, text_file
+from pipeline import EventPipeline
+from log_writer import LogWriter
+from offload import CommandRunner, CommandTimeout
+import scans
+from shared.fuzzy import fuzzy_contains
+from shared.trigram import ensure_index
+from shared.sketch import ensure_sketch, prepare_sketches, range_sketch, stale_sketches
+from shared.timeseries import ensure_series
+from shared.columns import ensure_columns, missing_columns, prepare_columns, snapshot
+from shared.postings import incomplete_days, index_day, index_days, index_entries, open_state, save_state
+from shared.query import QueryError, decode_cursor, finish_page, log_date, page_logs, page_scan, parse_query
+
+logger = get_logger("bot")
+
 # --- CONFIGURATION ---
 TOKEN = os.getenv("TOKEN")
 LOG_CHANNEL_ID = 1430766113721028658
 ALERT_CHANNEL_ID = 1431130781975187537
 IGNORED_CHANNEL_ID = 1462042281258389576
 KEYWORDS = ["jordan", "pudge", "pudgy", "jorganism"]
-FUZZY_TOLERANCE = 2
 GROUP_WINDOW = 10  # seconds to group messages
 GROUP_PRUNE = 60   # seconds after which an inactive group is pruned
-MAX_SEARCH_RESULTS = 200
-LOCAL_TIMEZONE_OFFSET = 11  # UTC+11 for Australian Eastern Daylight Time
+EVENT_WORKERS = int(os.getenv("EVENT_WORKERS", 4))        # workers mirroring events to the log channel
+EVENT_QUEUE_DEPTH = int(os.getenv("EVENT_QUEUE_DEPTH", 500))  # queued jobs per worker before shedding
+ALERT_GROUP_WAIT = 5  # seconds a keyword alert waits for its log embed so it can link to it
+SEARCH_PAGE_SIZE = 10  # !logs search results per page
+MAX_LOG_ENTRIES = 5000  # entries kept per daily log
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "binary" (see shared/logstore.py)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 3))  # days a closed log stays uncompressed; 0 disables archiving
+BINARY_TRIM_SLACK = 500  # binary logs are appended to and trimmed back to MAX_LOG_ENTRIES past this overshoot
+COMMAND_POOL = os.getenv("COMMAND_POOL", "process")  # "process" or "thread" pool for !stats, !top, !logs search
+COMMAND_WORKERS = int(os.getenv("COMMAND_WORKERS", 2))
+COMMAND_TIMEOUT = int(os.getenv("COMMAND_TIMEOUT", 20))  # seconds before a heavy command gives up
+COMMAND_CACHE_TTL = int(os.getenv("COMMAND_CACHE_TTL", 30))  # seconds a heavy command's result is reused
+SHARDED = os.getenv("BOT_SHARDED", "").lower() in ("1", "true", "yes")  # use AutoShardedBot
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None  # None lets Discord decide
 
 # --- PATHS ---
 RAILWAY_DIR = pathlib.Path("/mnt/data")
@@ -39,6 +79,98 @@ BASE_LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 LIVE_MESSAGES_FILE = BASE_LOG_DIR / "live_messages.json"
 MAX_LIVE_MESSAGES = 500  # Keep last 500 messages
+BOT_METRICS_FILE = BASE_LOG_DIR / "bot_metrics.prom"  # read by the web API's /api/metrics
+
+# --- PERF METRICS ---
+metrics = Registry()
+HANDLER_LATENCY = metrics.histogram("bot_handler_duration_seconds", "Time spent in an event handler", ("handler",))
+STAGE_LATENCY = metrics.histogram("bot_stage_duration_seconds", "Time spent in one stage of an event handler", ("handler", "stage"))
+LOOP_LAG = metrics.histogram("bot_event_loop_lag_seconds", "How late the event loop woke a sleeping task")
+GATEWAY_LATENCY = metrics.gauge("bot_gateway_latency_seconds", "Heartbeat latency reported by the gateway", ("shard",))
+SHARD_EVENTS = metrics.counter("bot_shard_events_total", "Gateway events handled per shard", ("shard", "event"))
+LOG_WRITE_BATCH = metrics.histogram("bot_log_write_batch_seconds", "Time the log writer spent on one batch")
+
+@metrics.add_collector
+def logging_metrics():
+    dropped = Counter("bot_log_records_dropped_total", "Log records dropped because the log queue was full")
+    dropped.inc(amount=shared_log.dropped_records)
+    return [dropped]
+
+@metrics.add_collector
+def pipeline_metrics():
+    depth = Gauge("bot_event_queue_depth", "Jobs waiting in the event pipeline", ("lane",))
+    for i, n in enumerate(event_pipeline.depths()):
+        depth.set("priority" if i == event_pipeline.workers else str(i), value=n)
+    counters = Counter("bot_event_jobs_total", "Event pipeline jobs by outcome", ("outcome",))
+    counters.inc("processed", amount=event_pipeline.processed)
+    counters.inc("dropped", amount=event_pipeline.dropped)
+    counters.inc("coalesced", amount=event_pipeline.coalesced)
+    return [depth, counters]
+
+@metrics.add_collector
+def writer_metrics():
+    depth = Gauge("bot_log_writer_queue_depth", "Log entries waiting for the writer thread")
+    depth.set(value=log_writer.depth())
+    entries = Counter("bot_log_writer_entries_total", "Log entries handled by the writer thread", ("outcome",))
+    entries.inc("written", amount=log_writer.written)
+    entries.inc("failed", amount=log_writer.failed)
+    return [depth, entries]
+
+@metrics.add_collector
+def group_cache_metrics():
+    groups = Gauge("bot_group_cache_groups", "Active message groups per shard", ("shard",))
+    for data in list(group_cache.values()):
+        groups.inc(str(data.get("shard_id", 0)))
+    return [groups]
+
+def count_shard_event(guild, event):
+    """Count a gateway event against the shard that delivered it"""
+    SHARD_EVENTS.inc(str(guild.shard_id if guild else 0), event)
+
+@metrics.add_collector
+def command_runner_metrics():
+    results = Counter("bot_command_runs_total", "Heavy command lookups by outcome", ("outcome",))
+    results.inc("cache_hit", amount=command_runner.hits)
+    results.inc("cache_miss", amount=command_runner.misses)
+    results.inc("timeout", amount=command_runner.timeouts)
+    days = Counter("bot_command_scan_days_total", "Days scanned by heavy commands, one pool task each")
+    days.inc(amount=command_runner.scans.partitions)
+    early = Counter("bot_command_scan_early_stops_total", "Scans stopped early after enough results")
+    early.inc(amount=command_runner.scans.stopped_early)
+    return [results, days, early]
+
+QUEUE_WAIT = metrics.histogram("bot_event_queue_wait_seconds", "Time a job waited in the event pipeline", ("lane",))
+LOOP_LAG_INTERVAL = 0.5  # seconds between event loop lag samples
+
+def timed_handler(name):
+    """Record the total time an event handler takes"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+        return wrapper
+    return decorator
+
+@contextmanager
+def timed_stage(handler, stage):
+    """Record the time spent in one stage of a handler (awaits included)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, handler, stage)
+
+async def sample_loop_lag():
+    """Sleep for a fixed interval and record how late the loop wakes us up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG.observe(max(loop.time() - start - LOOP_LAG_INTERVAL, 0.0))
 
 # --- DAILY LOG HELPERS ---
 def get_daily_log_path() -> pathlib.Path:
@@ -63,9 +195,9 @@ def _send_live_message_sync(entry_copy: dict):
         endpoint = f"{api_url}/api/live"
         response = requests.post(endpoint, json=entry_copy, timeout=5)
         if response.status_code != 200:
-            print(f"[� LIVE] API returned status {response.status_code}: {response.text}")
+            logger.warning("Live feed API rejected message", status=response.status_code, body=response.text[:200], sample=20)
     except Exception as e:
-        print(f"[💥] Live messages error: {e}")
+        logger.warning("Live feed post failed", error=str(e), sample=20)
 
 def append_to_live_messages(entry: dict):
     """Send message to web API for live feed (non-blocking)."""
@@ -77,41 +209,126 @@ def append_to_live_messages(entry: dict):
         loop = asyncio.get_event_loop()
         loop.run_in_executor(None, _send_live_message_sync, entry_copy)
     except Exception as e:
-        print(f"[💥] Live messages dispatch error: {e}")
+        logger.error("Live feed dispatch error", error=str(e))
+
+# Only the writer thread touches these
+log_dictionaries = {}  # log path -> LogDictionary
+binary_counts = {}     # log path -> entries stored in its binary log
+posting_states = {}    # log path -> {"dropped", "indexed_from"}, see shared/postings.py
+
+def open_day_log(log_path):
+    """Load a log's dictionary on the first write this run, moving the log to LOG_FORMAT if needed"""
+    if len(log_dictionaries) > 2:
+        # older days are no longer written
+        log_dictionaries.clear()
+        binary_counts.clear()
+        posting_states.clear()
+    current = physical_path(log_path)
+    if LOG_FORMAT == "binary":
+        if current.suffix == ".json" and current.exists():
+            write_binary(binary_path(log_path), read_raw(log_path))
+            current.unlink()
+        binary_counts[log_path] = len(read_raw(log_path))
+    elif current.suffix == ".bin":
+        write_json_lines(log_path, read_raw(log_path))
+        current.unlink()
+    # Entries already in the log and not indexed yet are indexed by index_day() once the day is closed
+    count = binary_counts[log_path] if LOG_FORMAT == "binary" else len(read_raw(log_path))
+    posting_states[log_path] = open_state(BASE_LOG_DIR, log_path.name, count)
+    dictionary = log_dictionaries[log_path] = LogDictionary.load(log_path)
+    return dictionary
+
+def write_log_batch(batch):
+    """Append a batch of (path, entry) pairs. Runs on the log writer thread only."""
+    by_path = {}
+    for log_path, entry in batch:
+        by_path.setdefault(log_path, []).append(entry)
+    for log_path, entries in by_path.items():
+        try:
+            dictionary = log_dictionaries.get(log_path) or open_day_log(log_path)
+            records = [dictionary.compact(entry) for entry in entries]
+            # The dictionary must be on disk before any entry that refers to it
+            if dictionary.dirty:
+                dictionary.save(log_path)
+            if LOG_FORMAT == "binary":
+                before = binary_counts[log_path]
+                count = before + len(records)
+                if count > MAX_LOG_ENTRIES + BINARY_TRIM_SLACK:
+                    stored = read_raw(log_path) + records
+                    # Downloads keep the text of what the trim drops
+                    append_trimmed(log_path, map(dictionary.hydrate, stored[:-MAX_LOG_ENTRIES]))
+                    kept = stored[-MAX_LOG_ENTRIES:]
+                    write_binary(binary_path(log_path), kept)
+                    count = len(kept)
+                else:
+                    append_binary(binary_path(log_path), records)
+                binary_counts[log_path] = count
+            else:
+                logs = load_log(log_path)
+                before = len(logs)
+                logs.extend(records)
+                if len(logs) > MAX_LOG_ENTRIES:
+                    # Downloads keep the text of what the trim drops
+                    append_trimmed(log_path, map(dictionary.hydrate, logs[:-MAX_LOG_ENTRIES]))
+                    logs = logs[-MAX_LOG_ENTRIES:]
+                write_json_lines(log_path, logs)
+                count = len(logs)
+            # Sequence numbers of the new entries, then how many the trim dropped from the front
+            state = posting_states[log_path]
+            first_seq = state["dropped"] + before
+            trimmed = before + len(records) - count
+            if trimmed:
+                state["dropped"] += trimmed
+                save_state(BASE_LOG_DIR, log_path.name, state)
+            index_entries(BASE_LOG_DIR, log_path.name, enumerate(entries, first_seq))
+        except Exception:
+            # Start over from what is on disk next time
+            log_dictionaries.pop(log_path, None)
+            posting_states.pop(log_path, None)
+            logger.exception("Log write error", path=log_path.name, format=LOG_FORMAT)
+
+# The command pool forks its workers first, while this is still the only thread doing anything
+command_runner = CommandRunner(workers=COMMAND_WORKERS, mode=COMMAND_POOL, timeout=COMMAND_TIMEOUT, cache_ttl=COMMAND_CACHE_TTL)
+command_runner.start()
+atexit.register(command_runner.shutdown)
+
+log_writer = LogWriter(write_log_batch, batch_histogram=LOG_WRITE_BATCH)
+log_writer.start()
+atexit.register(log_writer.flush)
+
+def log_generation(log_paths):
+    """Fingerprint of a set of log files that changes whenever one of them is written"""
+    signature = []
+    for lf in log_paths:
+        try:
+            st = physical_path(lf).stat()
+        except OSError:
+            continue
+        signature.append((lf.name, st.st_mtime_ns, st.st_size))
+    return hash(tuple(signature))
 
-def append_log(entry: dict):
+async def run_scan(ctx, command, args, log_paths, fn, *fn_args, max_results=None):
+    """Run a scan off the event loop, one day per worker task, reusing a cached result
+    for the same data. Returns None (after telling the user) if it times out."""
+    key = (command, args, log_generation(log_paths))
     try:
-        log_path = get_daily_log_path()
-        logs = load_log(log_path)
-        logs.append(entry)
-        with open(log_path, "w", encoding="utf-8") as f:
-            json.dump(logs[-5000:], f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"[💥] JSON logging error: {e}")
-    append_log_text(entry)
-    append_to_live_messages(entry)  # Also add to live feed
+        return await command_runner.run(key, fn, [str(lf) for lf in log_paths], *fn_args, max_results=max_results)
+    except CommandTimeout:
+        await ctx.send(f"⏱️ `!{command}` took longer than {COMMAND_TIMEOUT}s and was stopped. Try a narrower query.")
+        return None
 
-def append_log_text(entry: dict):
-    log_file_txt = get_daily_log_path().with_suffix(".txt")
-    log_file_txt.parent.mkdir(parents=True, exist_ok=True)
-    ts = entry.get("readable_time") or entry.get("created_at", "")
-    content = entry.get("content", "(no text)")
-    type_emoji = {"create": "💬", "edit": "✏️", "delete": "🗑️", "reaction": "🔁"}.get(entry.get("type"), "💬")
-    if entry["type"] == "edit":
-        before = entry.get("before", "(no text)")
-        after = content
-        log_line = f"[{ts}] ({entry['channel']}) {entry['author']} {type_emoji}\nBefore: {before}\nAfter : {after}\n\n"
-    elif entry["type"] == "delete":
-        log_line = f"[{ts}] ({entry['channel']}) {entry['author']} {type_emoji}\n{content}\n\n"
-    elif entry["type"] == "reaction":
-        emoji = entry.get("emoji")
-        count = entry.get("count", 0)
-        users = ", ".join(entry.get("users", []))
-        log_line = f"[{ts}] ({entry['channel']}) {entry['author']} {type_emoji}\nReaction: {emoji} x{count} ({users}) on message {entry.get('message_id')}\n\n"
-    else:
-        log_line = f"[{ts}] ({entry['channel']}) {entry['author']} {type_emoji}\n{content}\n\n"
-    with open(log_file_txt, "a", encoding="utf-8") as f:
-        f.write(log_line)
+async def load_snapshot(ctx, command, args):
+    """Columnar snapshot of every daily log (see shared/columns.py), building the columns
+    of days that have none yet on the command runner first. None if that timed out."""
+    log_files = list_logs(BASE_LOG_DIR, "logs_")
+    pending = await asyncio.to_thread(missing_columns, log_files)
+    if pending and await run_scan(ctx, command, args, pending, prepare_columns) is None:
+        return None
+    return await asyncio.to_thread(snapshot, log_files)
+
+def append_log(entry: dict):
+    log_writer.submit(get_daily_log_path(), entry)
+    append_to_live_messages(entry)  # Also add to live feed
 
 # --- DISCORD SETUP ---
 intents = discord.Intents.default()
@@ -120,49 +337,20 @@ intents.guilds = True
 intents.members = True
 intents.reactions = True
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+if SHARDED:
+    # All shards run in this process and share the caches, pipeline and log writer
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, help_command=None, shard_count=SHARD_COUNT)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
 bot_start_time = datetime.utcnow()
+event_pipeline = EventPipeline(workers=EVENT_WORKERS, max_depth=EVENT_QUEUE_DEPTH, wait_histogram=QUEUE_WAIT)
 
-# --- FUZZY HELPERS ---
-def levenshtein(a, b):
-    if len(a) < len(b):
-        return levenshtein(b, a)
-    if len(b) == 0:
-        return len(a)
-    previous_row = range(len(b) + 1)
-    for i, ca in enumerate(a):
-        current_row = [i + 1]
-        for j, cb in enumerate(b):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (ca != cb)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    return previous_row[-1]
-
-def fuzzy_contains(text, keyword, tolerance=FUZZY_TOLERANCE):
-    """Check if keyword appears in text with fuzzy matching, respecting word boundaries"""
-    text = (text or "").lower()
-    keyword = (keyword or "").lower()
-    if len(keyword) == 0 or len(text) < len(keyword):
-        return False
-    
-    # Split text into words (alphanumeric sequences)
-    words = re.findall(r'\b\w+\b', text)
-    
-    # Check each word for exact or fuzzy match
-    for word in words:
-        # Exact match
-        if keyword == word:
-            return True
-        # Fuzzy match only if word length is close to keyword length
-        # AND the first character matches (prevents "dude" matching "pudge")
-        if abs(len(word) - len(keyword)) <= tolerance:
-            if word[0] == keyword[0] and levenshtein(word, keyword) <= tolerance:
-                return True
-    
-    return False
+async def setup_hook():
+    event_pipeline.start()
+
+bot.setup_hook = setup_hook
 
+# --- FUZZY HELPERS ---
 def fuzzy_match(text: str, keywords: list[str]) -> bool:
     if not text:
         return False
@@ -184,6 +372,8 @@ def find_image_url(text: str):
     return match.group(1) if match else None
 
 # --- GROUPING CACHE & MAPPINGS ---
+# Channel IDs are unique across guilds, so one cache serves every shard; each
+# group records its shard_id for per-shard metrics
 group_cache = {}  # (author_id, channel_id) -> data
 message_to_group = {}  # message_id -> (group_key, index)
 channel_last_author = {}  # channel_id -> (author_id, message_id, timestamp) to prevent grouping across other authors
@@ -275,7 +465,8 @@ def build_group_embed(group_key):
 async def add_message_to_group(message: discord.Message):
     group_key = (message.author.id, message.channel.id)
     now = datetime.utcnow()
-    entry = await build_entry_from_message(message)
+    with timed_stage("add_message_to_group", "build_entry"):
+        entry = await build_entry_from_message(message)
     thumbnail = message.author.avatar.url if message.author.avatar else None
 
     # check channel last author to prevent grouping across other users
@@ -310,18 +501,19 @@ async def add_message_to_group(message: discord.Message):
         try:
             log_chan = bot.get_channel(existing["log_channel_id"])
             if log_chan:
-                log_msg = await log_chan.fetch_message(existing["log_message_id"])
-                existing["thumbnail"] = thumbnail
-                result = build_group_embed(group_key)
-                if result:
-                    new_embed, image_url = result
-                    await log_msg.edit(embed=new_embed)
-                # Send all attachment URLs from the new message as plain text for Discord auto-embedding
-                if entry["attachments"]:
-                    for aurl in entry["attachments"]:
-                        await log_chan.send(aurl)
+                with timed_stage("add_message_to_group", "rest_update"):
+                    log_msg = await log_chan.fetch_message(existing["log_message_id"])
+                    existing["thumbnail"] = thumbnail
+                    result = build_group_embed(group_key)
+                    if result:
+                        new_embed, image_url = result
+                        await log_msg.edit(embed=new_embed)
+                    # Send all attachment URLs from the new message as plain text for Discord auto-embedding
+                    if entry["attachments"]:
+                        for aurl in entry["attachments"]:
+                            await log_chan.send(aurl)
         except Exception as e:
-            print(f"[💥] update group embed error: {e}")
+            logger.warning("Update group embed error", error=str(e))
     else:
         # start new group
         group_cache[group_key] = {
@@ -333,6 +525,7 @@ async def add_message_to_group(message: discord.Message):
             "image_url": None,
             "channel_name": message.channel.name,
             "guild": message.guild,
+            "shard_id": message.guild.shard_id if message.guild else 0,
             "author_id": message.author.id,
         }
         if entry["attachments"]:
@@ -356,15 +549,16 @@ async def add_message_to_group(message: discord.Message):
             return
         try:
             embed, image_url = result
-            sent = await log_chan.send(embed=embed)
-            # Send all attachment URLs as plain text for Discord auto-embedding
-            if entry["attachments"]:
-                for aurl in entry["attachments"]:
-                    await log_chan.send(aurl)
+            with timed_stage("add_message_to_group", "rest_send"):
+                sent = await log_chan.send(embed=embed)
+                # Send all attachment URLs as plain text for Discord auto-embedding
+                if entry["attachments"]:
+                    for aurl in entry["attachments"]:
+                        await log_chan.send(aurl)
             group_cache[group_key]["log_message_id"] = sent.id
             message_to_group[message.id] = (group_key, 0)
         except Exception as e:
-            print(f"[💥] send group embed error: {e}")
+            logger.warning("Send group embed error", error=str(e))
 
     # update last author tracker for the channel
     channel_last_author[message.channel.id] = (message.author.id, message.id, now)
@@ -390,10 +584,43 @@ async def before_prune():
     await bot.wait_until_ready()
 
 # --- EVENTS: message / edit / delete / reactions ---
+async def send_keyword_alert(message: discord.Message, grouped: asyncio.Future):
+    """Post a keyword alert, linking to the message's log embed once it exists"""
+    try:
+        await asyncio.wait_for(asyncio.shield(grouped), ALERT_GROUP_WAIT)
+    except asyncio.TimeoutError:
+        pass
+    alert = discord.Embed(
+        title="🚨 Keyword Detected!",
+        description=f"**[{message.author}]** mentioned a watched term in <#{message.channel.id}>:\n\n> {message.content}"[:4000],
+        color=discord.Color.red(),
+        timestamp=message.created_at
+    )
+    alert.set_thumbnail(url=message.author.avatar.url if message.author.avatar else None)
+    alert.set_footer(text=f"Detected at {datetime.utcnow().strftime('%H:%M:%S UTC')}")
+    alert_channel = bot.get_channel(ALERT_CHANNEL_ID)
+    if alert_channel:
+        # Try to get the log message URL instead of original message
+        log_url = message.jump_url  # fallback to original
+        group_info = message_to_group.get(message.id)
+        if group_info:
+            group_key, _ = group_info
+            group_data = group_cache.get(group_key)
+            if group_data and group_data.get("log_message_id") and group_data.get("log_channel_id"):
+                # Build jump URL to log channel message
+                log_url = f"https://discord.com/channels/{message.guild.id}/{group_data['log_channel_id']}/{group_data['log_message_id']}"
+        
+        jump_button = Button(label="Jump to Log", style=discord.ButtonStyle.link, url=log_url)
+        view = View(); view.add_item(jump_button)
+        with timed_stage("send_keyword_alert", "rest_alert"):
+            await alert_channel.send(embed=alert, view=view)
+
 @bot.event
+@timed_handler("on_message")
 async def on_message(message: discord.Message):
     if message.author.bot or not message.guild:
         return
+    count_shard_event(message.guild, "message")
     
     if message.channel.id == IGNORED_CHANNEL_ID:
         await bot.process_commands(message)
@@ -421,45 +648,42 @@ async def on_message(message: discord.Message):
         "type": "create",
         "attachments": [a.url for a in message.attachments],
     }
-    append_log(entry)
-    await add_message_to_group(message)
+    if message.reference and getattr(message.reference, "message_id", None):
+        entry["reply_to"] = message.reference.message_id  # reply edge, see shared/postings.py
+    with timed_stage("on_message", "append_log"):
+        append_log(entry)
+
+    # Mirroring to the log channel is routine work and may be shed under load;
+    # `grouped` lets a keyword alert wait for the log embed it links to
+    grouped = asyncio.get_running_loop().create_future()
+    async def group_message():
+        try:
+            with timed_stage("on_message", "add_message_to_group"):
+                await add_message_to_group(message)
+        finally:
+            if not grouped.done():
+                grouped.set_result(None)
+    if not event_pipeline.submit(message.channel.id, group_message):
+        grouped.set_result(None)
 
     # KEYWORD ALERT: only when there is non-link text and no attachments
     has_attachments = len(message.attachments) > 0
     content_lower = (message.content or "").strip().lower()
     looks_like_link = bool(re.match(r"^https?://\S+$", content_lower))
     has_text = bool(content_lower and not looks_like_link)
-    if has_text and not has_attachments and fuzzy_match(message.content, KEYWORDS):
-        alert = discord.Embed(
-            title="🚨 Keyword Detected!",
-            description=f"**[{message.author}]** mentioned a watched term in <#{message.channel.id}>:\n\n> {message.content}"[:4000],
-            color=discord.Color.red(),
-            timestamp=message.created_at
-        )
-        alert.set_thumbnail(url=message.author.avatar.url if message.author.avatar else None)
-        alert.set_footer(text=f"Detected at {datetime.utcnow().strftime('%H:%M:%S UTC')}")
-        alert_channel = bot.get_channel(ALERT_CHANNEL_ID)
-        if alert_channel:
-            # Try to get the log message URL instead of original message
-            log_url = message.jump_url  # fallback to original
-            group_info = message_to_group.get(message.id)
-            if group_info:
-                group_key, _ = group_info
-                group_data = group_cache.get(group_key)
-                if group_data and group_data.get("log_message_id") and group_data.get("log_channel_id"):
-                    # Build jump URL to log channel message
-                    log_url = f"https://discord.com/channels/{message.guild.id}/{group_data['log_channel_id']}/{group_data['log_message_id']}"
-            
-            jump_button = Button(label="Jump to Log", style=discord.ButtonStyle.link, url=log_url)
-            view = View(); view.add_item(jump_button)
-            await alert_channel.send(embed=alert, view=view)
+    with timed_stage("on_message", "fuzzy_match"):
+        matched = has_text and not has_attachments and fuzzy_match(message.content, KEYWORDS)
+    if matched:
+        event_pipeline.submit(message.channel.id, lambda: send_keyword_alert(message, grouped), priority=True)
 
     await bot.process_commands(message)
 
 @bot.event
+@timed_handler("on_message_edit")
 async def on_message_edit(before, after):
     if before.author.bot:
         return
+    count_shard_event(before.guild, "edit")
     
     if before.channel.id == IGNORED_CHANNEL_ID:
         return
@@ -499,7 +723,12 @@ async def on_message_edit(before, after):
         "type": "edit",
         "before": before.content or "(no text)"
     }
-    append_log(entry)
+    with timed_stage("on_message_edit", "append_log"):
+        append_log(entry)
+    event_pipeline.submit(before.channel.id, lambda: mirror_edit(before, after), coalesce_key=("edit", before.id))
+
+async def mirror_edit(before, after):
+    """Update the grouped log embed for an edit, or post a standalone edit embed"""
     mg = message_to_group.get(before.id)
     if mg:
         group_key, idx = mg
@@ -515,7 +744,7 @@ async def on_message_edit(before, after):
                     new_embed, image_url = result
                     await log_msg.edit(embed=new_embed)
             except Exception as e:
-                print(f"[💥] update on edit error: {e}")
+                logger.warning("Update embed on edit error", error=str(e))
     else:
         log_channel = bot.get_channel(LOG_CHANNEL_ID)
         if log_channel:
@@ -553,9 +782,11 @@ async def on_message_edit(before, after):
                 await log_channel.send(url)
 
 @bot.event
+@timed_handler("on_message_delete")
 async def on_message_delete(message):
     if message.author.bot:
         return
+    count_shard_event(message.guild, "delete")
     
     if message.channel.id == IGNORED_CHANNEL_ID:
         return
@@ -591,8 +822,12 @@ async def on_message_delete(message):
         "type": "delete",
         "attachments": [att.url for att in message.attachments] if message.attachments else [],
     }
-    append_log(entry)
-    
+    with timed_stage("on_message_delete", "append_log"):
+        append_log(entry)
+    event_pipeline.submit(message.channel.id, lambda: mirror_delete(message))
+
+async def mirror_delete(message):
+    """Post a deleted-message embed (and its attachments) to the log channel"""
     # Always create a NEW embed for deleted messages (don't edit the original)
     log_channel = bot.get_channel(LOG_CHANNEL_ID)
     if log_channel:
@@ -648,18 +883,46 @@ async def on_message_delete(message):
             for url in embed_urls:
                 await log_channel.send(url)
         except Exception as e:
-            print(f"[💥] send delete embed error: {e}")
+            logger.warning("Send delete embed error", error=str(e))
 
 # --- REACTIONS ---
-async def update_reaction_on_embed(message: discord.Message, reaction: discord.Reaction):
-    mg = message_to_group.get(message.id)
+async def reaction_user_names(handler, reaction: discord.Reaction):
     try:
-        users = [u async for u in reaction.users()]
-        user_names = [str(u) for u in users if not u.bot][:5]
+        with timed_stage(handler, "fetch_users"):
+            users = [u async for u in reaction.users()]
+        return [str(u) for u in users if not u.bot][:5]
     except Exception:
-        user_names = []
-    emoji = str(reaction.emoji)
-    count = reaction.count
+        return []
+
+def log_reaction(message: discord.Message, emoji, count, user_names):
+    # Get role color
+    role_color = None
+    if message.guild and isinstance(message.author, discord.Member):
+        if message.author.top_role and message.author.top_role.color.value != 0:
+            role_color = f"#{message.author.top_role.color.value:06x}"
+    
+    entry = {
+        "id": message.id,
+        "author": str(message.author),
+        "author_display": message.author.display_name,
+        "author_id": message.author.id,
+        "avatar_url": message.author.display_avatar.url,
+        "role_color": role_color,
+        "content": message.content,
+        "channel": message.channel.name,
+        "created_at": datetime.utcnow().isoformat(),
+        "readable_time": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
+        "type": "reaction",
+        "emoji": emoji,
+        "count": count,
+        "users": user_names,
+        "message_id": message.id
+    }
+    append_log(entry)
+
+async def update_reaction_on_embed(message: discord.Message, emoji, count, user_names):
+    """Update the grouped log embed for a reaction, or post a standalone reaction embed"""
+    mg = message_to_group.get(message.id)
     if mg:
         group_key, idx = mg
         data = group_cache.get(group_key)
@@ -675,32 +938,8 @@ async def update_reaction_on_embed(message: discord.Message, reaction: discord.R
                 new_embed, image_url = result
                 await log_msg.edit(embed=new_embed)
         except Exception as e:
-            print(f"[💥] update reaction embed error: {e}")
+            logger.warning("Update reaction embed error", error=str(e))
     else:
-        # Get role color
-        role_color = None
-        if message.guild and isinstance(message.author, discord.Member):
-            if message.author.top_role and message.author.top_role.color.value != 0:
-                role_color = f"#{message.author.top_role.color.value:06x}"
-        
-        entry = {
-            "id": message.id,
-            "author": str(message.author),
-            "author_display": message.author.display_name,
-            "author_id": message.author.id,
-            "avatar_url": message.author.display_avatar.url,
-            "role_color": role_color,
-            "content": message.content,
-            "channel": message.channel.name,
-            "created_at": datetime.utcnow().isoformat(),
-            "readable_time": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-            "type": "reaction",
-            "emoji": emoji,
-            "count": count,
-            "users": user_names,
-            "message_id": message.id
-        }
-        append_log(entry)
         log_channel = bot.get_channel(LOG_CHANNEL_ID)
         if log_channel:
             embed = discord.Embed(title="🔁 Reaction Update", color=discord.Color.orange(), timestamp=datetime.utcnow())
@@ -709,29 +948,96 @@ async def update_reaction_on_embed(message: discord.Message, reaction: discord.R
             embed.set_footer(text=f"#{message.channel.name}")
             await log_channel.send(embed=embed)
 
+async def handle_reaction(handler, reaction: discord.Reaction):
+    """Log a reaction change (messages outside a group only) and queue its embed update"""
+    message = reaction.message
+    count_shard_event(message.guild, "reaction")
+    emoji, count = str(reaction.emoji), reaction.count
+    user_names = await reaction_user_names(handler, reaction)
+    if message.id not in message_to_group:
+        with timed_stage(handler, "append_log"):
+            log_reaction(message, emoji, count, user_names)
+    event_pipeline.submit(message.channel.id, lambda: update_reaction_on_embed(message, emoji, count, user_names),
+                          coalesce_key=("reaction", message.id, emoji))
+
 @bot.event
+@timed_handler("on_reaction_add")
 async def on_reaction_add(reaction, user):
     if user.bot:
         return
-    message = reaction.message
-    await update_reaction_on_embed(message, reaction)
+    await handle_reaction("on_reaction_add", reaction)
 
 
 @bot.event
+@timed_handler("on_reaction_remove")
 async def on_reaction_remove(reaction, user):
     if user.bot:
         return
-    message = reaction.message
-    await update_reaction_on_embed(message, reaction)
+    await handle_reaction("on_reaction_remove", reaction)
+
+# --- METRICS EXPORT ---
+def shard_latencies():
+    """(shard_id, latency) for every shard, or for the single connection"""
+    if SHARDED:
+        return bot.latencies
+    return [(bot.shard_id or 0, bot.latency)]
+
+def write_metrics_snapshot(text):
+    """Atomically replace the metrics file the web API serves"""
+    tmp = BOT_METRICS_FILE.with_suffix(".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, BOT_METRICS_FILE)
+
+@tasks.loop(seconds=15)
+async def export_metrics():
+    for shard_id, latency in shard_latencies():
+        if latency == latency:  # NaN until the first heartbeat
+            GATEWAY_LATENCY.set(str(shard_id), value=round(latency, 4))
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, write_metrics_snapshot, metrics.render())
+    except Exception as e:
+        logger.error("Metrics export error", error=str(e))
+
+# --- LOG ARCHIVING ---
+@tasks.loop(hours=6)
+async def archive_logs():
+    """Move daily logs older than ARCHIVE_AFTER_DAYS into compressed monthly archives"""
+    cutoff = datetime.utcnow() + timedelta(hours=LOCAL_TIMEZONE_OFFSET) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    try:
+        archived = await asyncio.to_thread(archive_closed_days, BASE_LOG_DIR, cutoff.strftime("logs_%Y-%m-%d.json"))
+        if archived:
+            logger.info("Archived daily logs", count=len(archived), first=archived[0], last=archived[-1])
+            # Index, sketch, count and post the archived days now rather than on the first request that needs them
+            for name in archived:
+                await asyncio.to_thread(ensure_index, BASE_LOG_DIR / name)
+                await asyncio.to_thread(ensure_sketch, BASE_LOG_DIR / name)
+                await asyncio.to_thread(ensure_series, BASE_LOG_DIR / name)
+                await asyncio.to_thread(ensure_columns, BASE_LOG_DIR / name)
+                await asyncio.to_thread(index_day, BASE_LOG_DIR / name)
+    except Exception:
+        logger.exception("Log archiving error")
 
 # --- PRUNE START ---
+loop_lag_task = None
+
 @bot.event
 async def on_ready():
+    global loop_lag_task
     if not prune_groups.is_running():
         prune_groups.start()
+    if not export_metrics.is_running():
+        export_metrics.start()
+    if ARCHIVE_AFTER_DAYS > 0 and not archive_logs.is_running():
+        archive_logs.start()
+    if loop_lag_task is None:
+        loop_lag_task = asyncio.create_task(sample_loop_lag())
     guild_list = ', '.join(f"{g.name} ({g.member_count} members)" for g in bot.guilds)
-    print(f"[✅] Logged in as {bot.user} (ID: {bot.user.id})")
-    print(f"[✅] Connected to {len(bot.guilds)} guild(s): {guild_list}")
+    logger.info("Logged in", user=str(bot.user), id=bot.user.id)
+    logger.info("Connected to guilds", count=len(bot.guilds), guilds=guild_list, shards=bot.shard_count or 1)
+
+@bot.event
+async def on_shard_ready(shard_id):
+    logger.info("Shard ready", shard=shard_id)
 
 # --- LOG COMMANDS (list/download/search) ---
 @bot.command(name="ping")
@@ -742,6 +1048,53 @@ async def ping(ctx):
     minutes, seconds = divmod(remainder, 60)
     await ctx.send(f"🏓 Pong! **{latency_ms}ms** latency • Uptime: **{hours}h {minutes}m {seconds}s**")
 
+def format_percentiles(histogram, *labels):
+    """Format count and p50/p95/p99 of a histogram series in milliseconds"""
+    parts = []
+    for q in (0.5, 0.95, 0.99):
+        v = histogram.quantile(q, *labels)
+        parts.append(f"p{int(q * 100)} {v * 1000:.1f}ms" if v is not None else f"p{int(q * 100)} -")
+    return f"n={histogram.count(*labels)} • " + " • ".join(parts)
+
+@bot.command(name="perf")
+async def perf(ctx):
+    """Show latency percentiles for event handlers, their stages and the event loop."""
+    embed = discord.Embed(title="⏱️ Bot Performance", color=discord.Color.blurple())
+    handlers = HANDLER_LATENCY.label_sets()
+    embed.add_field(
+        name="Handlers",
+        value="\n".join(f"`{h}` {format_percentiles(HANDLER_LATENCY, h)}" for (h,) in handlers) or "No events yet",
+        inline=False
+    )
+    stages = STAGE_LATENCY.label_sets()
+    if stages:
+        lines = [f"`{h}.{st}` {format_percentiles(STAGE_LATENCY, h, st)}" for h, st in stages]
+        embed.add_field(name="Stages", value="\n".join(lines)[:1024], inline=False)
+    embed.add_field(name="Event Loop Lag", value=format_percentiles(LOOP_LAG), inline=False)
+    depths = event_pipeline.depths()
+    embed.add_field(
+        name="Event Pipeline",
+        value=(f"Queued {sum(depths[:-1])} routine / {depths[-1]} alerts • "
+               f"processed {event_pipeline.processed} • dropped {event_pipeline.dropped} • coalesced {event_pipeline.coalesced}\n"
+               f"Queue wait (routine) {format_percentiles(QUEUE_WAIT, 'routine')}"),
+        inline=False
+    )
+    embed.add_field(
+        name="Heavy Commands",
+        value=(f"Cache hits {command_runner.hits} • misses {command_runner.misses} • timeouts {command_runner.timeouts}\n"
+               f"Days scanned {command_runner.scans.partitions} • stopped early {command_runner.scans.stopped_early}"),
+        inline=False
+    )
+    embed.add_field(name="Log Writer", value=f"Queued {log_writer.depth()} • written {log_writer.written} • failed {log_writer.failed}", inline=False)
+    if SHARDED:
+        embed.add_field(
+            name="Shards",
+            value="\n".join(f"`{sid}` {round(lat * 1000)}ms" for sid, lat in shard_latencies())[:1024],
+            inline=False
+        )
+    embed.set_footer(text=f"Gateway latency {round(bot.latency * 1000)}ms")
+    await ctx.send(embed=embed)
+
 @bot.command(name="help")
 async def custom_help(ctx):
     embed = discord.Embed(
@@ -750,7 +1103,7 @@ async def custom_help(ctx):
     )
     embed.add_field(
         name="📡 General",
-        value="`!ping` — Latency & uptime\n`!help` — This message\n`!inviteme` — Invite links for all servers",
+        value="`!ping` — Latency & uptime\n`!perf` — Handler latency percentiles\n`!help` — This message\n`!inviteme` — Invite links for all servers",
         inline=False
     )
     embed.add_field(
@@ -758,7 +1111,8 @@ async def custom_help(ctx):
         value=(
             "`!logs list [page]` — Browse available logs\n"
             "`!logs download <YYYY-MM-DD|today|name>` — Download a log file\n"
-            "`!logs search <term>` — Search across all logs\n"
+            "`!logs search <query>` — Search across all logs; words, `\"phrases\"`, `~fuzzy`, "
+            "`author:` `channel:` `type:edit|delete` `after:`/`before:YYYY-MM-DD` `has:attachment`\n"
             "`!logs prune <name>` — Delete a custom log\n"
             "`!logs delete <name>` — Alias for prune"
         ),
@@ -783,7 +1137,7 @@ async def on_command_error(ctx, error):
     elif isinstance(error, commands.CommandNotFound):
         pass  # Silently ignore unknown commands
     else:
-        print(f"[💥] Command error in {ctx.command}: {error}")
+        logger.error("Command error", command=str(ctx.command), error=str(error))
 
 @bot.group(invoke_without_command=True)
 async def logs(ctx):
@@ -861,7 +1215,7 @@ def create_logs_list_page(files, page, total_pages, ctx):
     
     for f in page_files:
         date_str = f.stem.replace("logs_", "").replace("custom_", "")
-        size_kb = f.stat().st_size // 1024
+        size_kb = stored_size(f) // 1024
         embed.add_field(name=f"🗓️ {date_str}", value=f"{size_kb} KB - Use `!logs download {date_str}`", inline=False)
     
     view = LogsListView(ctx, files, page, total_pages)
@@ -870,8 +1224,8 @@ def create_logs_list_page(files, page, total_pages, ctx):
 @logs.command(name="list")
 async def logs_list(ctx, page: int = 1):
     try:
-        files = sorted(BASE_LOG_DIR.glob("logs_*.txt"), reverse=True)
-        custom = sorted(BASE_LOG_DIR.glob("custom_*.txt"), reverse=True)
+        files = list_logs(BASE_LOG_DIR, "logs_")[::-1]
+        custom = list_logs(BASE_LOG_DIR, "custom_")[::-1]
         files = files + custom
         if not files:
             await ctx.send("No logs found yet.")
@@ -888,51 +1242,76 @@ async def logs_list(ctx, page: int = 1):
         await ctx.send(embed=embed, view=view)
     except Exception as e:
         await ctx.send(f"❌ Error: {e}")
-        print(f"[💥] logs list error: {e}")
+        logger.exception("logs list error")
 
 @logs.command(name="download")
 async def logs_download(ctx, date: str = None):
     if date is None or date.lower() == "today":
-        log_file_txt = get_daily_log_path().with_suffix(".txt")
+        log_path = get_daily_log_path()
     else:
         # Try as a date first
         try:
             datetime.strptime(date, "%Y-%m-%d")
-            log_file_txt = BASE_LOG_DIR / f"logs_{date}.txt"
+            log_path = BASE_LOG_DIR / f"logs_{date}.json"
         except ValueError:
             # Fall back to custom log name
-            log_file_txt = BASE_LOG_DIR / f"custom_{date}.txt"
-    if not log_file_txt.exists():
+            log_path = BASE_LOG_DIR / f"custom_{date}.json"
+    if not text_available(log_path):
         await ctx.send(f"No log file found for `{date or 'today'}`. Use `!logs list` to see available logs.")
         return
-    await ctx.send(file=discord.File(log_file_txt, filename=f"{log_file_txt.stem}.txt"))
+    # Text is rendered from the log on demand; closed days are rendered once and cached
+    closed = log_path != get_daily_log_path()
+    text_path = await asyncio.to_thread(text_file, log_path, closed)
+    if text_path:
+        await ctx.send(file=discord.File(text_path, filename=f"{log_path.stem}.txt"))
+    else:
+        text = await asyncio.to_thread(lambda: "".join(iter_text(log_path)))
+        await ctx.send(file=discord.File(io.BytesIO(text.encode("utf-8")), filename=f"{log_path.stem}.txt"))
+
+async def search_page(channel, term, cursor=None):
+    """One page of !logs search results and the cursor of the next page, or None if the
+    scan timed out (after telling the channel). Raises QueryError for a bad query."""
+    start = None
+    if cursor:
+        term, log_name, skip = decode_cursor(cursor)
+        start = (log_name, skip)
+    query = parse_query(term)
+    # search both daily and custom JSON logs, minus days outside after:/before:
+    log_files = page_logs(query, list_logs(BASE_LOG_DIR), start)
+    results = await run_scan(channel, "logs search", (term, cursor), log_files, page_scan, query, start,
+                             SEARCH_PAGE_SIZE + 1, max_results=SEARCH_PAGE_SIZE + 1)
+    if results is None:
+        return None
+    return finish_page(term, results, SEARCH_PAGE_SIZE, start)
 
 class SearchResultsView(View):
-    def __init__(self, results, term, current_page, total_pages):
+    """One page of search results. Holds only cursors: each page is fetched when asked for."""
+
+    def __init__(self, term, results, page_cursors, next_cursor):
         super().__init__(timeout=300)
-        self.results = results
         self.term = term
-        self.current_page = current_page
-        self.total_pages = total_pages
+        self.results = results              # this page only
+        self.page_cursors = page_cursors    # start cursor of every page up to this one (None for the first)
+        self.next_cursor = next_cursor
 
-        prev_btn = Button(label="◀ Previous", style=discord.ButtonStyle.primary, disabled=(current_page <= 1))
+        prev_btn = Button(label="◀ Previous", style=discord.ButtonStyle.primary, disabled=(len(page_cursors) <= 1))
         prev_btn.callback = self.previous_page
         self.add_item(prev_btn)
 
-        next_btn = Button(label="Next ▶", style=discord.ButtonStyle.primary, disabled=(current_page >= total_pages))
+        next_btn = Button(label="Next ▶", style=discord.ButtonStyle.primary, disabled=(next_cursor is None))
         next_btn.callback = self.next_page
         self.add_item(next_btn)
 
-    def _make_embed(self, page):
-        per_page = 10
-        start = (page - 1) * per_page
-        end = start + per_page
+    def make_embed(self):
+        page = len(self.page_cursors)
+        first = (page - 1) * SEARCH_PAGE_SIZE + 1
+        more = " (more on the next page)" if self.next_cursor else ""
         embed = discord.Embed(
-            title=f"🔍 Results for '{self.term}' (Page {page}/{self.total_pages})",
-            description=f"{len(self.results)} results found",
+            title=f"🔍 Results for '{self.term}' (Page {page})",
+            description=f"Results {first}–{first + len(self.results) - 1}{more}",
             color=discord.Color.green()
         )
-        for r in self.results[start:end]:
+        for r in self.results:
             try:
                 ts = datetime.fromisoformat(r["created_at"]).strftime("%H:%M:%S")
             except Exception:
@@ -942,17 +1321,27 @@ class SearchResultsView(View):
             embed.add_field(name=field_name, value=f"[{ts}] {snippet}"[:1024], inline=False)
         return embed
 
+    async def _show(self, interaction, page_cursors):
+        # Scans can outlast the 3s interaction deadline, so acknowledge first
+        await interaction.response.defer()
+        try:
+            page = await search_page(interaction.channel, self.term, page_cursors[-1])
+        except QueryError:
+            return
+        if page is None:
+            return
+        results, next_cursor = page
+        view = SearchResultsView(self.term, results, page_cursors, next_cursor)
+        self.stop()
+        await interaction.edit_original_response(embed=view.make_embed(), view=view)
+
     async def previous_page(self, interaction: discord.Interaction):
-        if self.current_page > 1:
-            self.current_page -= 1
-            view = SearchResultsView(self.results, self.term, self.current_page, self.total_pages)
-            await interaction.response.edit_message(embed=view._make_embed(self.current_page), view=view)
+        if len(self.page_cursors) > 1:
+            await self._show(interaction, self.page_cursors[:-1])
 
     async def next_page(self, interaction: discord.Interaction):
-        if self.current_page < self.total_pages:
-            self.current_page += 1
-            view = SearchResultsView(self.results, self.term, self.current_page, self.total_pages)
-            await interaction.response.edit_message(embed=view._make_embed(self.current_page), view=view)
+        if self.next_cursor is not None:
+            await self._show(interaction, self.page_cursors + [self.next_cursor])
 
 @logs.command(name="search")
 async def logs_search(ctx, *, term: str = None):
@@ -961,26 +1350,22 @@ async def logs_search(ctx, *, term: str = None):
             await ctx.send("❌ Please provide a search term: `!logs search <term>`")
             return
         async with ctx.typing():
-            results = []
-            # search both daily and custom JSON logs
-            for log_file in sorted(BASE_LOG_DIR.glob("*.json")):
-                data = load_log(log_file)
-                for entry in data:
-                    if fuzzy_contains(entry.get("content", ""), term):
-                        results.append(entry)
-                if len(results) > MAX_SEARCH_RESULTS:
-                    break
+            page = await search_page(ctx, term)
+            if page is None:
+                return
+            results, next_cursor = page
             if not results:
                 await ctx.send(f"No results found for `{term}`.")
                 return
+    except QueryError as e:
+        await ctx.send(f"❌ {e}")
+        return
     except Exception as e:
         await ctx.send(f"❌ Error: {e}")
-        print(f"[💥] logs search error: {e}")
+        logger.exception("logs search error")
         return
-    per_page = 10
-    total_pages = max(1, (len(results) + per_page - 1) // per_page)
-    view = SearchResultsView(results, term, 1, total_pages)
-    await ctx.send(embed=view._make_embed(1), view=view)
+    view = SearchResultsView(term, results, [None], next_cursor)
+    await ctx.send(embed=view.make_embed(), view=view)
 
 # --- CUSTOM LOG CREATION AND PRUNING ---
 @bot.command(name="create")
@@ -1056,23 +1441,13 @@ async def create_custom_log(ctx, subcommand=None, amount: int = None, name: str
 @logs.command(name="prune")
 @commands.has_permissions(manage_messages=True)
 async def logs_prune(ctx, *, name: str):
-    removed = False
-    for ext in [".json", ".txt"]:
-        p = BASE_LOG_DIR / f"custom_{name}{ext}"
-        if p.exists():
-            p.unlink()
-            removed = True
+    removed = await asyncio.to_thread(delete_log, BASE_LOG_DIR / f"custom_{name}.json")
     await ctx.send(f"{'🗑️ Deleted' if removed else '❌ No such log found'} `{name}`")
 
 @logs.command(name="delete")
 @commands.has_permissions(manage_messages=True)
 async def logs_delete(ctx, *, name: str):
-    removed = False
-    for ext in [".json", ".txt"]:
-        p = BASE_LOG_DIR / f"custom_{name}{ext}"
-        if p.exists():
-            p.unlink()
-            removed = True
+    removed = await asyncio.to_thread(delete_log, BASE_LOG_DIR / f"custom_{name}.json")
     await ctx.send(f"{'🗑️ Deleted' if removed else '❌ No such log found'} `{name}`")
 
 # --- INVITE COMMAND ---
@@ -1211,41 +1586,51 @@ async def serverinfo(ctx):
 
 # --- TOP / LEADERBOARD COMMAND ---
 @bot.command(name="top")
-async def top_users(ctx, period: str = "today"):
-    """Show most active users. Usage: !top [today|week|all]"""
-    from collections import Counter
-    counter = Counter()
+async def top_users(ctx, period: str = "today", mode: str = None):
+    """Show most active users. Usage: !top [today|week|all] [approx]
+    approx answers week and all from the per-day sketches instead of scanning the logs."""
     if period == "all":
-        log_files = sorted(BASE_LOG_DIR.glob("logs_*.json"))
+        log_files = list_logs(BASE_LOG_DIR, "logs_")
     elif period == "week":
-        log_files = sorted(BASE_LOG_DIR.glob("logs_*.json"))[-7:]
+        log_files = list_logs(BASE_LOG_DIR, "logs_")[-7:]
     else:
         log_files = [get_daily_log_path()]
-    for lf in log_files:
-        if lf.exists():
-            data = load_log(lf)
-            for entry in data:
-                if entry.get("type") == "create":
-                    counter[entry.get("author_display") or entry.get("author", "Unknown")] += 1
-    if not counter:
+    approx = mode == "approx" and period in ("all", "week")
+    sketch = None
+    async with ctx.typing():
+        if approx:
+            pending = await asyncio.to_thread(stale_sketches, log_files)
+            if pending and await run_scan(ctx, "top", (period, mode), pending, prepare_sketches) is None:
+                return
+            sketch = await asyncio.to_thread(range_sketch, log_files)
+            top10 = sketch.top("users", 10)
+        else:
+            cols = await load_snapshot(ctx, "top", (period,))
+            if cols is None:
+                return
+            first = log_date(log_files[0]).isoformat() if log_files and period != "all" else None
+            counter = await asyncio.to_thread(scans.top_users, cols, first)
+            top10 = counter.most_common(10)
+    if not top10:
         await ctx.send(f"No messages found for period: `{period}`")
         return
-    top10 = counter.most_common(10)
     embed = discord.Embed(title=f"🏆 Most Active Users ({period.title()})", color=discord.Color.gold())
     desc = []
     medals = ["🥇", "🥈", "🥉"]
     for i, (name, count) in enumerate(top10):
         prefix = medals[i] if i < 3 else f"**{i+1}.**"
-        desc.append(f"{prefix} **{name}** — {count} messages")
+        desc.append(f"{prefix} **{name}** — {'~' if approx else ''}{count} messages")
     embed.description = "\n".join(desc)
-    embed.set_footer(text=f"Requested by {ctx.author}")
+    if sketch is not None:
+        embed.set_footer(text=f"Estimated · ~{sketch.distinct_users()} distinct users · Requested by {ctx.author}")
+    else:
+        embed.set_footer(text=f"Requested by {ctx.author}")
     await ctx.send(embed=embed)
 
 # --- STATS COMMAND ---
 @bot.command(name="stats")
 async def stats_cmd(ctx, target: str = None, *, name: str = None):
     """Show stats. Usage: !stats [@user] or !stats channel [#channel]"""
-    from collections import Counter, defaultdict
     if target == "channel":
         channel = ctx.channel
         if name:
@@ -1253,21 +1638,12 @@ async def stats_cmd(ctx, target: str = None, *, name: str = None):
                 if ch.name == name.strip("#").lower() or str(ch.id) == name.strip("<>#"):
                     channel = ch
                     break
-        counter = Counter()
-        hourly = Counter()
-        total = 0
-        for lf in sorted(BASE_LOG_DIR.glob("logs_*.json")):
-            data = load_log(lf)
-            for entry in data:
-                if entry.get("channel") == channel.name and entry.get("type") == "create":
-                    total += 1
-                    author = entry.get("author_display") or entry.get("author", "Unknown")
-                    counter[author] += 1
-                    try:
-                        ts = datetime.fromisoformat(entry["created_at"])
-                        hourly[ts.hour] += 1
-                    except:
-                        pass
+        async with ctx.typing():
+            cols = await load_snapshot(ctx, "stats", ("channel", channel.name))
+            if cols is None:
+                return
+            stats = await asyncio.to_thread(scans.channel_stats, cols, channel.name)
+        total, counter, hourly = stats["total"], stats["authors"], stats["hourly"]
         embed = discord.Embed(title=f"📊 #{channel.name} Stats", color=discord.Color.blurple())
         embed.add_field(name="Total Messages", value=str(total), inline=True)
         if counter:
@@ -1275,7 +1651,7 @@ async def stats_cmd(ctx, target: str = None, *, name: str = None):
             embed.add_field(name="Top Users", value="\n".join(f"**{n}** — {c}" for n, c in top5), inline=False)
         if hourly:
             peak = hourly.most_common(1)[0]
-            embed.add_field(name="Peak Hour (UTC)", value=f"{peak[0]:02d}:00 ({peak[1]} msgs)", inline=True)
+            embed.add_field(name="Peak Hour (Local)", value=f"{peak[0]:02d}:00 ({peak[1]} msgs)", inline=True)
         await ctx.send(embed=embed)
         return
 
@@ -1286,24 +1662,15 @@ async def stats_cmd(ctx, target: str = None, *, name: str = None):
             if target.lower() in str(m).lower() or target.lower() in m.display_name.lower() or target.strip("<@!>") == str(m.id):
                 member = m
                 break
-    counter = Counter()
-    total = 0
-    word_count = 0
-    channel_counter = Counter()
-    hourly = Counter()
-    for lf in sorted(BASE_LOG_DIR.glob("logs_*.json")):
-        data = load_log(lf)
-        for entry in data:
-            if str(entry.get("author_id")) == str(member.id) and entry.get("type") == "create":
-                total += 1
-                content = entry.get("content", "")
-                word_count += len(content.split())
-                channel_counter[entry.get("channel", "unknown")] += 1
-                try:
-                    ts = datetime.fromisoformat(entry["created_at"])
-                    hourly[ts.hour] += 1
-                except:
-                    pass
+    async with ctx.typing():
+        log_files = list_logs(BASE_LOG_DIR, "logs_")
+        pending = await asyncio.to_thread(incomplete_days, log_files)
+        # Days logged before posting lists are indexed on the command runner first
+        if pending and await run_scan(ctx, "stats", ("user", member.id), pending, index_days) is None:
+            return
+        stats = await asyncio.to_thread(scans.user_stats, log_files, member.id)
+    total, word_count = stats["total"], stats["words"]
+    channel_counter, hourly = stats["channels"], stats["hourly"]
     embed = discord.Embed(title=f"📊 {member.display_name}'s Stats", color=member.top_role.color if member.top_role.color.value != 0 else discord.Color.blurple())
     embed.set_thumbnail(url=member.display_avatar.url)
     embed.add_field(name="Total Messages", value=str(total), inline=True)
@@ -1314,8 +1681,9 @@ async def stats_cmd(ctx, target: str = None, *, name: str = None):
         embed.add_field(name="Top Channels", value="\n".join(f"#{n} — {c}" for n, c in top3), inline=False)
     if hourly:
         peak = hourly.most_common(1)[0]
-        embed.add_field(name="Peak Hour (UTC)", value=f"{peak[0]:02d}:00 ({peak[1]} msgs)", inline=True)
+        embed.add_field(name="Peak Hour (Local)", value=f"{peak[0]:02d}:00 ({peak[1]} msgs)", inline=True)
     await ctx.send(embed=embed)
 
 # --- START BOT ---
-bot.run(TOKEN)
+# discord.py's own records go through the root logger's queue (see shared/log.py)
+bot.run(TOKEN, log_handler=None)
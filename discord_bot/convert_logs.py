@@ -0,0 +1,90 @@
+"""
+Convert existing daily logs to the normalized format (see shared/logstore.py).
+Author profiles and channels move into each day's dictionary file and entries
+refer to them by index. Today's log is skipped because the running bot owns it;
+new entries are normalized as they are written.
+Safe to run more than once: already-normalized entries are left as they are.
+
+    python convert_logs.py                  # normalize, keeping each file's format
+    python convert_logs.py --format binary  # also rewrite as binary .bin logs
+    python convert_logs.py --format json    # back to JSON arrays, one entry per line
+"""
+import argparse
+import os
+import pathlib
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))  # project root, for shared/
+from shared.logstore import (
+    JSON_LINES_HEAD, LOCAL_TIMEZONE_OFFSET, LogDictionary, binary_path, list_logs, physical_path, read_raw,
+    write_binary, write_json_lines,
+)
+
+# --- PATHS ---
+RAILWAY_DIR = pathlib.Path("/mnt/data")
+RAILWAY_APP_DIR = pathlib.Path("/app/data")
+LOCAL_DIR = pathlib.Path(__file__).parent.parent / "data"  # Project root / data
+
+# Check Railway paths first
+if RAILWAY_DIR.exists() and os.access(RAILWAY_DIR, os.W_OK):
+    BASE_LOG_DIR = RAILWAY_DIR
+elif RAILWAY_APP_DIR.exists() and os.access(RAILWAY_APP_DIR, os.W_OK):
+    BASE_LOG_DIR = RAILWAY_APP_DIR
+else:
+    LOCAL_DIR.mkdir(parents=True, exist_ok=True)
+    BASE_LOG_DIR = LOCAL_DIR
+
+print(f"Using log directory: {BASE_LOG_DIR}")
+
+def _is_json_lines(path):
+    with open(path, "rb") as f:
+        return f.read(len(JSON_LINES_HEAD)) in (JSON_LINES_HEAD, b"[]\n")
+
+def convert_file(filepath, target_format=None):
+    """Normalize the entries of one daily log and store it in target_format ("json" or "binary")"""
+    try:
+        current = physical_path(filepath)
+        current_format = "binary" if current.suffix == ".bin" else "json"
+        target_format = target_format or current_format
+        data = read_raw(filepath)
+        dictionary = LogDictionary.load(filepath)
+        converted = [e if not isinstance(e, dict) or "a" in e or "c" in e else dictionary.compact(e) for e in data]
+        if not dictionary.dirty and target_format == current_format and (
+                target_format == "binary" or _is_json_lines(current)):
+            print(f"⏭️  Skipped {filepath.name} (already converted)")
+            return False
+        before = current.stat().st_size
+        if dictionary.dirty:
+            dictionary.save(filepath)
+        if target_format == "binary":
+            target = binary_path(filepath)
+            write_binary(target, converted)
+        else:
+            target = filepath
+            write_json_lines(target, converted)
+        if current != target:
+            current.unlink()
+        print(f"✅ Converted {current.name} -> {target.name} ({len(data)} entries, {before // 1024} KB -> {target.stat().st_size // 1024} KB)")
+        return True
+    except Exception as e:
+        print(f"❌ Error processing {filepath.name}: {e}")
+        return False
+
+parser = argparse.ArgumentParser(description="Normalize daily logs and optionally change their storage format")
+parser.add_argument("--format", choices=["json", "binary"], help="storage format to convert to (default: keep)")
+args = parser.parse_args()
+
+today = (datetime.utcnow() + timedelta(hours=LOCAL_TIMEZONE_OFFSET)).strftime("logs_%Y-%m-%d.json")
+total_updated = 0
+for log_file in list_logs(BASE_LOG_DIR, "logs_"):
+    if log_file.name == today:
+        print(f"⏭️  Skipped {log_file.name} (today's log, written by the bot)")
+        continue
+    if physical_path(log_file).suffix == ".arc":
+        print(f"⏭️  Skipped {log_file.name} (archived)")
+        continue
+    if convert_file(log_file, args.format):
+        total_updated += 1
+
+print(f"\n🎉 Conversion complete! Normalized {total_updated} files.")
@@ -0,0 +1,73 @@
+"""
+Process-wide writer for the daily log files
+Every event handler, on every shard, hands its entries to one LogWriter. A
+single background thread owns the files: it drains whatever has queued up
+and writes it as one batch, so file I/O stays off the event loop and
+concurrent shards never interleave writes.
+"""
+import queue
+import threading
+import time
+
+from shared.log import get_logger
+
+logger = get_logger("bot.writer")
+
+_STOP = object()
+
+
+class LogWriter:
+    """Background thread that applies queued (path, entry) writes in batches"""
+
+    def __init__(self, write_batch, max_queue=10000, max_batch=500, batch_histogram=None):
+        self.write_batch = write_batch  # callable taking a list of (path, entry)
+        self.max_batch = max_batch
+        self.batch_histogram = batch_histogram
+        self._queue = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def submit(self, path, entry):
+        """Queue an entry for `path`. Blocks only if the writer is far behind."""
+        self._queue.put((path, entry))
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Wait until everything queued so far has been written"""
+        self._queue.join()
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in batch)
+            items = [item for item in batch if item is not _STOP]
+            if items:
+                start = time.perf_counter()
+                try:
+                    self.write_batch(items)
+                    self.written += len(items)
+                except Exception:
+                    self.failed += len(items)
+                    logger.exception("Log write failed", entries=len(items))
+                if self.batch_histogram is not None:
+                    self.batch_histogram.observe(time.perf_counter() - start)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
@@ -33,6 +33,10 @@ def migrate_file(filepath):
         
         updated = False
         for entry in data:
+            # Normalized entries keep these fields in the day's dictionary
+            if 'a' in entry or 'c' in entry:
+                continue
+
             # Add avatar_url if missing
             if 'avatar_url' not in entry:
                 entry['avatar_url'] = DEFAULT_AVATAR
@@ -0,0 +1,94 @@
+"""
+Run heavy command work off the event loop
+A CommandRunner hands a day scan (see shared/partition.py) to a small process or thread pool,
+one day per task, and awaits the merged result with
+a per-command timeout. Results are cached for a short TTL
+under a key the caller builds from (command, args, data generation), and
+identical requests already in flight share one job, so repeated commands cost
+one scan and no single command can stall the gateway heartbeat.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import time
+
+from shared.log import get_logger
+from shared.partition import ScanExecutor, ScanTimeout
+
+logger = get_logger("bot.offload")
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+class CommandRunner:
+    """Pool-backed executor for scans, with a TTL result cache and in-flight sharing"""
+
+    def __init__(self, workers=2, mode="process", timeout=20, cache_ttl=30, max_cached=256):
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        self.scans = ScanExecutor(workers, mode)
+        self._cache = {}  # key -> (expires_at, result)
+        self._inflight = {}  # key -> asyncio.Future shared by identical requests
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+
+    def start(self):
+        """Create the pool and fork its workers now, before the bot starts the log
+        writer and the gateway threads"""
+        # Forked workers inherit sys.path and never re-import bot.py
+        self.scans.start()
+
+    def shutdown(self):
+        self.scans.shutdown()
+
+    async def run(self, key, fn, log_paths, *args, max_results=None):
+        """Return fn(log_paths, *args, deadline=...), merged over the days, from the cache,
+        a shared in-flight job, or a new job. Raises CommandTimeout if the job does not
+        finish within the timeout."""
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        job = self._inflight.get(key)
+        if job is None:
+            job = asyncio.ensure_future(self._execute(fn, log_paths, args, max_results))
+            self._inflight[key] = job
+            job.add_done_callback(functools.partial(self._finish, key))
+        # Shield so one caller giving up does not cancel the job for the others
+        return await asyncio.shield(job)
+
+    async def _execute(self, fn, log_paths, args, max_results):
+        loop = asyncio.get_running_loop()
+        deadline = time.time() + self.timeout
+        call = functools.partial(self.scans.run, fn, log_paths, *args, deadline=deadline, max_results=max_results)
+
+        async def attempt():
+            # The merge waits on the pool, so it runs on a loop thread, not the loop itself
+            return await loop.run_in_executor(None, call)
+
+        try:
+            # The scan stops itself at the deadline; the grace period covers pool startup
+            try:
+                return await asyncio.wait_for(attempt(), self.timeout + 1)
+            except concurrent.futures.BrokenExecutor:
+                logger.warning("Command pool broken, recreating")
+                return await asyncio.wait_for(attempt(), max(deadline - time.time(), 0) + 1)
+        except (asyncio.TimeoutError, ScanTimeout):
+            self.timeouts += 1
+            raise CommandTimeout()
+
+    def _finish(self, key, job):
+        self._inflight.pop(key, None)
+        if job.cancelled() or job.exception() is not None:
+            return
+        now = time.monotonic()
+        if len(self._cache) >= self.max_cached:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            if len(self._cache) >= self.max_cached:
+                self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (now + self.cache_ttl, job.result())
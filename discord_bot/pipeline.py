@@ -0,0 +1,91 @@
+"""
+Bounded work queue for gateway event handling
+Event handlers do their cheap, must-happen work inline and hand the slow part
+(REST calls to mirror events into the log channel) to an EventPipeline.
+Jobs are spread over a fixed number of lanes by key, normally the channel ID,
+and each lane is drained by one worker, so a channel's jobs run in order.
+Under pressure, routine jobs are shed once a lane is full, and jobs with a
+coalesce key replace a still-queued job with the same key. Priority jobs go to
+their own lane, shed only once it holds max_depth jobs too, so a backlog
+there cannot grow without bound either.
+"""
+import asyncio
+import time
+from collections import deque
+
+from shared.log import get_logger
+
+logger = get_logger("bot.pipeline")
+
+
+class Job:
+    __slots__ = ("fn", "coalesce_key", "enqueued_at")
+
+    def __init__(self, fn, coalesce_key):
+        self.fn = fn
+        self.coalesce_key = coalesce_key
+        self.enqueued_at = time.perf_counter()
+
+
+class EventPipeline:
+    """Fixed pool of worker tasks draining bounded per-lane queues"""
+
+    def __init__(self, workers=4, max_depth=500, wait_histogram=None):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.wait_histogram = wait_histogram
+        # lanes[0..workers-1] are routine lanes, lanes[workers] is the priority lane
+        self._lanes = [deque() for _ in range(workers + 1)]
+        self._wakeups = [asyncio.Event() for _ in range(workers + 1)]
+        self._pending = {}  # coalesce key -> queued Job
+        self._tasks = []
+        self.dropped = 0
+        self.coalesced = 0
+        self.processed = 0
+
+    def start(self):
+        """Start the worker tasks; call from inside the running event loop"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(len(self._lanes))]
+
+    def submit(self, lane_key, fn, *, priority=False, coalesce_key=None):
+        """Queue fn (a zero-argument coroutine function) and return whether it was accepted.
+        A coalesced job counts as accepted: the queued job will run the new fn instead."""
+        if coalesce_key is not None and coalesce_key in self._pending:
+            self._pending[coalesce_key].fn = fn
+            self.coalesced += 1
+            return True
+        index = self.workers if priority else hash(lane_key) % self.workers
+        lane = self._lanes[index]
+        if len(lane) >= self.max_depth:
+            self.dropped += 1
+            logger.warning("Event queue full, shedding job", lane=index, priority=priority, sample=100)
+            return False
+        job = Job(fn, coalesce_key)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = job
+        lane.append(job)
+        self._wakeups[index].set()
+        return True
+
+    def depths(self):
+        """Queued jobs per lane; the last entry is the priority lane"""
+        return [len(lane) for lane in self._lanes]
+
+    async def _worker(self, index):
+        lane, wakeup = self._lanes[index], self._wakeups[index]
+        while True:
+            while not lane:
+                wakeup.clear()
+                await wakeup.wait()
+            job = lane.popleft()
+            if job.coalesce_key is not None:
+                self._pending.pop(job.coalesce_key, None)
+            if self.wait_histogram is not None:
+                self.wait_histogram.observe(time.perf_counter() - job.enqueued_at, "priority" if index == self.workers else "routine")
+            try:
+                await job.fn()
+            except Exception:
+                logger.exception("Event job failed", lane=index)
+            finally:
+                self.processed += 1
@@ -0,0 +1,52 @@
+"""
+Aggregations behind !stats and !top (!logs search pages use shared/query.py)
+Most take the columnar snapshot of the daily logs (shared/columns.py) and
+answer with group-by counts over its columns, without reading any log.
+user_stats() instead reads just the user's messages, found through the
+author posting lists (shared/postings.py). They run in a thread
+(asyncio.to_thread); building the column segments and posting lists of new
+days is what goes to the CommandRunner.
+"""
+import pathlib
+from collections import Counter
+
+from shared.columns import NO_HOUR, type_index
+from shared.logstore import local_time
+from shared.postings import lookup, read_found
+
+CREATE = type_index("create")
+
+# --- AGGREGATIONS ---
+def _hours(counter):
+    counter.pop(NO_HOUR, None)
+    return counter
+
+def top_users(cols, first=None):
+    """Message counts per author name, from the day `first` (ISO date) on"""
+    lo, hi = cols.rows(first)
+    return cols.author_names(cols.count_by("name", lo, hi, type=CREATE))
+
+def channel_stats(cols, channel_name):
+    """Total, per-author and per-hour message counts for one channel"""
+    where = {"type": CREATE, "channel": cols.channel_index(channel_name)}
+    return {
+        "total": cols.count(**where),
+        "authors": cols.author_names(cols.count_by("name", **where)),
+        "hourly": _hours(cols.count_by("hour", **where)),
+    }
+
+def user_stats(log_paths, author_id):
+    """Message, word, per-channel and per-hour counts for one author"""
+    stats = {"total": 0, "words": 0, "channels": Counter(), "hourly": Counter()}
+    if not log_paths:
+        return stats
+    base_dir = pathlib.Path(log_paths[0]).parent
+    found = lookup(base_dir, "author", author_id, [pathlib.Path(lf).name for lf in log_paths], tags=("create",))
+    for _, _, _, entry in read_found(base_dir, "author", author_id, found):
+        stats["total"] += 1
+        stats["words"] += len((entry.get("content") or "").split())
+        stats["channels"][entry.get("channel") or "unknown"] += 1
+        ts = local_time(entry.get("created_at"))
+        if ts is not None:
+            stats["hourly"][ts.hour] += 1
+    return stats
@@ -0,0 +1,4 @@
+"""
+Code shared by the Discord bot and the web API.
+Both entry points add the project root to sys.path before importing from here.
+"""
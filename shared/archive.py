@@ -0,0 +1,190 @@
+"""
+Compressed monthly archives of closed daily logs
+Each month is one segment file (archive/logs_YYYY-MM.arc) holding zlib blocks
+of up to BLOCK_ENTRIES stored entries, as JSON lines, plus the day's original
+text rendering when there was one. A JSON index next to it
+(archive/logs_YYYY-MM.idx) records, per day, the byte offset, length and
+entry count of every block, and the day's author/channel dictionary. From it
+any entry can be found by its position in the day and read by decompressing
+one block.
+
+Days are only ever appended: new blocks go to the end of the segment first,
+then the index is swapped in, so readers never see an index pointing at
+bytes that are not there yet.
+"""
+import bisect
+import json
+import os
+import pathlib
+import zlib
+
+ARCHIVE_DIR = "archive"
+INDEX_VERSION = 1
+BLOCK_ENTRIES = 256
+COMPRESS_LEVEL = 6
+TEXT_CHUNK = 1 << 20
+
+_indexes = {}  # index path -> ((mtime_ns, size), MonthArchive)
+
+
+def month_key(log_name):
+    """"logs_2026-01-05.json" -> "logs_2026-01" """
+    return log_name[:len("logs_YYYY-MM")]
+
+
+class MonthArchive:
+    """One month's segment file and its index"""
+
+    def __init__(self, base_dir, month):
+        self.dir = pathlib.Path(base_dir) / ARCHIVE_DIR
+        self.segment_path = self.dir / f"{month}.arc"
+        self.index_path = self.dir / f"{month}.idx"
+        self.days = {}
+
+    @classmethod
+    def open(cls, base_dir, month):
+        """Archive for a month, cached until its index changes; None if there is none"""
+        archive = cls(base_dir, month)
+        try:
+            st = archive.index_path.stat()
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        cached = _indexes.get(archive.index_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        with open(archive.index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version", 0) > INDEX_VERSION:
+            raise ValueError(f"{archive.index_path.name} has index version {index['version']}, newer than {INDEX_VERSION}")
+        archive.days = index.get("days", {})
+        for info in archive.days.values():
+            info["starts"] = _block_starts(info["blocks"])
+        _indexes[archive.index_path] = (key, archive)
+        return archive
+
+    def day(self, log_name):
+        return self.days.get(log_name)
+
+    def _read(self, f, offset, length):
+        f.seek(offset)
+        return zlib.decompress(f.read(length))
+
+    def iter_day(self, log_name, start=0):
+        """Yield the stored entries of a day from position `start` on"""
+        info = self.days[log_name]
+        first = max(bisect.bisect_right(info["starts"], start) - 1, 0)
+        with open(self.segment_path, "rb") as f:
+            for i in range(first, len(info["blocks"])):
+                offset, length, _ = info["blocks"][i]
+                lines = self._read(f, offset, length).split(b"\n")
+                skip = max(start - info["starts"][i], 0)
+                for line in lines[skip:]:
+                    yield json.loads(line)
+
+    def iter_blocks(self, log_name):
+        """Yield each block of a day decompressed: stored entries as JSON lines"""
+        with open(self.segment_path, "rb") as f:
+            for offset, length, _ in self.days[log_name]["blocks"]:
+                yield self._read(f, offset, length)
+
+    def entries_at(self, log_name, positions):
+        """Stored entries at the given positions in the day, reading only their blocks"""
+        info = self.days[log_name]
+        wanted = {}
+        for pos in positions:
+            if 0 <= pos < info["entries"]:
+                block = bisect.bisect_right(info["starts"], pos) - 1
+                wanted.setdefault(block, []).append(pos)
+        found = {}
+        with open(self.segment_path, "rb") as f:
+            for block, block_positions in sorted(wanted.items()):
+                offset, length, _ = info["blocks"][block]
+                lines = self._read(f, offset, length).split(b"\n")
+                for pos in block_positions:
+                    found[pos] = json.loads(lines[pos - info["starts"][block]])
+        return [found[pos] for pos in positions if pos in found]
+
+    def iter_text(self, log_name):
+        """Yield the day's original text rendering (or its head, see append_day) in chunks,
+        if it was archived with one"""
+        text = self.days[log_name].get("text")
+        if not text:
+            return
+        offset, length = text
+        decompressor = zlib.decompressobj()
+        with open(self.segment_path, "rb") as f:
+            f.seek(offset)
+            remaining = length
+            while remaining:
+                chunk = f.read(min(TEXT_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield decompressor.decompress(chunk).decode("utf-8", errors="replace")
+        yield decompressor.flush().decode("utf-8", errors="replace")
+
+    def append_day(self, log_name, entries, authors, channels, text_path=None, text_head=False):
+        """Write one day's stored entries (and optional text file) to the segment, then the index.
+        text_head marks a text that covers only entries trimmed before the stored ones."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.segment_path, "ab") as f:
+            f.seek(0, os.SEEK_END)
+            blocks = []
+            for i in range(0, len(entries), BLOCK_ENTRIES):
+                chunk = entries[i:i + BLOCK_ENTRIES]
+                data = "\n".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) for e in chunk)
+                payload = zlib.compress(data.encode("utf-8"), COMPRESS_LEVEL)
+                blocks.append([f.tell(), len(payload), len(chunk)])
+                f.write(payload)
+            text = None
+            if text_path is not None:
+                compressor = zlib.compressobj(COMPRESS_LEVEL)
+                start = f.tell()
+                with open(text_path, "rb") as src:
+                    while chunk := src.read(TEXT_CHUNK):
+                        f.write(compressor.compress(chunk))
+                f.write(compressor.flush())
+                text = [start, f.tell() - start]
+            f.flush()
+            os.fsync(f.fileno())
+        stored_bytes = sum(b[1] for b in blocks) + (text[1] if text else 0)
+        # A new dict, so readers holding the cached archive never see it change under them
+        self.days = {**self.days, log_name: {
+            "entries": len(entries), "blocks": blocks, "authors": authors, "channels": channels,
+            "text": text, "text_head": text_head and text is not None, "stored_bytes": stored_bytes,
+            "starts": _block_starts(blocks),
+        }}
+        days = {name: {k: v for k, v in info.items() if k != "starts"} for name, info in self.days.items()}
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "days": days}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+
+def _block_starts(blocks):
+    starts, n = [], 0
+    for block in blocks:
+        starts.append(n)
+        n += block[2]
+    return starts
+
+
+def archived_days(base_dir):
+    """Names of all archived daily logs"""
+    names = []
+    for index_path in (pathlib.Path(base_dir) / ARCHIVE_DIR).glob("*.idx"):
+        archive = MonthArchive.open(base_dir, index_path.stem)
+        if archive is not None:
+            names.extend(archive.days)
+    return names
+
+
+def find_day(base_dir, log_name):
+    """The MonthArchive holding a daily log, or None"""
+    if not log_name.startswith("logs_"):
+        return None
+    archive = MonthArchive.open(base_dir, month_key(log_name))
+    if archive is not None and archive.day(log_name) is not None:
+        return archive
+    return None
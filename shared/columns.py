@@ -0,0 +1,317 @@
+"""
+Columnar snapshot of message metadata
+Every daily log that is no longer being written gets columns/<log name>: one
+row per entry, stored as typed arrays (the stdlib array module) of
+
+    time     local epoch seconds of created_at (-1 if missing)
+    hour     local hour, 0-23 (NO_HOUR if missing)
+    author   index into the author table (ID, latest name and avatar)
+    name     index into the name table (the author name the entry was logged with)
+    channel  index into the channel table (names)
+    type     index into TYPES
+    words    whitespace-separated words of the content
+
+snapshot() concatenates the days of a range into one Columns, remapping
+each day's author and channel indexes onto shared tables; the merge of the
+closed days is kept in memory (see DayMerger), so only today's log is read
+per request. Aggregations then run over whole columns in C: Counter() over
+an array slice is a group-by count, a filter is a byte mask per row
+(bytes.translate() for byte columns, map(value.__eq__) otherwise, masks
+ANDed as big integers) applied with itertools.compress(), and bisect over the
+day boundaries picks date ranges.
+
+Authors are keyed by author ID (by name, with no ID, for old entries without
+one), so per-user stats count a user who changed display name as one. Counts
+by name group each entry under the name it was logged with, as before.
+"""
+import array
+import bisect
+import itertools
+import json
+import os
+import pathlib
+import threading
+from collections import Counter
+
+from shared.logstore import EPOCH, frozen_source, local_time
+from shared.partition import DayMerger, check_deadline
+from shared.query import TYPES, log_date
+from shared.scan import scan_entries
+
+COLUMNS_DIR = "columns"
+COLUMNS_VERSION = 2
+COLUMNS_MIN_AGE = 3600  # seconds a log must go unwritten before its columns are saved
+COLUMNS = {"time": "q", "hour": "B", "author": "I", "name": "I", "channel": "I", "type": "B", "words": "I"}
+COLUMN_FIELDS = ("type", "created_at", "author_id", "author", "author_display", "avatar_url", "channel", "content")
+NO_HOUR = 255
+MAX_MASKS = 8
+
+
+def columns_path(log_path):
+    log_path = pathlib.Path(log_path)
+    return log_path.parent / COLUMNS_DIR / log_path.name
+
+
+def _source(log_path):
+    return frozen_source(log_path, COLUMNS_MIN_AGE)
+
+
+def _author_key(author_id, name):
+    # Discord IDs are digits, so a name key cannot collide with one
+    return author_id if author_id is not None else "@" + name
+
+
+class Columns:
+    """Message metadata of one day or, merged, of a range of days, column by column"""
+
+    def __init__(self):
+        self.data = {name: array.array(code) for name, code in COLUMNS.items()}
+        self.authors = []   # {"id" (None without one), "name", "avatar_url"} per author index
+        self.names = []     # author name per name index
+        self.channels = []  # channel name per channel index
+        self.days = []      # (log date, first row) of each day, in order
+        self._author_index = {}
+        self._name_index = {}
+        self._channel_index = {}
+        self._masks = {}  # (lo, hi, where) -> row mask, see _mask()
+        self._masks_lock = threading.Lock()  # a cached snapshot is shared by request threads
+
+    def __len__(self):
+        return len(self.data["type"])
+
+    def _author(self, author_id, name, avatar_url):
+        key = _author_key(author_id, name)
+        i = self._author_index.get(key)
+        if i is None:
+            i = self._author_index[key] = len(self.authors)
+            self.authors.append({"id": author_id, "name": name, "avatar_url": avatar_url})
+            return i
+        # Later rows carry the newer name and avatar
+        author = self.authors[i]
+        author["name"] = name or author["name"]
+        author["avatar_url"] = avatar_url or author["avatar_url"]
+        return i
+
+    def _name(self, name):
+        i = self._name_index.get(name)
+        if i is None:
+            i = self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def _channel(self, name):
+        i = self._channel_index.get(name)
+        if i is None:
+            i = self._channel_index[name] = len(self.channels)
+            self.channels.append(name)
+        return i
+
+    @classmethod
+    def build(cls, log_path):
+        cols = cls()
+        day = log_date(log_path)
+        cols.days.append((day.isoformat() if day else pathlib.Path(log_path).stem, 0))
+        append = {name: column.append for name, column in cols.data.items()}
+        for entry in scan_entries(log_path, fields=COLUMN_FIELDS):
+            ts = local_time(entry.get("created_at"))
+            name = entry.get("author_display") or entry.get("author") or "Unknown"
+            author_id = str(entry["author_id"]) if entry.get("author_id") is not None else None
+            t = entry.get("type", "create")
+            append["time"](int((ts - EPOCH).total_seconds()) if ts is not None else -1)
+            append["hour"](ts.hour if ts is not None else NO_HOUR)
+            append["author"](cols._author(author_id, name, entry.get("avatar_url") or ""))
+            append["name"](cols._name(entry.get("author_display") or entry.get("author", "Unknown")))
+            append["channel"](cols._channel(entry.get("channel") or "unknown"))
+            append["type"](TYPES.index(t) if t in TYPES else 0)
+            append["words"](len((entry.get("content") or "").split()))
+        return cols
+
+    def merge(self, other):
+        """Append another Columns' rows, mapping its authors and channels onto these tables"""
+        authors = [self._author(a["id"], a["name"], a["avatar_url"]) for a in other.authors]
+        names = [self._name(n) for n in other.names]
+        channels = [self._channel(c) for c in other.channels]
+        offset = len(self)
+        with self._masks_lock:
+            self._masks.clear()
+        self.days.extend((day, offset + row) for day, row in other.days)
+        for name, column in other.data.items():
+            if name == "author" and authors != list(range(len(authors))):
+                column = map(authors.__getitem__, column)
+            elif name == "name" and names != list(range(len(names))):
+                column = map(names.__getitem__, column)
+            elif name == "channel" and channels != list(range(len(channels))):
+                column = map(channels.__getitem__, column)
+            self.data[name].extend(column)
+        return self
+
+    def copy(self):
+        cols = Columns()
+        cols.data = {name: column[:] for name, column in self.data.items()}
+        cols.authors = [dict(a) for a in self.authors]
+        cols.names = list(self.names)
+        cols.channels = list(self.channels)
+        cols.days = list(self.days)
+        cols._author_index = dict(self._author_index)
+        cols._name_index = dict(self._name_index)
+        cols._channel_index = dict(self._channel_index)
+        return cols
+
+    def save(self, path, source):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = {
+            "version": COLUMNS_VERSION, "source": source, "rows": len(self), "days": self.days,
+            "authors": self.authors, "names": self.names, "channels": self.channels,
+            "columns": [[name, column.typecode, column.itemsize] for name, column in self.data.items()],
+        }
+        # Unique temp name: several processes may build the same day at once
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(header, separators=(",", ":")).encode("ascii") + b"\n")
+            for column in self.data.values():
+                column.tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, source):
+        """The columns saved at path, or None if they are missing, stale or unreadable here"""
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                if header.get("version") != COLUMNS_VERSION or header.get("source") != source:
+                    return None
+                cols = cls()
+                for name, code, itemsize in header["columns"]:
+                    column = array.array(code)
+                    if column.itemsize != itemsize:
+                        return None  # written on a platform with other type sizes
+                    column.fromfile(f, header["rows"])
+                    cols.data[name] = column
+        except (OSError, EOFError, ValueError, KeyError):
+            return None
+        cols.days = [tuple(d) for d in header["days"]]
+        cols.authors = header["authors"]
+        cols.names = header["names"]
+        cols.channels = header["channels"]
+        cols._author_index = {_author_key(a["id"], a["name"]): i for i, a in enumerate(cols.authors)}
+        cols._name_index = {n: i for i, n in enumerate(cols.names)}
+        cols._channel_index = {c: i for i, c in enumerate(cols.channels)}
+        return cols
+
+    # --- QUERIES ---
+    def author_index(self, author_id):
+        return self._author_index.get(str(author_id))
+
+    def channel_index(self, name):
+        return self._channel_index.get(name)
+
+    def rows(self, first=None, last=None):
+        """(lo, hi) of the rows of the days from `first` through `last` (ISO dates; None for open)"""
+        dates = [day for day, _ in self.days]
+        starts = [row for _, row in self.days] + [len(self)]
+        lo = bisect.bisect_left(dates, first) if first else 0
+        hi = bisect.bisect_right(dates, last) if last else len(dates)
+        return starts[lo], starts[max(lo, hi)]
+
+    def day_rows(self):
+        """(log date, lo, hi) of each day's rows"""
+        starts = [row for _, row in self.days] + [len(self)]
+        return [(day, starts[i], starts[i + 1]) for i, (day, _) in enumerate(self.days)]
+
+    def _mask(self, lo, hi, where):
+        """One byte per row in lo:hi, 1 where every `where` column equals its value.
+        Kept for the next aggregation with the same filter."""
+        key = (lo, hi, tuple(sorted(where.items())))
+        mask = self._masks.get(key)
+        if mask is not None:
+            return mask
+        for name, value in where.items():
+            column = self.data[name][lo:hi]
+            if column.typecode == "B":
+                part = column.tobytes().translate(bytes(int(i == value) for i in range(256)))
+            else:
+                part = bytes(map(value.__eq__, column))
+            # AND of two masks as big integers, one C operation
+            mask = part if mask is None else (
+                int.from_bytes(mask, "little") & int.from_bytes(part, "little")).to_bytes(hi - lo, "little")
+        with self._masks_lock:
+            if key not in self._masks and len(self._masks) >= MAX_MASKS:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[key] = mask
+        return mask
+
+    def _select(self, column, lo, hi, where):
+        """The values of a column in rows lo:hi where every `where` column equals its value"""
+        values = self.data[column][lo:hi]
+        if not where:
+            return values
+        return itertools.compress(values, self._mask(lo, hi, where))
+
+    def count_by(self, column, lo=0, hi=None, **where):
+        """Counter of a column's values (a group-by count) over rows lo:hi matching `where`.
+        A `where` value of None matches nothing."""
+        if any(value is None for value in where.values()):
+            return Counter()
+        return Counter(self._select(column, lo, len(self) if hi is None else hi, where))
+
+    def total(self, column, lo=0, hi=None, **where):
+        if any(value is None for value in where.values()):
+            return 0
+        return sum(self._select(column, lo, len(self) if hi is None else hi, where))
+
+    def count(self, lo=0, hi=None, **where):
+        hi = len(self) if hi is None else hi
+        if any(value is None for value in where.values()):
+            return 0
+        return self._mask(lo, hi, where).count(1) if where else hi - lo
+
+    def author_names(self, counter):
+        """A Counter of name indexes (the "name" column) keyed by the names instead"""
+        return Counter({self.names[i]: count for i, count in counter.items()})
+
+    def channel_names(self, counter):
+        return Counter({self.channels[i]: count for i, count in counter.items()})
+
+
+def type_index(entry_type):
+    return TYPES.index(entry_type)
+
+
+def ensure_columns(log_path, source=None):
+    """The day's columns, built and saved first if they are missing or stale.
+    None for a log that is still being written."""
+    source = source or _source(log_path)
+    if source is None:
+        return None
+    path = columns_path(log_path)
+    cols = Columns.load(path, source)
+    if cols is None:
+        cols = Columns.build(log_path)
+        try:
+            cols.save(path, source)
+        except OSError:
+            pass
+    return cols
+
+
+def prepare_columns(log_paths, deadline=None):
+    """Day scan building the missing columns of closed days; returns how many days have them"""
+    ready = 0
+    for lf in log_paths:
+        check_deadline(deadline)
+        if ensure_columns(lf) is not None:
+            ready += 1
+    return ready
+
+
+_days = DayMerger(_source, ensure_columns, Columns.build, Columns)
+
+
+def missing_columns(log_paths):
+    """The closed logs snapshot() needs columns for that have none saved yet"""
+    return [lf for lf in _days.pending(log_paths) if not columns_path(lf).exists()]
+
+
+def snapshot(log_paths):
+    """The Columns of a range of daily logs, in order. Do not modify it: it may be cached."""
+    return _days.merged(log_paths)
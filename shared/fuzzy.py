@@ -0,0 +1,62 @@
+"""
+Fuzzy word matching, shared by keyword alerts and search
+"""
+import re
+
+FUZZY_TOLERANCE = 2
+WORD = re.compile(r'\b\w+\b')
+
+
+def levenshtein(a, b):
+    if len(a) < len(b):
+        return levenshtein(b, a)
+    if len(b) == 0:
+        return len(a)
+    previous_row = range(len(b) + 1)
+    for i, ca in enumerate(a):
+        current_row = [i + 1]
+        for j, cb in enumerate(b):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (ca != cb)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+    return previous_row[-1]
+
+def within_distance(a, b, limit):
+    """levenshtein(a, b) <= limit, giving up as soon as a row has no cell within the limit"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if len(a) < len(b):
+        a, b = b, a
+    previous_row = range(len(b) + 1)
+    for i, ca in enumerate(a):
+        current_row = [i + 1]
+        for j, cb in enumerate(b):
+            current_row.append(min(previous_row[j + 1] + 1, current_row[j] + 1, previous_row[j] + (ca != cb)))
+        if min(current_row) > limit:
+            return False
+        previous_row = current_row
+    return previous_row[-1] <= limit
+
+def word_matches(word, keyword, tolerance=FUZZY_TOLERANCE):
+    """The fuzzy_contains() test for a single lowercase word"""
+    if keyword == word:
+        return True
+    # Fuzzy match only if word length is close to keyword length
+    # AND the first character matches (prevents "dude" matching "pudge")
+    return (abs(len(word) - len(keyword)) <= tolerance and word[:1] == keyword[:1]
+            and within_distance(word, keyword, tolerance))
+
+def fuzzy_contains(text, keyword, tolerance=FUZZY_TOLERANCE):
+    """Check if keyword appears in text with fuzzy matching, respecting word boundaries"""
+    text = (text or "").lower()
+    keyword = (keyword or "").lower()
+    if len(keyword) == 0 or len(text) < len(keyword):
+        return False
+
+    # Split text into words (alphanumeric sequences)
+    words = WORD.findall(text)
+
+    # Check each word for exact or fuzzy match
+    return any(word_matches(word, keyword, tolerance) for word in words)
@@ -0,0 +1,102 @@
+"""
+Queue-backed logging for the bot and the web API
+Handlers only format a record and put it on a bounded queue; a background
+thread writes it to stdout. When the queue is full, records are dropped and
+counted, so a slow stdout never blocks a request thread or the event loop.
+
+    log = get_logger("api")
+    log.info("Added live message", cache_size=len(cache))
+    log.debug("Serving static file", path=path, sample=100)  # every 100th call
+
+LOG_LEVEL sets the minimum level (default INFO).
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+QUEUE_SIZE = 10000
+
+_listener = None
+_setup_lock = threading.Lock()
+dropped_records = 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when full"""
+
+    def enqueue(self, record):
+        global dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records += 1
+
+
+def format_fields(fields):
+    """Render structured fields as key=value pairs, quoting values with spaces"""
+    return " ".join(f"{k}={v!r}" if isinstance(v, str) and " " in v else f"{k}={v}" for k, v in fields.items())
+
+
+def setup_logging(level=None):
+    """Route the root logger through a queue to stdout. Safe to call more than once."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+        log_queue = queue.Queue(QUEUE_SIZE)
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(DroppingQueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+class StructLogger:
+    """Logger wrapper taking structured fields as keyword arguments.
+    `sample=N` logs only every Nth call for that message, for high-frequency events."""
+
+    def __init__(self, logger):
+        self._logger = logger
+        self._sample_counts = {}
+
+    def _log(self, level, msg, exc_info=None, sample=None, **fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample and sample > 1:
+            n = self._sample_counts.get(msg, 0)
+            self._sample_counts[msg] = n + 1
+            if n % sample:
+                return
+            fields["sampled"] = f"1/{sample}"
+        if fields:
+            msg = f"{msg} {format_fields(fields)}"
+        self._logger.log(level, msg, exc_info=exc_info)
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, **fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, **fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, **fields)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, **fields)
+
+    def exception(self, msg, **fields):
+        """Log at ERROR with the current exception's traceback"""
+        self._log(logging.ERROR, msg, exc_info=True, **fields)
+
+
+def get_logger(name):
+    setup_logging()
+    return StructLogger(logging.getLogger(name))
@@ -0,0 +1,588 @@
+"""
+Daily log storage
+Daily log entries are stored normalized: each distinct author profile and
+channel is written once to the day's dictionary file (dicts/<log name>) and
+entries refer to it by index ("a" and "c"). `readable_time` is dropped when it
+can be derived from `created_at`, and `message_id` when it equals `id` ("m").
+Readers go through load_entries() or iter_entries(), which re-hydrate entries
+to the shape the bot produces. Entries written before normalization, and
+custom logs, have no references and pass through unchanged.
+
+Dictionaries are append-only and saved before the log that uses them, so a
+reader that opens the log first and then loads the dictionary always finds
+every index it needs.
+
+A log is stored either as a JSON array with one entry per line
+(logs_<date>.json, see write_json_lines()) or in the compact
+binary format (logs_<date>.bin): an 8-byte header (magic, schema version,
+codec) followed by records, each a little-endian u32 length and the entry
+encoded with msgpack, or compact JSON when msgpack is not installed. Binary
+records hold created_at as epoch microseconds. Callers always use the
+logical .json path; physical_path() finds the file that actually exists.
+
+Closed days are eventually moved into compressed monthly archives (see
+shared/archive.py); every reader here falls back to the archive when a day
+has no live file, so callers never need to know where a day is kept.
+"""
+import json
+import os
+import pathlib
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+
+from shared.archive import archived_days, find_day, month_key, MonthArchive
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+AUTHOR_FIELDS = ("author", "author_display", "author_id", "avatar_url", "role_color")
+CHANNEL_FIELDS = ("channel", "channel_id")
+DICT_DIR = "dicts"
+TEXT_DIR = "text"  # cached text renderings, see shared/logtext.py
+INDEX_DIR = "index"  # trigram search indexes, see shared/trigram.py
+
+BINARY_MAGIC = b"APLG"
+SCHEMA_VERSION = 1
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+HEADER = struct.Struct("<4sBB2x")
+RECORD_LENGTH = struct.Struct("<I")
+EPOCH = datetime(1970, 1, 1)
+JSON_LINES_HEAD = b"[\n{"  # start of a log written by write_json_lines()
+LOCAL_TIMEZONE_OFFSET = 11  # UTC+11 for Australian Eastern Daylight Time; daily logs hold local days
+
+
+class LogFormatError(ValueError):
+    pass
+
+
+def local_time(created_at):
+    """Naive local datetime (LOCAL_TIMEZONE_OFFSET) of an ISO created_at, which is UTC
+    with or without an offset. None if it does not parse."""
+    try:
+        ts = datetime.fromisoformat(created_at)
+    except (TypeError, ValueError):
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts + timedelta(hours=LOCAL_TIMEZONE_OFFSET)
+
+
+def readable_time(created_at):
+    """"YYYY-MM-DD HH:MM:SS UTC" rendering of an ISO timestamp, without parsing it"""
+    if isinstance(created_at, str) and len(created_at) >= 19 and created_at[10] == "T":
+        return f"{created_at[:10]} {created_at[11:19]} UTC"
+    return None
+
+
+def trimmed_text_path(log_path):
+    """Text rendering of the entries trimmed from the front of a daily log (see shared/logtext.py)"""
+    log_path = pathlib.Path(log_path)
+    return log_path.parent / TEXT_DIR / f"{log_path.stem}.trimmed.txt"
+
+
+def dict_path(log_path):
+    """Dictionary file for a log; kept in a subdirectory so *.json globs skip it"""
+    log_path = pathlib.Path(log_path)
+    return log_path.parent / DICT_DIR / log_path.name
+
+
+def write_json_atomic(path, data, **dump_kwargs):
+    """Write JSON to a temp file and swap it in so readers never see a partial file"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+
+def write_json_lines(path, entries):
+    """Atomically write a log as a JSON array with one compact entry per line.
+    Still plain JSON, but line-delimited, so scans can find and decode single entries."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if entries:
+            f.write("[\n")
+            f.write(",\n".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) for e in entries))
+            f.write("\n]\n")
+        else:
+            f.write("[]\n")
+    os.replace(tmp_path, path)
+
+
+def _snapshot_key(snapshot):
+    return tuple(sorted(snapshot.items()))
+
+
+class LogDictionary:
+    """Append-only author and channel tables for one log file"""
+
+    def __init__(self, authors=None, channels=None):
+        self.authors = authors or []
+        self.channels = channels or []
+        self._author_index = {_snapshot_key(s): i for i, s in enumerate(self.authors)}
+        self._channel_index = {_snapshot_key(s): i for i, s in enumerate(self.channels)}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, log_path):
+        try:
+            with open(dict_path(log_path), encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data.get("authors"), data.get("channels"))
+        except (OSError, json.JSONDecodeError):
+            pass
+        archive = archive_for(log_path)
+        if archive is not None:
+            info = archive.day(pathlib.Path(log_path).name)
+            return cls(info.get("authors"), info.get("channels"))
+        return cls()
+
+    def save(self, log_path):
+        path = dict_path(log_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(path, {"authors": self.authors, "channels": self.channels})
+        self.dirty = False
+
+    def _intern(self, table, index, snapshot):
+        key = _snapshot_key(snapshot)
+        i = index.get(key)
+        if i is None:
+            i = index[key] = len(table)
+            table.append(snapshot)
+            self.dirty = True
+        return i
+
+    def compact(self, entry):
+        """Normalized copy of a full entry, interning its author and channel"""
+        author = {k: entry[k] for k in AUTHOR_FIELDS if k in entry}
+        channel = {k: entry[k] for k in CHANNEL_FIELDS if k in entry}
+        skip = set(AUTHOR_FIELDS + CHANNEL_FIELDS)
+        out = {k: v for k, v in entry.items() if k not in skip}
+        if author:
+            out["a"] = self._intern(self.authors, self._author_index, author)
+        if channel:
+            out["c"] = self._intern(self.channels, self._channel_index, channel)
+        if "readable_time" in out and out["readable_time"] == readable_time(out.get("created_at")):
+            del out["readable_time"]
+        if "message_id" in out and out["message_id"] == out.get("id"):
+            del out["message_id"]
+            out["m"] = 1
+        return out
+
+    def hydrate(self, entry):
+        """Full entry for a stored one; entries without references are returned as-is"""
+        if not isinstance(entry, dict) or ("a" not in entry and "c" not in entry):
+            return entry
+        out = {}
+        a = entry.get("a")
+        if a is not None and 0 <= a < len(self.authors):
+            out.update(self.authors[a])
+        c = entry.get("c")
+        if c is not None and 0 <= c < len(self.channels):
+            out.update(self.channels[c])
+        for k, v in entry.items():
+            if k not in ("a", "c", "m"):
+                out[k] = v
+        if entry.get("m"):
+            out["message_id"] = entry.get("id")
+        if "readable_time" not in out and "created_at" in out:
+            rt = readable_time(out["created_at"])
+            if rt:
+                out["readable_time"] = rt
+        return out
+
+    def hydrate_fields(self, entry, fields):
+        """Just the given fields of the full entry, without building all of it"""
+        if not isinstance(entry, dict):
+            return {}
+        if "a" not in entry and "c" not in entry:
+            return {f: entry[f] for f in fields if f in entry}
+        a, c = entry.get("a"), entry.get("c")
+        author = self.authors[a] if a is not None and 0 <= a < len(self.authors) else {}
+        channel = self.channels[c] if c is not None and 0 <= c < len(self.channels) else {}
+        out = {}
+        for f in fields:
+            if f in entry and f not in ("a", "c", "m"):
+                out[f] = entry[f]
+            elif f in author:
+                out[f] = author[f]
+            elif f in channel:
+                out[f] = channel[f]
+            elif f == "message_id" and entry.get("m"):
+                out[f] = entry.get("id")
+            elif f == "readable_time" and readable_time(entry.get("created_at")):
+                out[f] = readable_time(entry.get("created_at"))
+        return out
+
+
+# --- FILE FORMATS ---
+def binary_path(log_path):
+    return pathlib.Path(log_path).with_suffix(".bin")
+
+
+def archive_for(log_path):
+    """The MonthArchive holding a log that has no live file, or None"""
+    log_path = pathlib.Path(log_path)
+    if log_path.exists() or binary_path(log_path).exists():
+        return None
+    return find_day(log_path.parent, log_path.name)
+
+
+def physical_path(log_path):
+    """The file holding a logical log: its .bin sibling if there is one, else the .json,
+    else the month's archive segment. The logical path itself if none exists."""
+    log_path = pathlib.Path(log_path)
+    bin_path = binary_path(log_path)
+    if bin_path.exists():
+        return bin_path
+    if log_path.exists():
+        return log_path
+    archive = find_day(log_path.parent, log_path.name)
+    return archive.segment_path if archive is not None else log_path
+
+
+def stored_size(log_path):
+    """Bytes a log takes on disk (its share of the segment, for archived days)"""
+    archive = archive_for(log_path)
+    if archive is not None:
+        return archive.day(pathlib.Path(log_path).name)["stored_bytes"]
+    try:
+        return physical_path(log_path).stat().st_size
+    except OSError:
+        return 0
+
+
+def frozen_source(log_path, min_age):
+    """What a file derived from a log (index, sketch) is valid for: the archived day's
+    entry count, or the live file's stat. None if the log is missing or was written
+    less than min_age seconds ago."""
+    log_path = pathlib.Path(log_path)
+    archive = find_day(log_path.parent, log_path.name)
+    if archive is not None:
+        return ["arc", archive.day(log_path.name)["entries"]]
+    try:
+        st = physical_path(log_path).stat()
+    except OSError:
+        return None
+    if time.time() - st.st_mtime < min_age:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def list_logs(base_dir, prefixes=("logs_", "custom_")):
+    """Sorted logical paths of the logs in base_dir whose names start with one of prefixes"""
+    if isinstance(prefixes, str):
+        prefixes = (prefixes,)
+    names = set()
+    for pattern in ("*.json", "*.bin"):
+        for p in pathlib.Path(base_dir).glob(pattern):
+            if p.name.startswith(prefixes):
+                names.add(p.stem + ".json")
+    if "logs_" in prefixes:
+        names.update(archived_days(base_dir))
+    return [pathlib.Path(base_dir) / name for name in sorted(names)]
+
+
+def _pack_time(entry):
+    """Replace an ISO created_at with epoch microseconds ("t", plus "z" if it was UTC-aware)"""
+    created_at = entry.get("created_at")
+    if not isinstance(created_at, str):
+        return entry
+    try:
+        dt = datetime.fromisoformat(created_at)
+    except ValueError:
+        return entry
+    aware = dt.tzinfo is not None
+    if aware and dt.utcoffset() != timedelta(0):
+        return entry
+    micros = (dt.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+    out = {k: v for k, v in entry.items() if k != "created_at"}
+    out["t"] = micros
+    if aware:
+        out["z"] = 1
+    # Only pack what unpacks to the identical string
+    return out if _unpack_time(dict(out))["created_at"] == created_at else entry
+
+
+def _unpack_time(entry):
+    if "t" in entry:
+        created_at = (EPOCH + timedelta(microseconds=entry.pop("t"))).isoformat()
+        if entry.pop("z", None):
+            created_at += "+00:00"
+        entry["created_at"] = created_at
+    return entry
+
+
+def encode_record(entry, codec):
+    entry = _pack_time(entry)
+    if codec == CODEC_MSGPACK:
+        payload = msgpack.packb(entry, use_bin_type=True)
+    else:
+        payload = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return RECORD_LENGTH.pack(len(payload)) + payload
+
+
+def decode_payload(payload, codec):
+    if codec == CODEC_MSGPACK:
+        entry = msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    else:
+        entry = json.loads(payload)
+    return _unpack_time(entry) if isinstance(entry, dict) else entry
+
+
+def read_header(f, path):
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, version, codec = HEADER.unpack(header)
+    if magic != BINARY_MAGIC:
+        raise LogFormatError(f"{path.name} is not a binary log")
+    if version > SCHEMA_VERSION:
+        raise LogFormatError(f"{path.name} has schema version {version}, newer than {SCHEMA_VERSION}")
+    if codec == CODEC_MSGPACK and msgpack is None:
+        raise LogFormatError(f"{path.name} is msgpack-encoded but msgpack is not installed")
+    return codec
+
+
+def _iter_payloads(f, chunk_size=1 << 20):
+    """Yield record payloads, reading the file in large chunks"""
+    buf = b""
+    pos = 0
+    while True:
+        if len(buf) - pos < RECORD_LENGTH.size:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        (length,) = RECORD_LENGTH.unpack_from(buf, pos)
+        end = pos + RECORD_LENGTH.size + length
+        if end > len(buf):
+            chunk = f.read(max(chunk_size, end - len(buf)))
+            if not chunk:
+                return
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield buf[pos + RECORD_LENGTH.size:end]
+        pos = end
+
+
+def iter_binary(path):
+    """Yield stored entries from a binary log; a partially appended last record is ignored"""
+    with open(path, "rb") as f:
+        codec = read_header(f, path)
+        if codec is None:
+            return
+        for payload in _iter_payloads(f):
+            yield decode_payload(payload, codec)
+
+
+def read_binary(path):
+    """All stored entries of a binary log, decoded in one pass"""
+    with open(path, "rb") as f:
+        codec = read_header(f, path)
+        if codec is None:
+            return []
+        payloads = list(_iter_payloads(f))
+    if codec == CODEC_JSON:
+        # One parse of the joined records is much cheaper than one per record
+        entries = json.loads(b"[" + b",".join(payloads) + b"]")
+        return [_unpack_time(e) if isinstance(e, dict) else e for e in entries]
+    return [decode_payload(payload, codec) for payload in payloads]
+
+
+def default_codec():
+    return CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+
+
+def write_binary(path, entries, codec=None):
+    """Write a whole binary log atomically"""
+    codec = default_codec() if codec is None else codec
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(BINARY_MAGIC, SCHEMA_VERSION, codec))
+        for entry in entries:
+            f.write(encode_record(entry, codec))
+    os.replace(tmp_path, path)
+
+
+def append_binary(path, entries):
+    """Append records to a binary log, creating it if needed, in the file's own codec"""
+    if not path.exists() or path.stat().st_size < HEADER.size:
+        write_binary(path, entries)
+        return
+    with open(path, "rb") as f:
+        codec = read_header(f, path)
+    with open(path, "ab") as f:
+        f.write(b"".join(encode_record(entry, codec) for entry in entries))
+
+
+def read_raw(log_path):
+    """Stored entries of a log, or [] if it is missing or unreadable JSON.
+    Raises LogFormatError for a binary log this version cannot read."""
+    path = physical_path(log_path)
+    if path.suffix == ".bin":
+        try:
+            return read_binary(path)
+        except OSError:
+            return []
+    if path.suffix == ".arc":
+        log_path = pathlib.Path(log_path)
+        return list(find_day(log_path.parent, log_path.name).iter_day(log_path.name))
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return []
+
+
+def load_entries(log_path):
+    """All entries of a log file, hydrated"""
+    entries = read_raw(log_path)
+    if not any(isinstance(e, dict) and ("a" in e or "c" in e) for e in entries):
+        return entries
+    dictionary = LogDictionary.load(log_path)
+    return [dictionary.hydrate(e) for e in entries]
+
+
+def iter_raw(log_path, start=0, chunk_size=65536):
+    """Yield stored entries from a log one at a time, from position `start` on.
+    Archived days seek straight to the block holding `start`."""
+    log_path = pathlib.Path(log_path)
+    path = physical_path(log_path)
+    if path.suffix == ".arc":
+        yield from find_day(log_path.parent, log_path.name).iter_day(log_path.name, start)
+        return
+    entries = iter_binary(path) if path.suffix == ".bin" else _iter_json(path, chunk_size)
+    for i, entry in enumerate(entries):
+        if i >= start:
+            yield entry
+
+
+def read_entries_at(log_path, positions):
+    """Hydrated entries at the given positions in a log, in the order asked for.
+    Archived days decompress only the blocks that hold them."""
+    log_path = pathlib.Path(log_path)
+    archive = archive_for(log_path)
+    if archive is not None:
+        stored = archive.entries_at(log_path.name, positions)
+    else:
+        entries = read_raw(log_path)
+        stored = [entries[pos] for pos in positions if 0 <= pos < len(entries)]
+    dictionary = LogDictionary.load(log_path)
+    return [dictionary.hydrate(e) for e in stored]
+
+
+def _iter_json(log_path, chunk_size=65536):
+    """Yield entries from a JSON array file, reading it in chunks so only the
+    current entry is held in memory"""
+    if not log_path.exists():
+        return
+    decoder = json.JSONDecoder()
+    with open(log_path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        eof = not buf
+        pos = 0
+        # Skip to the opening bracket of the array
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+        if pos >= len(buf) or buf[pos] != "[":
+            return
+        pos += 1
+        while True:
+            # Skip whitespace and separators between entries
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                entry, end = decoder.raw_decode(buf, pos)
+                # A value running to the end of the buffer may be truncated
+                if end < len(buf) or eof:
+                    yield entry
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            if eof and pos >= len(buf):
+                return
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+def iter_entries(log_path, start=0, chunk_size=65536):
+    """Yield hydrated entries from a log one at a time, from position `start` on"""
+    dictionary = None
+    for entry in iter_raw(log_path, start, chunk_size):
+        if dictionary is None:
+            # Loaded once the log is open, so it covers every entry we will read
+            dictionary = LogDictionary.load(log_path)
+        yield dictionary.hydrate(entry)
+
+
+# --- ARCHIVING ---
+def archive_day(log_path):
+    """Move a closed daily log, with its dictionary and text files, into its month's archive"""
+    log_path = pathlib.Path(log_path)
+    base_dir = log_path.parent
+    month = month_key(log_path.name)
+    archive = MonthArchive.open(base_dir, month) or MonthArchive(base_dir, month)
+    if archive.day(log_path.name) is None:
+        dictionary = LogDictionary.load(log_path)
+        stored = [e if not isinstance(e, dict) or "a" in e or "c" in e else dictionary.compact(e) for e in read_raw(log_path)]
+        # Daily .txt files written event by event may hold more than the capped log; keep them.
+        # Otherwise keep the text of trimmed entries, to go before the rendering of the rest.
+        text_path, text_head = log_path.with_suffix(".txt"), False
+        if not text_path.exists():
+            text_path, text_head = trimmed_text_path(log_path), True
+        archive.append_day(log_path.name, stored, dictionary.authors, dictionary.channels,
+                           text_path if text_path.exists() else None, text_head)
+    for leftover in (log_path, binary_path(log_path), dict_path(log_path), log_path.with_suffix(".txt"),
+                     base_dir / TEXT_DIR / f"{log_path.stem}.txt", trimmed_text_path(log_path)):
+        try:
+            leftover.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def delete_log(log_path):
+    """Delete a live log in every format, with its text file, dictionary, cached text
+    and search index. Returns whether there was a log to delete."""
+    log_path = pathlib.Path(log_path)
+    removed = False
+    for p in (log_path, binary_path(log_path), log_path.with_suffix(".txt")):
+        if p.exists():
+            p.unlink()
+            removed = True
+    if removed:
+        for leftover in (dict_path(log_path), log_path.parent / TEXT_DIR / f"{log_path.stem}.txt",
+                         trimmed_text_path(log_path), log_path.parent / INDEX_DIR / log_path.name):
+            try:
+                leftover.unlink()
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def archive_closed_days(base_dir, before):
+    """Archive every live daily log whose name sorts before `before` (a log name).
+    Returns the names archived."""
+    archived = []
+    for pattern in ("logs_*.json", "logs_*.bin"):
+        for p in sorted(pathlib.Path(base_dir).glob(pattern)):
+            log_path = p.with_suffix(".json")
+            if log_path.name < before and log_path.name not in archived:
+                archive_day(log_path)
+                archived.append(log_path.name)
+    return archived
@@ -0,0 +1,113 @@
+"""
+Plain-text renderings of logs for downloads
+The bot no longer appends a .txt next to each daily log. Downloads render the
+text from the structured log instead: streamed for today's log, and rendered
+once into text/<log name>.txt for closed days, which no longer change.
+A .txt written alongside the log (custom logs, and daily logs from before
+this change) is still served as long as it is at least as new as the log.
+Archived days are streamed from the archive, using the day's original .txt
+if it was archived with one.
+
+The writer trims daily logs to their last MAX_LOG_ENTRIES entries; before it
+does, append_trimmed() adds the text of the entries it drops to
+text/<log name>.trimmed.txt (archived with the day), and renderings start
+with it, so downloads still hold every event of the day.
+"""
+import os
+import pathlib
+
+from shared.logstore import TEXT_DIR, archive_for, iter_entries, physical_path, trimmed_text_path
+
+TEXT_CHUNK = 1 << 16
+
+TYPE_EMOJI = {"create": "💬", "edit": "✏️", "delete": "🗑️", "reaction": "🔁"}
+
+
+def format_entry(entry):
+    """One entry in the download format"""
+    ts = entry.get("readable_time") or entry.get("created_at", "")
+    content = entry.get("content", "(no text)")
+    entry_type = entry.get("type")
+    type_emoji = TYPE_EMOJI.get(entry_type, "💬")
+    header = f"[{ts}] ({entry.get('channel')}) {entry.get('author')} {type_emoji}"
+    if entry_type == "edit":
+        before = entry.get("before", "(no text)")
+        return f"{header}\nBefore: {before}\nAfter : {content}\n\n"
+    if entry_type == "reaction":
+        emoji = entry.get("emoji")
+        count = entry.get("count", 0)
+        users = ", ".join(entry.get("users", []))
+        return f"{header}\nReaction: {emoji} x{count} ({users}) on message {entry.get('message_id')}\n\n"
+    return f"{header}\n{content}\n\n"
+
+
+def append_trimmed(log_path, entries):
+    """Add the text of hydrated entries about to be trimmed from the front of a log"""
+    path = trimmed_text_path(log_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(format_entry(entry) for entry in entries)
+
+
+def _iter_file(path):
+    try:
+        f = open(path, encoding="utf-8", errors="replace")
+    except FileNotFoundError:
+        return
+    with f:
+        while chunk := f.read(TEXT_CHUNK):
+            yield chunk
+
+
+def iter_text(log_path):
+    """Stream the text rendering of a log, one entry at a time"""
+    log_path = pathlib.Path(log_path)
+    archive = archive_for(log_path)
+    if archive is not None:
+        day = archive.day(log_path.name)
+        if day.get("text"):
+            yield from archive.iter_text(log_path.name)
+            if not day.get("text_head"):
+                return
+    else:
+        yield from _iter_file(trimmed_text_path(log_path))
+    for entry in iter_entries(log_path):
+        yield format_entry(entry)
+
+
+def text_cache_path(log_path):
+    log_path = pathlib.Path(log_path)
+    return log_path.parent / TEXT_DIR / f"{log_path.stem}.txt"
+
+
+def _is_current(text_path, source):
+    try:
+        return text_path.stat().st_mtime_ns >= source.stat().st_mtime_ns
+    except OSError:
+        return False
+
+
+def text_available(log_path):
+    log_path = pathlib.Path(log_path)
+    return physical_path(log_path).exists() or log_path.with_suffix(".txt").exists()
+
+
+def text_file(log_path, closed):
+    """Path of a complete text rendering of the log, or None if it has to be streamed
+    with iter_text(): the log is still being written (closed=False) or is archived."""
+    log_path = pathlib.Path(log_path)
+    source = physical_path(log_path)
+    written = log_path.with_suffix(".txt")
+    if written.exists() and (not source.exists() or _is_current(written, source)):
+        return written
+    if not closed or not source.exists() or source.suffix == ".arc":
+        return None
+    cached = text_cache_path(log_path)
+    if not _is_current(cached, source):
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name: several API workers may render the same day at once
+        tmp_path = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(iter_text(log_path))
+        os.replace(tmp_path, cached)
+    return cached
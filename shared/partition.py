@@ -0,0 +1,228 @@
+"""
+Scans fanned out over days
+A day scan is a module-level function fn(log_paths, *args, deadline=None)
+returning a partial result. ScanExecutor runs it once per day on a process
+(or thread) pool, a bounded number of days ahead, and merges the partials
+in day order: Counters and numbers add up, dicts merge key by key and lists
+concatenate, so counters, top-k tallies and ordered match lists all combine
+the same way; any other value is replaced by the later day's. With
+max_results the scan stops submitting days, and cancels the queued ones,
+once the merged list holds that many results.
+
+Pool workers are forked, so day scans must not rely on threads or locks of
+the parent, and their arguments and results must be picklable.
+
+DayMerger keeps per-day results that are saved next to the logs (sketches,
+column segments) merged in memory, so a range of days that starts with an
+already merged run only loads the days after it.
+"""
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import pathlib
+import threading
+import time
+
+from shared.logstore import physical_path
+
+POOL_MODES = ("process", "thread", "inline")
+
+
+class ScanTimeout(Exception):
+    pass
+
+
+def check_deadline(deadline):
+    if deadline is not None and time.time() > deadline:
+        raise ScanTimeout()
+
+
+def merge(total, part):
+    """Add a partial result into the running total and return it"""
+    if isinstance(total, collections.Counter):
+        total.update(part)
+        return total
+    if isinstance(total, dict):
+        for key, value in part.items():
+            total[key] = merge(total[key], value) if key in total else value
+        return total
+    if isinstance(total, list):
+        total.extend(part)
+        return total
+    if isinstance(total, (int, float)) and not isinstance(total, bool):
+        return total + part
+    return part
+
+
+def _ready():
+    return True
+
+
+def default_workers():
+    return min(4, os.cpu_count() or 1)
+
+
+class ScanExecutor:
+    """Per-day fan-out of scans onto a pool, merging partial results in day order"""
+
+    def __init__(self, workers=None, mode="process", ahead=2):
+        self.workers = workers or default_workers()
+        self.mode = mode if mode in POOL_MODES else "process"
+        self.ahead = ahead  # days queued per worker
+        self._executor = None
+        self.partitions = 0
+        self.stopped_early = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Forked so workers inherit sys.path and the already-imported scan modules
+            if self.mode == "process" and "fork" in multiprocessing.get_all_start_methods():
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("fork"))
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="scan")
+        return self._executor
+
+    def start(self):
+        """Create the pool, and fork its workers now, before the process starts more threads.
+        A fork-context pool only forks on its first submit, so one no-op task is run."""
+        if self.mode != "inline":
+            self._get_executor().submit(_ready).result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def run(self, fn, log_paths, *args, deadline=None, max_results=None):
+        """Merged result of fn over every log, one day per task.
+        Exceptions from a day (ScanTimeout included) propagate to the caller."""
+        log_paths = [str(p) for p in log_paths]
+        if self.mode == "inline" or len(log_paths) < 2:
+            return self._run_inline(fn, log_paths, args, deadline, max_results)
+        try:
+            executor = self._get_executor()
+        except (OSError, RuntimeError):
+            return self._run_inline(fn, log_paths, args, deadline, max_results)
+        days = iter(log_paths)
+        pending = collections.deque()
+
+        def submit_next():
+            for path in days:
+                pending.append(executor.submit(fn, [path], *args, deadline=deadline))
+                return
+
+        for _ in range(self.workers * self.ahead):
+            submit_next()
+        total = None
+        try:
+            while pending:
+                part = pending.popleft().result()
+                self.partitions += 1
+                total = part if total is None else merge(total, part)
+                if max_results is not None and len(total) >= max_results:
+                    if pending or next(days, None) is not None:
+                        self.stopped_early += 1
+                    break
+                submit_next()
+        except concurrent.futures.BrokenExecutor:
+            self._executor = None
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+        return total if total is not None else fn([], *args, deadline=deadline)
+
+    def _run_inline(self, fn, log_paths, args, deadline, max_results):
+        total = None
+        for path in log_paths:
+            part = fn([path], *args, deadline=deadline)
+            self.partitions += 1
+            total = part if total is None else merge(total, part)
+            if max_results is not None and len(total) >= max_results:
+                break
+        return total if total is not None else fn([], *args, deadline=deadline)
+
+
+# --- MERGED DAYS ---
+class DayMerger:
+    """Merged per-day results over ranges of daily logs. A result has merge(other),
+    returning itself, and copy(). Closed logs (those `source` gives a value for)
+    are loaded once per range prefix; logs still being written are built on every
+    call, or reused while their file is unchanged, and merged into a copy.
+    One instance serves every request thread: the caches are only read and
+    updated under a lock, and results are built outside it."""
+
+    def __init__(self, source, load, build, factory, size=4):
+        self.source = source    # log path -> what a saved result is valid for, None while it is written
+        self.load = load        # (log path, source) -> result of a closed day
+        self.build = build      # log path -> result of a live day
+        self.factory = factory  # () -> empty result
+        self.size = size
+        self._merged = {}  # tuple of (log name, source) of closed days -> their merged result
+        self._live = {}    # log path -> (stat, result)
+        self._lock = threading.Lock()
+
+    def _split(self, log_paths):
+        closed, live = [], []
+        for lf in log_paths:
+            source = self.source(lf)
+            if source is None:
+                live.append(lf)
+            else:
+                closed.append((lf, source))
+        return tuple((pathlib.Path(lf).name, json.dumps(source)) for lf, source in closed), closed, live
+
+    def _cached_prefix(self, signature):
+        best = (0, None)
+        with self._lock:
+            merged = list(self._merged.items())
+        for key, result in merged:
+            if len(key) > best[0] and signature[:len(key)] == key:
+                best = (len(key), result)
+        return best
+
+    def pending(self, log_paths):
+        """The closed logs merged() would still have to load"""
+        signature, closed, _ = self._split(log_paths)
+        done, _ = self._cached_prefix(signature)
+        return [lf for lf, _ in closed[done:]]
+
+    def _live_result(self, log_path):
+        try:
+            st = physical_path(log_path).stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        with self._lock:
+            cached = self._live.get(str(log_path))
+        if cached and cached[0] == stamp:
+            return cached[1]
+        result = self.build(log_path)
+        with self._lock:
+            self._live[str(log_path)] = (stamp, result)
+        return result
+
+    def merged(self, log_paths):
+        """The merged result of the logs, in order. Do not modify it: it may be cached."""
+        signature, closed, live = self._split(log_paths)
+        done, base = self._cached_prefix(signature)
+        if base is None or done < len(closed):
+            base = base.copy() if base is not None else self.factory()
+            for lf, source in closed[done:]:
+                base.merge(self.load(lf, source))
+            with self._lock:
+                if signature not in self._merged and len(self._merged) >= self.size:
+                    self._merged.pop(next(iter(self._merged)))
+                self._merged[signature] = base
+        if not live:
+            return base
+        total = base.copy()
+        for lf in live:
+            total.merge(self._live_result(lf))
+        with self._lock:
+            for path in set(self._live) - {str(lf) for lf in live}:
+                self._live.pop(path, None)
+        return total
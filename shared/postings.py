@@ -0,0 +1,333 @@
+"""
+Posting lists of daily log entries
+The bot's log writer records, for every entry it appends, where the entry
+went under each key it is looked up by, so readers go straight to those
+entries instead of scanning days. Kinds of keys (KINDS):
+
+    author   the author ID: a user's messages
+    message  the message ID: a message's create, edits, reactions and delete
+    reply    the ID of the message replied to (reply_to): the replies to a
+             message, the edges reply_tree() follows
+
+    postings/<kind>/<file>   append-only lines "key<TAB>log name<TAB>seq<TAB>tag"
+    postings/days/<log name> {"dropped": n, "indexed_from": {kind: seq}} of each day
+
+Authors get a file each; message IDs are spread over MESSAGE_BUCKETS files.
+
+An entry is identified by its day and sequence number: the number of entries
+appended to the day before it. Its position in the log is seq - dropped,
+where `dropped` counts the entries trimmed from the front of the log
+(MAX_LOG_ENTRIES); a negative position means it was trimmed away. Archiving
+and format conversion keep entry order, so positions stay valid.
+
+Days logged before posting lists existed (and the part of a day logged
+before a kind was added, seq < indexed_from[kind]) are indexed by
+index_day() once the day is closed: the bot does it when it archives days,
+and lookups do it for any closed day they find incomplete. A day still being
+written with such a part is scanned by lookups instead, so they never miss
+entries. Postings are appended with one unbuffered write per file, so
+concurrent writers never split a line, and readers drop duplicates and a
+last line still being written.
+"""
+import collections
+import itertools
+import json
+import operator
+import os
+import pathlib
+import zlib
+
+from shared.logstore import frozen_source, iter_entries
+from shared.partition import check_deadline
+from shared.scan import entries_at
+
+POSTINGS_DIR = "postings"
+STATE_DIR = "days"
+INDEX_MIN_AGE = 3600  # seconds a day must go unwritten before readers backfill it
+MESSAGE_BUCKETS = 1024
+
+_complete = set()  # (base dir, log name) of closed days known to be fully indexed
+
+
+def _author_keys(entry):
+    author_id = str(entry.get("author_id", ""))
+    return [author_id] if author_id.isdigit() else []
+
+
+def _message_keys(entry):
+    message_id = str(entry.get("message_id") or entry.get("id") or "")
+    return [message_id] if message_id.isdigit() else []
+
+
+def _reply_keys(entry):
+    reply_to = str(entry.get("reply_to") or "")
+    return [reply_to] if reply_to.isdigit() and entry.get("type", "create") == "create" else []
+
+
+# kind -> (number of bucket files, or None for one file per key; key function of an entry)
+KINDS = {
+    "author": (None, _author_keys),
+    "message": (MESSAGE_BUCKETS, _message_keys),
+    "reply": (MESSAGE_BUCKETS, _reply_keys),
+}
+
+
+def _state_path(base_dir, log_name):
+    return pathlib.Path(base_dir) / POSTINGS_DIR / STATE_DIR / log_name
+
+
+def load_state(base_dir, log_name):
+    """A day's {"dropped", "indexed_from": {kind: seq}}, or None if nothing of it was ever indexed"""
+    try:
+        with open(_state_path(base_dir, log_name), encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if isinstance(state["indexed_from"], int):
+        state["indexed_from"] = {"author": state["indexed_from"]}  # from before there were other kinds
+    return state
+
+
+def save_state(base_dir, log_name, state):
+    path = _state_path(base_dir, log_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique temp name: a reader may backfill the same closed day at once
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def open_state(base_dir, log_name, count):
+    """The state of a day the writer is about to append to, holding `count` entries.
+    Kinds not indexed yet start at the next entry; what came before is left to index_day()."""
+    state = load_state(base_dir, log_name) or {"dropped": 0, "indexed_from": {}}
+    if not KINDS.keys() <= state["indexed_from"].keys():
+        for kind in KINDS:
+            state["indexed_from"].setdefault(kind, state["dropped"] + count)
+        save_state(base_dir, log_name, state)
+    return state
+
+
+class PostingLists:
+    """The posting lists of one kind of key"""
+
+    def __init__(self, base_dir, kind):
+        self.dir = pathlib.Path(base_dir) / POSTINGS_DIR / kind
+        self.buckets = KINDS[kind][0]
+
+    def _file(self, key):
+        if self.buckets is None:
+            return self.dir / key
+        return self.dir / format(zlib.crc32(key.encode("utf-8")) % self.buckets, "04x")
+
+    def add(self, postings):
+        """Append (key, log name, seq, tag) postings"""
+        by_file = {}
+        for key, log_name, seq, tag in postings:
+            by_file.setdefault(self._file(key), []).append(f"{key}\t{log_name}\t{seq}\t{tag}\n")
+        if by_file:
+            self.dir.mkdir(parents=True, exist_ok=True)
+        for path, lines in by_file.items():
+            # Unbuffered: one write() per file, so lines of concurrent writers never interleave
+            with open(path, "ab", buffering=0) as f:
+                f.write("".join(lines).encode("utf-8"))
+
+    def get(self, key):
+        """Sorted (log name, seq, tag) postings of a key"""
+        try:
+            data = self._file(key).read_bytes().decode("utf-8", errors="replace")
+        except OSError:
+            return []
+        prefix = key + "\t"
+        found = set()
+        for line in data.split("\n")[:-1]:  # the last piece has no newline yet, or is empty
+            if line.startswith(prefix):
+                _, log_name, seq, tag = line.split("\t")
+                found.add((log_name, int(seq), tag))
+        return sorted(found)
+
+
+def index_entries(base_dir, log_name, numbered, ends=None):
+    """Add the postings of (seq, hydrated entry) pairs of one day, for every kind,
+    or with `ends` ({kind: seq}) for the kinds in it, up to that seq"""
+    kinds = KINDS if ends is None else {kind: KINDS[kind] for kind in ends}
+    postings = {kind: [] for kind in kinds}
+    for seq, entry in numbered:
+        if not isinstance(entry, dict):
+            continue
+        tag = entry.get("type", "create")
+        for kind, (_, keys) in kinds.items():
+            if ends is None or seq < ends[kind]:
+                postings[kind].extend((key, log_name, seq, tag) for key in keys(entry))
+    for kind, items in postings.items():
+        PostingLists(base_dir, kind).add(items)
+
+
+def _unindexed(state):
+    """{kind: seq} of the kinds with entries before seq not indexed yet (None: all entries)"""
+    if state is None:
+        return {kind: None for kind in KINDS}
+    return {kind: state["indexed_from"].get(kind) for kind in KINDS
+            if state["indexed_from"].get(kind, state["dropped"] + 1) > state["dropped"]}
+
+
+def index_day(log_path):
+    """Index what the writer did not of a closed day; True if there was anything to do"""
+    log_path = pathlib.Path(log_path)
+    base_dir, name = log_path.parent, log_path.name
+    state = load_state(base_dir, name) or {"dropped": 0, "indexed_from": {}}
+    unindexed = _unindexed(state)
+    if not unindexed:
+        return False
+    entries = enumerate(iter_entries(log_path), state["dropped"])
+    if None not in unindexed.values():
+        entries = itertools.islice(entries, max(unindexed.values()) - state["dropped"])
+    ends = {kind: float("inf") if seq is None else seq for kind, seq in unindexed.items()}
+    index_entries(base_dir, name, entries, ends)
+    state["indexed_from"] = {kind: state["dropped"] for kind in KINDS}
+    save_state(base_dir, name, state)
+    return True
+
+
+def index_days(log_paths, deadline=None):
+    """Day scan running index_day() on each log; returns how many needed it"""
+    done = 0
+    for lf in log_paths:
+        check_deadline(deadline)
+        if index_day(lf):
+            done += 1
+    return done
+
+
+def _status(log_path, kind=None):
+    """"complete", "closed" (index_day() has work to do) or "live" (still written, partly
+    indexed), for one kind or all of them"""
+    if (str(log_path.parent), log_path.name) in _complete:
+        return "complete"
+    unindexed = _unindexed(load_state(log_path.parent, log_path.name))
+    if not unindexed:
+        _complete.add((str(log_path.parent), log_path.name))
+    if not unindexed or (kind is not None and kind not in unindexed):
+        return "complete"
+    return "closed" if frozen_source(log_path, INDEX_MIN_AGE) is not None else "live"
+
+
+def incomplete_days(log_paths):
+    """The closed daily logs that index_day() still has to complete"""
+    return [lf for lf in map(pathlib.Path, log_paths) if _status(lf) == "closed"]
+
+
+def _scan_day(log_path, kind, key, tags):
+    """(log name, position, tag) of a key's entries in one log, read from the log itself"""
+    keys = KINDS[kind][1]
+    for pos, entry in enumerate(iter_entries(log_path)):
+        tag = entry.get("type", "create") if isinstance(entry, dict) else None
+        if tag is not None and (tags is None or tag in tags) and key in keys(entry):
+            yield log_path.name, pos, tag
+
+
+def lookup(base_dir, kind, key, log_names, tags=None):
+    """Sorted (log name, position, tag) of a key's entries in the given daily logs,
+    optionally only those whose type is one of `tags`. Closed days not fully indexed
+    are indexed first; run index_days() over incomplete_days() on a pool beforehand
+    to spread that out."""
+    key = str(key)
+    wanted = set(log_names)
+    found = []
+    for name in sorted(wanted):
+        lf = pathlib.Path(base_dir) / name
+        status = _status(lf, kind)
+        if status == "closed":
+            index_day(lf)
+        elif status == "live":
+            wanted.discard(name)
+            found.extend(_scan_day(lf, kind, key, tags))
+    states = {}
+    for log_name, seq, tag in PostingLists(base_dir, kind).get(key):
+        if log_name not in wanted or (tags is not None and tag not in tags):
+            continue
+        if log_name not in states:
+            states[log_name] = load_state(base_dir, log_name)
+        state = states[log_name]
+        if state is None or seq < state["dropped"]:
+            continue
+        found.append((log_name, seq - state["dropped"], tag))
+    return sorted(found)
+
+
+def read_found(base_dir, kind, key, found):
+    """Yield (log name, position, tag, entry) for lookup() results, in the order given,
+    reading each day's entries once. Entries no longer under the key are left out."""
+    key = str(key)
+    keys = KINDS[kind][1]
+    for log_name, group in itertools.groupby(found, key=operator.itemgetter(0)):
+        group = list(group)
+        positions = sorted({pos for _, pos, _ in group})
+        entries = dict(zip(positions, entries_at(pathlib.Path(base_dir) / log_name, positions)))
+        for _, pos, tag in group:
+            entry = entries.get(pos)
+            if entry is not None and key in keys(entry):
+                yield log_name, pos, tag, entry
+
+
+# --- THREADS ---
+def _message(base_dir, log_names, message_id):
+    """The create entry of a message, tagged with its log, or None if it was not logged"""
+    found = lookup(base_dir, "message", message_id, log_names, tags=("create",))
+    for log_name, _, _, entry in read_found(base_dir, "message", message_id, found):
+        entry["log_file"] = pathlib.Path(log_name).stem
+        return entry
+    return None
+
+
+def _node(message_id, entry):
+    if entry is None:
+        return {"message_id": message_id, "missing": True, "replies": []}
+    return {**entry, "replies": []}
+
+
+def reply_tree(base_dir, log_names, message_id, max_depth, max_size):
+    """(root node, messages in the tree, whether a bound cut it short) of the reply
+    thread holding a message. Follows reply_to up to the top (at most max_depth
+    steps), then the reply postings down, breadth first, at most max_depth levels
+    and max_size messages. Nodes are create entries with a "replies" list; messages
+    replied to that were never logged are {"message_id", "missing": True} nodes."""
+    message_id = str(message_id)
+    entry = _message(base_dir, log_names, message_id)
+    seen = {message_id}
+    truncated = False
+    for _ in range(max_depth):
+        parent = str((entry or {}).get("reply_to") or "")
+        if not parent.isdigit() or parent in seen:
+            break
+        seen.add(parent)
+        message_id, entry = parent, _message(base_dir, log_names, parent)
+    else:
+        truncated = bool((entry or {}).get("reply_to"))
+    if entry is None and not lookup(base_dir, "reply", message_id, log_names, tags=("create",)):
+        return None, 0, False
+    root = _node(message_id, entry)
+    seen = {message_id}
+    size = 1
+    queue = collections.deque([(root, message_id, 0)])
+    while queue:
+        node, node_id, depth = queue.popleft()
+        found = lookup(base_dir, "reply", node_id, log_names, tags=("create",))
+        if found and (depth >= max_depth or size >= max_size):
+            truncated = True
+            continue
+        for log_name, _, _, child in read_found(base_dir, "reply", node_id, found):
+            child_id = str(child.get("message_id") or child.get("id"))
+            if child_id in seen:
+                continue
+            if size >= max_size:
+                truncated = True
+                break
+            seen.add(child_id)
+            size += 1
+            child["log_file"] = pathlib.Path(log_name).stem
+            child_node = _node(child_id, child)
+            node["replies"].append(child_node)
+            queue.append((child_node, child_id, depth + 1))
+    return root, size, truncated
@@ -0,0 +1,255 @@
+"""
+Search queries
+parse_query() turns a search string into a Query, e.g.
+
+    pizza "free food" ~pudge author:alice channel:#general type:edit|delete
+    after:2026-01-01 before:2026-02-01 has:attachment
+
+- bare words and "quoted phrases" must all appear in the content (any case)
+- ~word matches a word of the content within FUZZY_TOLERANCE edits
+- author: a username, display name, user ID or @mention
+- channel: a channel name (with or without #), channel ID or #mention
+- type: create, edit, delete or reaction; several joined with |
+- after: / before: a YYYY-MM-DD day, exclusive, compared with the daily log's date
+- has:attachment
+
+Repeating author: or channel: allows any of the values. Words like
+`https://...` whose prefix is not a filter stay plain search terms.
+
+Query.days() and Query.scan() are the plan, and touch message bodies last:
+1. Date filters pick the daily logs to read at all. Custom logs have no
+   date and are left out whenever a date filter is given.
+2. author: and channel: are resolved against each day's dictionary (the
+   archive index, for archived days). A day whose dictionary holds none of
+   them is skipped unread; otherwise the resolved IDs and channel names are
+   byte prefilters for scan_entries(). A day with a dictionary is taken to be
+   fully normalized, as the bot, convert_logs.py and archiving leave it.
+3. Logs that are no longer written have a trigram index (shared/trigram.py):
+   text and ~fuzzy terms are looked up there, and only the candidate entries
+   are read. Otherwise the longest text term is the scan's byte prefilter.
+   Either way, the whole query is checked on the decoded entries.
+
+Results are fetched a page at a time. A cursor is an opaque string holding
+the query text, the log the next page starts in and how many of that log's
+matches came before it, so an open search keeps nothing but its cursor and
+each page re-reads at most the one log it resumes in.
+"""
+import base64
+import binascii
+import json
+import pathlib
+import re
+from datetime import date
+
+from shared.fuzzy import fuzzy_contains
+from shared.logstore import LogDictionary
+from shared.partition import check_deadline
+from shared.scan import entries_at, scan_entries
+from shared.trigram import candidates
+
+TYPES = ("create", "edit", "delete", "reaction")
+HAS = ("attachment",)
+FILTERS = ("author", "channel", "type", "after", "before", "has")
+TOKEN = re.compile(r'(\w+):("[^"]*"?|\S+)|"([^"]*)"?|\S+')
+USER_MENTION = re.compile(r"<@!?(\d+)>")
+CHANNEL_MENTION = re.compile(r"<#(\d+)>")
+
+
+class QueryError(ValueError):
+    pass
+
+
+def log_date(log_path):
+    """Date of a daily log from its name, or None for custom logs"""
+    name = getattr(log_path, "name", str(log_path)).rsplit("/", 1)[-1]
+    if not name.startswith("logs_"):
+        return None
+    try:
+        return date.fromisoformat(name[len("logs_"):len("logs_YYYY-MM-DD")])
+    except ValueError:
+        return None
+
+
+class Query:
+    """A parsed search: content terms plus filters. Plain data, so it can be sent to pool workers."""
+
+    def __init__(self):
+        self.terms = []    # lowercase substrings of the content
+        self.fuzzy = []    # lowercase words matched with fuzzy_contains
+        self.authors = []  # lowercase names or IDs
+        self.channels = []
+        self.types = set()
+        self.after = None
+        self.before = None
+        self.has = set()
+
+    def is_empty(self):
+        return not (self.terms or self.fuzzy or self.authors or self.channels or self.types
+                    or self.after or self.before or self.has)
+
+    def _author_matches(self, data):
+        names = {str(data.get("author_id")), (data.get("author") or "").lower(),
+                 (data.get("author_display") or "").lower()}
+        return any(a in names for a in self.authors)
+
+    def _channel_matches(self, data):
+        names = {str(data.get("channel_id")), (data.get("channel") or "").lower()}
+        return any(c in names for c in self.channels)
+
+    def matches(self, entry):
+        """Full check of one hydrated entry, except the date filters (see days())"""
+        if self.types and entry.get("type") not in self.types:
+            return False
+        if self.authors and not self._author_matches(entry):
+            return False
+        if self.channels and not self._channel_matches(entry):
+            return False
+        if "attachment" in self.has and not entry.get("attachments"):
+            return False
+        content = (entry.get("content") or "").lower()
+        if not all(term in content for term in self.terms):
+            return False
+        return all(fuzzy_contains(content, word) for word in self.fuzzy)
+
+    def days(self, log_paths):
+        """The logs the date filters allow"""
+        if not (self.after or self.before):
+            return list(log_paths)
+        kept = []
+        for lf in log_paths:
+            day = log_date(lf)
+            if day is None or (self.after and day <= self.after) or (self.before and day >= self.before):
+                continue
+            kept.append(lf)
+        return kept
+
+    def scan(self, log_path):
+        """Yield the matching entries of one log, hydrated"""
+        dictionary = LogDictionary.load(log_path)
+        author_ids = channels = None
+        if self.authors and dictionary.authors:
+            author_ids = {str(a["author_id"]) for a in dictionary.authors
+                          if a.get("author_id") is not None and self._author_matches(a)}
+            if not author_ids:
+                return
+        if self.channels and dictionary.channels:
+            channels = {c["channel"] for c in dictionary.channels
+                        if c.get("channel") is not None and self._channel_matches(c)}
+            if not channels:
+                return
+        positions = candidates(log_path, self.terms, self.fuzzy)
+        if positions is not None:
+            for entry in entries_at(log_path, positions):
+                if self.matches(entry):
+                    yield entry
+            return
+        term = max(self.terms, key=len) if self.terms else None
+        yield from scan_entries(log_path, term=term, author_id=author_ids, channel=channels,
+                                entry_type=self.types or None, match=self.matches)
+
+
+def _parse_date(key, value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise QueryError(f"{key}: needs a date like 2026-01-31, not '{value}'")
+
+
+def parse_query(text):
+    """Parse a search string; raises QueryError for a malformed filter"""
+    query = Query()
+    for m in TOKEN.finditer(text or ""):
+        key, value, phrase = m.group(1), m.group(2), m.group(3)
+        if key is not None and key.lower() in FILTERS:
+            key = key.lower()
+            value = value.strip('"').strip()
+            if not value:
+                raise QueryError(f"{key}: needs a value")
+            if key == "author":
+                mention = USER_MENTION.fullmatch(value)
+                query.authors.append(mention.group(1) if mention else value.lstrip("@").lower())
+            elif key == "channel":
+                mention = CHANNEL_MENTION.fullmatch(value)
+                query.channels.append(mention.group(1) if mention else value.lstrip("#").lower())
+            elif key == "type":
+                for t in value.lower().split("|"):
+                    if t not in TYPES:
+                        raise QueryError(f"type: must be one of {', '.join(TYPES)}, not '{t}'")
+                    query.types.add(t)
+            elif key == "has":
+                if value.lower() not in HAS:
+                    raise QueryError(f"has: must be one of {', '.join(HAS)}, not '{value}'")
+                query.has.add(value.lower())
+            elif key == "after":
+                query.after = _parse_date(key, value)
+            else:
+                query.before = _parse_date(key, value)
+        elif phrase is not None:
+            if phrase.strip():
+                query.terms.append(phrase.lower())
+        else:
+            word = m.group(0).lower()
+            if word.startswith("~") and len(word) > 1:
+                query.fuzzy.append(word[1:])
+            else:
+                query.terms.append(word)
+    return query
+
+
+
+# --- CURSORS ---
+def encode_cursor(text, log_name, skip):
+    data = json.dumps([text, log_name, skip], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(query text, log name, matches to skip) from a cursor; raises QueryError if it is not one"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        text, log_name, skip = json.loads(data)
+        if not isinstance(text, str) or not isinstance(log_name, str) or not isinstance(skip, int) or skip < 0:
+            raise ValueError(cursor)
+    except (ValueError, TypeError, binascii.Error):
+        raise QueryError("invalid search cursor")
+    return text, log_name, skip
+
+
+def page_logs(query, log_paths, start=None):
+    """The logs a page has to look at: those the date filters allow, from the cursor's log on"""
+    log_paths = query.days(log_paths)
+    if start is None:
+        return log_paths
+    return [lf for lf in log_paths if pathlib.Path(lf).name >= start[0]]
+
+
+def page_scan(log_paths, query, start, limit, deadline=None):
+    """Day scan for one page: matches tagged with their log, at most `limit`, leaving
+    out the first start[1] matches of log start[0]"""
+    results = []
+    for lf in log_paths:
+        check_deadline(deadline)
+        lf = pathlib.Path(lf)
+        skip = start[1] if start is not None and lf.name == start[0] else 0
+        for entry in query.scan(lf):
+            if skip:
+                skip -= 1
+                continue
+            entry["log_file"] = lf.stem
+            results.append(entry)
+            if len(results) >= limit:
+                return results
+    return results
+
+
+def finish_page(text, results, limit, start=None):
+    """(page, cursor of the next page or None) from the merged page_scan results.
+    Scan for limit + 1 results so a full last page is not mistaken for the end."""
+    page = results[:limit]
+    if len(results) <= limit:
+        return page, None
+    last = page[-1]["log_file"] + ".json"
+    skip = sum(1 for e in page if e["log_file"] + ".json" == last)
+    if start is not None and start[0] == last:
+        skip += start[1]
+    return page, encode_cursor(text, last, skip)
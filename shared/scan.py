@@ -0,0 +1,281 @@
+"""
+Filtered scans over daily logs
+scan_entries() yields the entries of one log that match a set of filters
+without decoding the whole log. Every filter is first turned into a byte
+pattern that a matching entry must contain in its stored form, and only the
+records containing all of them are decoded and checked exactly:
+
+- JSON logs written one entry per line (write_json_lines) are memory-mapped
+  and searched for the first pattern; only the lines it hits are decoded.
+- Binary logs are memory-mapped and each record is searched in place.
+- Archived days are searched block by block after decompression.
+
+A filter that cannot be expressed as bytes (non-ASCII text, or text JSON
+would escape) does not prefilter; the exact check after decoding always
+decides. Logs in any other layout (pretty-printed JSON written by older
+versions, custom logs) are decoded entry by entry as before.
+"""
+import json
+import mmap
+import pathlib
+import re
+
+from shared.logstore import (
+    CODEC_MSGPACK, HEADER, JSON_LINES_HEAD, RECORD_LENGTH, LogDictionary, archive_for, decode_payload,
+    msgpack, physical_path, read_header, read_raw,
+)
+
+def _json_field(key, values):
+    """Pattern for `"key": value` with any of the values, or None if one can't be matched as bytes"""
+    encoded = []
+    for value in values:
+        text = json.dumps(value)
+        if text != json.dumps(value, ensure_ascii=False):
+            return None
+        encoded.append(re.escape(text.encode("ascii")))
+    if not encoded:
+        return None
+    return re.compile(b'"' + key.encode("ascii") + b'"\\s*:\\s*(?:' + b"|".join(encoded) + b")(?=[\\s,}])")
+
+
+def _msgpack_field(key, values):
+    # A msgpack map stores each key directly followed by its value
+    encoded = [re.escape(msgpack.packb(key) + msgpack.packb(value)) for value in values]
+    return re.compile(b"|".join(encoded)) if encoded else None
+
+
+def _term_pattern(term):
+    """Case-insensitive pattern for a content substring, or None if it can't be matched as bytes"""
+    if not term.isascii() or json.dumps(term)[1:-1] != term:
+        return None
+    return re.compile(re.escape(term.encode("ascii")), re.IGNORECASE)
+
+
+def _either(*patterns):
+    """One pattern matching wherever any of the given ones does; None if any of them is None"""
+    if not patterns or any(p is None for p in patterns):
+        return None
+    return re.compile(b"|".join(b"(?:" + p.pattern + b")" for p in patterns))
+
+
+def _values(value):
+    """A filter value as a set of strings: one value or any of a collection"""
+    if value is None:
+        return None
+    if isinstance(value, (str, int)):
+        return {str(value)}
+    return {str(v) for v in value}
+
+
+def _patterns(dictionary, codec, term, author_ids, channels, entry_types):
+    field = _msgpack_field if codec == CODEC_MSGPACK else _json_field
+    patterns = []
+    if entry_types is not None:
+        patterns.append(field("type", sorted(entry_types)))
+    if author_ids is not None:
+        indexes = [i for i, a in enumerate(dictionary.authors) if str(a.get("author_id")) in author_ids]
+        values = []
+        for author_id in sorted(author_ids):
+            values.extend([author_id, int(author_id)] if author_id.isdigit() else [author_id])
+        # Normalized entries refer to the author by index, older ones carry the ID
+        patterns.append(_either(field("a", indexes), field("author_id", values)) if indexes
+                        else field("author_id", values))
+    if channels is not None:
+        indexes = [i for i, c in enumerate(dictionary.channels) if c.get("channel") in channels]
+        patterns.append(_either(field("c", indexes), field("channel", sorted(channels))) if indexes
+                        else field("channel", sorted(channels)))
+    if term:
+        patterns.append(_term_pattern(term))
+    return [p for p in patterns if p is not None]
+
+
+def _matching_lines(buf, start, end, patterns):
+    """(start, end) of each line in buf[start:end] that every pattern matches"""
+    if not patterns:
+        while start < end:
+            nl = buf.find(b"\n", start, end)
+            nl = end if nl == -1 else nl
+            yield start, nl
+            start = nl + 1
+        return
+    first, rest = patterns[0], patterns[1:]
+    pos = start
+    while pos < end:
+        m = first.search(buf, pos, end)
+        if m is None:
+            return
+        line_start = buf.rfind(b"\n", start, m.start()) + 1 or start
+        line_end = buf.find(b"\n", m.end(), end)
+        line_end = end if line_end == -1 else line_end
+        if all(p.search(buf, line_start, line_end) for p in rest):
+            yield line_start, line_end
+        pos = line_end + 1
+
+
+def _scan_json_lines(mm, patterns):
+    for start, end in _matching_lines(mm, len(JSON_LINES_HEAD) - 1, len(mm), patterns):
+        line = mm[start:end].rstrip(b", \r")
+        if line and line != b"]":
+            yield json.loads(line)
+
+
+def _scan_binary(mm, codec, patterns):
+    pos, size = HEADER.size, len(mm)
+    while pos + RECORD_LENGTH.size <= size:
+        (length,) = RECORD_LENGTH.unpack_from(mm, pos)
+        start = pos + RECORD_LENGTH.size
+        end = start + length
+        if end > size:
+            return  # a record still being appended
+        if all(p.search(mm, start, end) for p in patterns):
+            yield decode_payload(mm[start:end], codec)
+        pos = end
+
+
+def _scan_archive(archive, log_name, patterns):
+    for block in archive.iter_blocks(log_name):
+        for start, end in _matching_lines(block, 0, len(block), patterns):
+            yield json.loads(block[start:end])
+
+
+def _iter_candidates(log_path, term, author_ids, channels, entry_types):
+    """Yield the log's dictionary, then the stored entries that may match, using the
+    byte prefilter where the layout allows it. The dictionary is loaded after the log
+    is opened, so it covers every entry read."""
+    log_path = pathlib.Path(log_path)
+    path = physical_path(log_path)
+    if path.suffix == ".arc":
+        dictionary = LogDictionary.load(log_path)
+        yield dictionary
+        patterns = _patterns(dictionary, None, term, author_ids, channels, entry_types)
+        yield from _scan_archive(archive_for(log_path), log_path.name, patterns)
+        return
+    try:
+        f = open(path, "rb")
+    except OSError:
+        yield LogDictionary()
+        return
+    with f:
+        if path.suffix == ".bin":
+            codec = read_header(f, path)
+            if codec is None:
+                yield LogDictionary()
+                return
+        elif f.read(len(JSON_LINES_HEAD)) != JSON_LINES_HEAD:
+            f.close()
+            entries = read_raw(log_path)
+            yield LogDictionary.load(log_path)
+            yield from entries
+            return
+        else:
+            codec = None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            dictionary = LogDictionary.load(log_path)
+            yield dictionary
+            patterns = _patterns(dictionary, codec, term, author_ids, channels, entry_types)
+            if path.suffix == ".bin":
+                yield from _scan_binary(mm, codec, patterns)
+            else:
+                yield from _scan_json_lines(mm, patterns)
+
+
+def _stored_at(log_path, positions):
+    """Yield the log's dictionary, then the stored entries at the given sorted positions"""
+    log_path = pathlib.Path(log_path)
+    path = physical_path(log_path)
+    archive = archive_for(log_path) if path.suffix == ".arc" else None
+    if archive is not None:
+        yield LogDictionary.load(log_path)
+        yield from archive.entries_at(log_path.name, positions)
+        return
+    try:
+        f = open(path, "rb")
+    except OSError:
+        yield LogDictionary()
+        return
+    with f:
+        if path.suffix == ".bin":
+            codec = read_header(f, path)
+            if codec is None:
+                yield LogDictionary()
+                return
+        elif f.read(len(JSON_LINES_HEAD)) != JSON_LINES_HEAD:
+            f.close()
+            entries = read_raw(log_path)
+            yield LogDictionary.load(log_path)
+            yield from (entries[pos] for pos in positions if 0 <= pos < len(entries))
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield LogDictionary.load(log_path)
+            wanted = iter(positions)
+            target = next(wanted, None)
+            index = 0
+            if path.suffix == ".bin":
+                pos, size = HEADER.size, len(mm)
+                # Skip from record to record by length, decoding only the wanted ones
+                while target is not None and pos + RECORD_LENGTH.size <= size:
+                    (length,) = RECORD_LENGTH.unpack_from(mm, pos)
+                    start, end = pos + RECORD_LENGTH.size, pos + RECORD_LENGTH.size + length
+                    if end > size:
+                        return
+                    if index == target:
+                        yield decode_payload(mm[start:end], codec)
+                        target = next(wanted, None)
+                    index += 1
+                    pos = end
+            else:
+                pos, size = len(JSON_LINES_HEAD) - 1, len(mm)
+                while target is not None and pos < size:
+                    end = mm.find(b"\n", pos)
+                    end = size if end == -1 else end
+                    if index == target:
+                        line = mm[pos:end].rstrip(b", \r")
+                        if not line or line == b"]":
+                            return
+                        yield json.loads(line)
+                        target = next(wanted, None)
+                    index += 1
+                    pos = end + 1
+
+
+def entries_at(log_path, positions):
+    """Yield the hydrated entries at the given positions of a log, in position order,
+    decoding only those (mapped lines or records, or the archive blocks holding them)"""
+    stored = _stored_at(log_path, sorted(set(positions)))
+    dictionary = next(stored)
+    for entry in stored:
+        if isinstance(entry, dict):
+            yield dictionary.hydrate(entry)
+
+
+def scan_entries(log_path, term=None, author_id=None, channel=None, entry_type=None, fields=None, match=None):
+    """Yield the entries of a log matching every given filter, hydrated.
+    term is a case-insensitive content substring; author_id, channel and entry_type
+    take one value or a collection of allowed ones; match is a final check on the
+    hydrated entry. With `fields`, only those fields (plus the filtered ones) are hydrated."""
+    author_ids, channels, entry_types = _values(author_id), _values(channel), _values(entry_type)
+    if not all(v is None or v for v in (author_ids, channels, entry_types)):
+        return  # an empty collection allows nothing
+    term = term.lower() if term else None
+    candidates = _iter_candidates(log_path, term, author_ids, channels, entry_types)
+    dictionary = next(candidates)
+    if fields is not None:
+        fields = set(fields)
+        for name, value in (("content", term), ("author_id", author_ids), ("channel", channels), ("type", entry_types)):
+            if value is not None:
+                fields.add(name)
+    for entry in candidates:
+        if not isinstance(entry, dict):
+            continue
+        entry = dictionary.hydrate(entry) if fields is None else dictionary.hydrate_fields(entry, fields)
+        if entry_types is not None and entry.get("type") not in entry_types:
+            continue
+        if author_ids is not None and str(entry.get("author_id")) not in author_ids:
+            continue
+        if channels is not None and entry.get("channel") not in channels:
+            continue
+        if term and term not in (entry.get("content") or "").lower():
+            continue
+        if match is not None and not match(entry):
+            continue
+        yield entry
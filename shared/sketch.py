@@ -0,0 +1,237 @@
+"""
+Approximate stats from per-day sketches
+Every daily log that is no longer being written gets sketch/<log name>,
+built from one scan of the day:
+- exact message, edit and delete totals with hourly and daily counts in
+  local time (small enough to keep as they are);
+- a HyperLogLog of the author IDs, for distinct users;
+- for users, channels and words, a count-min sketch of the counts plus the
+  day's TOP_KEPT heaviest keys as top-k candidates.
+
+Sketches of different days merge: totals add, HyperLogLog registers take
+the maximum, count-min tables add cell by cell and the candidate lists
+unite. range_sketch() merges a range of days without reading their logs;
+the merge of the closed days is kept in memory and extended as days close,
+so a repeated "all time" request only adds today's log, scanned as it is.
+Top-k counts are count-min estimates: never below the true count, and off
+by at most a small share of the range's total. A sketch records the log it
+was built from and is rebuilt when that changes.
+"""
+import hashlib
+import json
+import math
+import operator
+import os
+import pathlib
+from collections import Counter
+
+from shared.fuzzy import WORD
+from shared.logstore import frozen_source, local_time
+from shared.partition import DayMerger, check_deadline
+from shared.scan import scan_entries
+
+SKETCH_DIR = "sketch"
+SKETCH_VERSION = 2
+SKETCH_MIN_AGE = 3600  # seconds a log must go unwritten before it is sketched
+HLL_BITS = 11          # 2048 registers: about 2.3% standard error
+CMS_WIDTH = 1024
+CMS_DEPTH = 4
+TOP_KEPT = 50          # top-k candidates kept per day and dimension
+MIN_WORD_LENGTH = 4    # shorter words are mostly filler
+DIMENSIONS = ("users", "channels", "words")
+SKETCH_FIELDS = ("type", "author_id", "author", "author_display", "channel", "created_at", "content")
+
+
+def sketch_path(log_path):
+    log_path = pathlib.Path(log_path)
+    return log_path.parent / SKETCH_DIR / log_path.name
+
+
+def _source(log_path):
+    return frozen_source(log_path, SKETCH_MIN_AGE)
+
+
+def _hashes(key):
+    """CMS_DEPTH + 1 independent 64-bit hashes of a key, stable across processes"""
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=8 * (CMS_DEPTH + 1)).digest()
+    return [int.from_bytes(digest[i:i + 8], "little") for i in range(0, len(digest), 8)]
+
+
+class HyperLogLog:
+    """Distinct count estimate in 2**HLL_BITS one-byte registers"""
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers else bytearray(1 << HLL_BITS)
+
+    def add(self, key):
+        h = _hashes(key)[-1]
+        index = h & ((1 << HLL_BITS) - 1)
+        rank = 64 - HLL_BITS - (h >> HLL_BITS).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting while most registers are empty
+        return round(estimate)
+
+
+class CountMinSketch:
+    """Per-key count estimates in CMS_DEPTH rows of CMS_WIDTH counters"""
+
+    def __init__(self, rows=None):
+        self.rows = rows or [[0] * CMS_WIDTH for _ in range(CMS_DEPTH)]
+
+    def add(self, key, count=1):
+        for row, h in zip(self.rows, _hashes(key)):
+            row[h % CMS_WIDTH] += count
+
+    def estimate(self, key):
+        return min(row[h % CMS_WIDTH] for row, h in zip(self.rows, _hashes(key)))
+
+    def merge(self, other):
+        self.rows = [list(map(operator.add, a, b)) for a, b in zip(self.rows, other.rows)]
+
+
+class Sketch:
+    """The sketched stats of one day or, merged, of a range of days"""
+
+    def __init__(self):
+        self.messages = self.edits = self.deletes = 0
+        self.hourly = Counter()
+        self.daily = Counter()
+        self.authors = HyperLogLog()
+        self.candidates = {dim: set() for dim in DIMENSIONS}
+        self.counts = {dim: CountMinSketch() for dim in DIMENSIONS}
+
+    @classmethod
+    def build(cls, log_path):
+        sketch = cls()
+        exact = {dim: Counter() for dim in DIMENSIONS}
+        for entry in scan_entries(log_path, fields=SKETCH_FIELDS):
+            t = entry.get("type", "create")
+            if t == "edit":
+                sketch.edits += 1
+            elif t == "delete":
+                sketch.deletes += 1
+            if t != "create":
+                continue
+            sketch.messages += 1
+            if entry.get("author_id") is not None:
+                sketch.authors.add(entry["author_id"])
+            exact["users"][entry.get("author_display") or entry.get("author", "Unknown")] += 1
+            exact["channels"][entry.get("channel", "unknown")] += 1
+            for word in WORD.findall((entry.get("content") or "").lower()):
+                if len(word) >= MIN_WORD_LENGTH and not word.isdigit():
+                    exact["words"][word] += 1
+            ts = local_time(entry.get("created_at"))
+            if ts is not None:
+                sketch.hourly[ts.hour] += 1
+                sketch.daily[ts.strftime("%Y-%m-%d")] += 1
+        for dim, counter in exact.items():
+            for key, count in counter.items():
+                sketch.counts[dim].add(key, count)
+            sketch.candidates[dim] = {key for key, _ in counter.most_common(TOP_KEPT)}
+        return sketch
+
+    def merge(self, other):
+        self.messages += other.messages
+        self.edits += other.edits
+        self.deletes += other.deletes
+        self.hourly.update(other.hourly)
+        self.daily.update(other.daily)
+        self.authors.merge(other.authors)
+        for dim in DIMENSIONS:
+            self.candidates[dim] |= other.candidates[dim]
+            self.counts[dim].merge(other.counts[dim])
+        return self
+
+    def copy(self):
+        return Sketch().merge(self)
+
+    def distinct_users(self):
+        return self.authors.count()
+
+    def top(self, dim, n=10):
+        """The n keys with the highest estimated counts, as (key, estimate) pairs"""
+        counts = self.counts[dim]
+        return Counter({key: counts.estimate(key) for key in self.candidates[dim]}).most_common(n)
+
+    def to_dict(self):
+        return {
+            "messages": self.messages, "edits": self.edits, "deletes": self.deletes,
+            "hourly": self.hourly, "daily": self.daily, "authors": self.authors.registers.hex(),
+            "candidates": {dim: sorted(keys) for dim, keys in self.candidates.items()},
+            "counts": {dim: cms.rows for dim, cms in self.counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        sketch.messages, sketch.edits, sketch.deletes = data["messages"], data["edits"], data["deletes"]
+        sketch.hourly = Counter({int(h): c for h, c in data["hourly"].items()})
+        sketch.daily = Counter(data["daily"])
+        sketch.authors = HyperLogLog(bytes.fromhex(data["authors"]))
+        sketch.candidates = {dim: set(data["candidates"][dim]) for dim in DIMENSIONS}
+        sketch.counts = {dim: CountMinSketch(data["counts"][dim]) for dim in DIMENSIONS}
+        return sketch
+
+    def save(self, path, source):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name: several processes may sketch the same day at once
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": SKETCH_VERSION, "source": source, **self.to_dict()},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+def ensure_sketch(log_path, source=None):
+    """The day's sketch, built and saved first if it is missing or stale.
+    None for a log that is still being written."""
+    source = source or _source(log_path)
+    if source is None:
+        return None
+    path = sketch_path(log_path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == SKETCH_VERSION and data.get("source") == source:
+            return Sketch.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        pass
+    sketch = Sketch.build(log_path)
+    try:
+        sketch.save(path, source)
+    except OSError:
+        pass
+    return sketch
+
+
+def prepare_sketches(log_paths, deadline=None):
+    """Day scan building the missing sketches of closed days; returns how many days have one"""
+    ready = 0
+    for lf in log_paths:
+        check_deadline(deadline)
+        if ensure_sketch(lf) is not None:
+            ready += 1
+    return ready
+
+
+def stale_sketches(log_paths):
+    """The closed logs range_sketch() needs a sketch for that has none saved yet"""
+    return [lf for lf in _days.pending(log_paths) if not sketch_path(lf).exists()]
+
+
+def range_sketch(log_paths):
+    """The merged sketch of a range of daily logs"""
+    return _days.merged(log_paths)
+
+
+_days = DayMerger(_source, ensure_sketch, Sketch.build, Sketch)
@@ -0,0 +1,211 @@
+"""
+Message counts over time
+Every daily log that is no longer being written gets series/<log name>: its
+messages counted per local minute (LOCAL_TIMEZONE_OFFSET), in total, per
+channel and per user. A time series for any range is the sum of the minute
+counters of the days it covers, downsampled to the requested bucket, so no
+zoom level reads the logs; only today's log is counted as it is. Counters
+record the log they were built from and are rebuilt when that changes.
+
+Minutes count from the Unix epoch in local time, so buckets of 5 minutes,
+an hour or a day all start on local boundaries.
+"""
+import json
+import os
+import pathlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from shared.logstore import EPOCH, LOCAL_TIMEZONE_OFFSET, frozen_source, local_time, physical_path
+from shared.partition import check_deadline
+from shared.query import log_date
+from shared.scan import scan_entries
+
+SERIES_DIR = "series"
+SERIES_VERSION = 1
+SERIES_MIN_AGE = 3600  # seconds a log must go unwritten before its counters are saved
+BUCKETS = {"5m": 5, "1h": 60, "1d": 1440}  # bucket name -> minutes
+GROUPS = {"channel": ("channel",), "user": ("author_display", "author")}
+SERIES_FIELDS = ("type", "created_at", "channel", "author", "author_display")
+MAX_BUCKETS = 2000
+MAX_LOADED = 64
+
+_loaded = {}  # log path -> (source or stat, MinuteCounts)
+
+
+def series_path(log_path):
+    log_path = pathlib.Path(log_path)
+    return log_path.parent / SERIES_DIR / log_path.name
+
+
+def _source(log_path):
+    return frozen_source(log_path, SERIES_MIN_AGE)
+
+
+def minute_of(ts):
+    """Local epoch minute of a naive local datetime"""
+    return int((ts - EPOCH).total_seconds() // 60)
+
+
+def time_of(minute):
+    return EPOCH + timedelta(minutes=minute)
+
+
+def parse_local(text):
+    """Naive local datetime from an ISO date or datetime; one with an offset is converted.
+    Raises ValueError if it does not parse."""
+    ts = datetime.fromisoformat(text)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None) + timedelta(hours=LOCAL_TIMEZONE_OFFSET)
+    return ts
+
+
+class MinuteCounts:
+    """Messages per local minute of one day, in total and per channel and user"""
+
+    def __init__(self, total=None, groups=None):
+        self.total = total or Counter()
+        self.groups = groups or {group: {} for group in GROUPS}
+
+    @classmethod
+    def build(cls, log_path):
+        counts = cls()
+        for entry in scan_entries(log_path, entry_type="create", fields=SERIES_FIELDS):
+            ts = local_time(entry.get("created_at"))
+            if ts is None:
+                continue
+            minute = minute_of(ts)
+            counts.total[minute] += 1
+            for group, fields in GROUPS.items():
+                key = next((entry[f] for f in fields if entry.get(f)), "unknown")
+                counts.groups[group].setdefault(key, Counter())[minute] += 1
+        return counts
+
+    @staticmethod
+    def _pack(counter):
+        minutes = sorted(counter)
+        return [minutes, [counter[m] for m in minutes]]
+
+    @staticmethod
+    def _unpack(packed):
+        return Counter(dict(zip(*packed)))
+
+    def save(self, path, source):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": SERIES_VERSION, "source": source, "total": self._pack(self.total),
+            "groups": {group: {key: self._pack(c) for key, c in keys.items()} for group, keys in self.groups.items()},
+        }
+        # Unique temp name: several processes may count the same day at once
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_dict(cls, data):
+        groups = {group: {key: cls._unpack(p) for key, p in data["groups"].get(group, {}).items()}
+                  for group in GROUPS}
+        return cls(cls._unpack(data["total"]), groups)
+
+
+def ensure_series(log_path, source=None):
+    """The day's minute counters, built and saved first if they are missing or stale.
+    None for a log that is still being written."""
+    source = source or _source(log_path)
+    if source is None:
+        return None
+    path = series_path(log_path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == SERIES_VERSION and data.get("source") == source:
+            return MinuteCounts.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        pass
+    counts = MinuteCounts.build(log_path)
+    try:
+        counts.save(path, source)
+    except OSError:
+        pass
+    return counts
+
+
+def prepare_series(log_paths, deadline=None):
+    """Day scan building the missing counters of closed days; returns how many days have them"""
+    ready = 0
+    for lf in log_paths:
+        check_deadline(deadline)
+        if ensure_series(lf) is not None:
+            ready += 1
+    return ready
+
+
+def missing_series(log_paths):
+    """The closed logs whose counters are neither loaded nor saved yet"""
+    return [lf for lf in log_paths
+            if str(lf) not in _loaded and not series_path(lf).exists() and _source(lf) is not None]
+
+
+def load_series(log_path):
+    """A day's minute counters, kept in memory while the log stays the same"""
+    source = _source(log_path)
+    if source is None:
+        try:
+            st = physical_path(log_path).stat()
+            source = ["live", st.st_mtime_ns, st.st_size]
+        except OSError:
+            source = ["live"]
+    cached = _loaded.get(str(log_path))
+    if cached and cached[0] == source:
+        return cached[1]
+    counts = ensure_series(log_path, source) if source[0] != "live" else MinuteCounts.build(log_path)
+    if len(_loaded) >= MAX_LOADED:
+        _loaded.pop(next(iter(_loaded)))
+    _loaded[str(log_path)] = (source, counts)
+    return counts
+
+
+def series_logs(log_paths, start, end):
+    """The daily logs holding messages between two local datetimes"""
+    return [lf for lf in log_paths if log_date(lf) is not None and start.date() <= log_date(lf) <= end.date()]
+
+
+def bucket_range(start, end, bucket):
+    """(first minute, bucket size, number of buckets) covering [start, end) on local bucket boundaries"""
+    size = BUCKETS[bucket]
+    first = minute_of(start) // size * size
+    return first, size, max(0, -(-(minute_of(end) - first) // size))
+
+
+def downsample(counter, first, size, n, low, high):
+    """Sums of a minute counter over n buckets of size minutes from minute `first`,
+    counting only minutes in [low, high)"""
+    out = [0] * n
+    for minute, count in counter.items():
+        if low <= minute < high:
+            out[(minute - first) // size] += count
+    return out
+
+
+def timeseries(log_paths, start, end, bucket, by=None, limit=10):
+    """(bucket start times, [(name, counts per bucket)]) of messages in [start, end).
+    The first and last buckets only count the part of them inside the range. Without
+    `by` one series named "all"; with it, one for each of the `limit` busiest channels
+    or users of the range."""
+    first, size, n = bucket_range(start, end, bucket)
+    low, high = minute_of(start), minute_of(end)
+    days = [load_series(lf) for lf in series_logs(log_paths, start, end)]
+    times = [time_of(first + i * size) for i in range(n)]
+    if by is None:
+        total = Counter()
+        for day in days:
+            total.update(day.total)
+        return times, [("all", downsample(total, first, size, n, low, high))]
+    per_key = {}
+    for day in days:
+        for key, counter in day.groups[by].items():
+            per_key.setdefault(key, Counter()).update(counter)
+    series = [(key, downsample(counter, first, size, n, low, high)) for key, counter in per_key.items()]
+    series.sort(key=lambda s: sum(s[1]), reverse=True)
+    return times, [s for s in series[:limit] if sum(s[1])]
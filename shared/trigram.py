@@ -0,0 +1,182 @@
+"""
+Trigram index over message content
+For each log that is no longer being written, the first search that needs it
+builds index/<log name>: the day's vocabulary (lowercase words of the
+content, split like fuzzy_contains() splits them) with, per word, the
+positions of the entries using it. Loading it also maps every trigram to the
+words containing it.
+
+A search term is answered from the vocabulary instead of the entries:
+- a substring term: every word run in it must lie inside a word of the
+  content, so its entries are those using, for each run, a word containing
+  the run (found through the run's trigrams, then checked);
+- a ~fuzzy word: candidate words share enough trigrams with it (or, when
+  the word is too short for trigrams to rule anything out, its first letter
+  and a close length) and are confirmed with the bounded edit distance of
+  fuzzy_contains().
+That gives candidate positions only; the caller reads just those entries
+and checks them exactly. An index records the log it was built from and is
+rebuilt when that changes.
+"""
+import json
+import os
+import pathlib
+
+from shared.fuzzy import FUZZY_TOLERANCE, WORD, word_matches
+from shared.logstore import INDEX_DIR, frozen_source, iter_raw
+
+INDEX_VERSION = 1
+INDEX_MIN_AGE = 3600  # seconds a log must go unwritten before it is indexed
+MAX_LOADED = 64
+
+_loaded = {}  # index path -> (source, TrigramIndex)
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def index_path(log_path):
+    log_path = pathlib.Path(log_path)
+    return log_path.parent / INDEX_DIR / log_path.name
+
+
+def _source(log_path):
+    return frozen_source(log_path, INDEX_MIN_AGE)
+
+
+class TrigramIndex:
+    """A log's vocabulary with the entry positions of every word"""
+
+    def __init__(self, words, postings):
+        self.words = words
+        self.postings = postings
+        self.grams = {}
+        for i, word in enumerate(words):
+            for gram in trigrams(word):
+                self.grams.setdefault(gram, []).append(i)
+
+    @classmethod
+    def build(cls, log_path):
+        positions = {}
+        for pos, entry in enumerate(iter_raw(log_path)):
+            if isinstance(entry, dict):
+                for word in set(WORD.findall((entry.get("content") or "").lower())):
+                    positions.setdefault(word, []).append(pos)
+        words = sorted(positions)
+        return cls(words, [positions[w] for w in words])
+
+    def save(self, path, source):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name: several processes may index the same day at once
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "source": source, "words": self.words, "postings": self.postings},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def _entries(self, word_ids):
+        found = set()
+        for i in word_ids:
+            found.update(self.postings[i])
+        return found
+
+    def _words_containing(self, run):
+        grams = trigrams(run)
+        if not grams:
+            return [i for i, word in enumerate(self.words) if run in word]
+        candidates = None
+        for gram in grams:
+            ids = self.grams.get(gram)
+            if not ids:
+                return []
+            candidates = set(ids) if candidates is None else candidates & set(ids)
+        return [i for i in candidates if run in self.words[i]]
+
+    def substring(self, term):
+        """Positions of entries that may contain term, or None if it has no word to look up"""
+        runs = WORD.findall(term.lower())
+        if not runs:
+            return None
+        found = None
+        for run in runs:
+            entries = self._entries(self._words_containing(run))
+            found = entries if found is None else found & entries
+            if not found:
+                break
+        return found
+
+    def fuzzy(self, keyword, tolerance=FUZZY_TOLERANCE):
+        """Positions of entries with a word fuzzy_contains() would match to keyword"""
+        keyword = keyword.lower()
+        grams = trigrams(keyword)
+        # An edit touches at most 3 trigrams, so a close word keeps the rest
+        needed = len(grams) - 3 * tolerance
+        if needed > 0:
+            shared = {}
+            for gram in grams:
+                for i in self.grams.get(gram, ()):
+                    shared[i] = shared.get(i, 0) + 1
+            candidates = [i for i, n in shared.items() if n >= needed]
+        else:
+            candidates = range(len(self.words))
+        return self._entries(i for i in candidates if word_matches(self.words[i], keyword, tolerance))
+
+
+def ensure_index(log_path, source=None):
+    """The log's trigram index, built and saved first if it is missing or stale.
+    None for a log that is still being written."""
+    source = source or _source(log_path)
+    if source is None:
+        return None
+    path = index_path(log_path)
+    index = None
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION and data.get("source") == source:
+            index = TrigramIndex(data["words"], data["postings"])
+    except (OSError, ValueError, KeyError):
+        pass
+    if index is None:
+        index = TrigramIndex.build(log_path)
+        try:
+            index.save(path, source)
+        except OSError:
+            pass
+    return index
+
+
+def load_index(log_path):
+    """ensure_index(), kept in memory while the log stays the same"""
+    source = _source(log_path)
+    if source is None:
+        return None
+    path = index_path(log_path)
+    cached = _loaded.get(path)
+    if cached and cached[0] == source:
+        return cached[1]
+    index = ensure_index(log_path, source)
+    if len(_loaded) >= MAX_LOADED:
+        _loaded.pop(next(iter(_loaded)))
+    _loaded[path] = (source, index)
+    return index
+
+
+def candidates(log_path, terms, fuzzy):
+    """Positions of the entries that may match all the terms and fuzzy words,
+    or None if the log has no index or no term can use it"""
+    if not terms and not fuzzy:
+        return None
+    index = load_index(log_path)
+    if index is None:
+        return None
+    found = None
+    for term in terms:
+        entries = index.substring(term)
+        if entries is not None:
+            found = entries if found is None else found & entries
+    for word in fuzzy:
+        entries = index.fuzzy(word)
+        found = entries if found is None else found & entries
+    return found
@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
 """
-Startup script to run both Discord bot and Flask web API in the same process.
+Startup script to run both Discord bot and Flask web API in the same service.
 This allows both services to share the same volume on Railway.
+
+SERVE_MODE selects how they run:
+  combined (default) - bot in a background thread, Flask dev server in the main thread
+  workers            - bot in its own process, API under gunicorn with several workers
 """
 import os
+import signal
+import subprocess
 import sys
 import threading
 import time
 from pathlib import Path
 
+ROOT_DIR = Path(__file__).parent
+
 def run_bot():
     """Run the Discord bot"""
     print("[🤖 BOT] Starting Discord bot...")
@@ -44,11 +52,71 @@ def run_web():
         import traceback
         traceback.print_exc()
 
+def gunicorn_command(port):
+    """Build the gunicorn command line for the web API"""
+    workers = int(os.environ.get('WEB_CONCURRENCY', min((os.cpu_count() or 1) * 2 + 1, 8)))
+    threads = int(os.environ.get('WEB_THREADS', 4))
+    return [
+        sys.executable, "-m", "gunicorn",
+        "--chdir", str(ROOT_DIR / "web"),
+        "--bind", f"0.0.0.0:{port}",
+        "--workers", str(workers),
+        "--threads", str(threads),
+        "--worker-class", "gthread",
+        "--timeout", os.environ.get('WEB_TIMEOUT', "120"),
+        "--access-logfile", "-",
+        "api:app",
+    ]
+
+def run_workers():
+    """Run the bot as a single dedicated process and the API under gunicorn.
+    The API workers share state with the bot through the log volume, so only
+    one bot connects to the gateway no matter how many workers serve requests."""
+    port = int(os.environ.get('PORT', 5000))
+    # Live feed posts go to the local workers instead of the public URL
+    bot_env = dict(os.environ)
+    bot_env.setdefault('WEB_API_URL', f"http://127.0.0.1:{port}")
+    bot_proc = subprocess.Popen([sys.executable, str(ROOT_DIR / "discord_bot" / "bot.py")], env=bot_env)
+    print(f"[🤖 BOT] Started bot process (pid {bot_proc.pid})")
+    web_proc = subprocess.Popen(gunicorn_command(port))
+    print(f"[🌐 WEB] Started gunicorn (pid {web_proc.pid}) on port {port}")
+    procs = {"bot": bot_proc, "web": web_proc}
+
+    def shutdown(signum, frame):
+        for proc in procs.values():
+            if proc.poll() is None:
+                proc.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # If either side dies, stop the other so the platform restarts the service
+    exit_code = None
+    while exit_code is None:
+        time.sleep(1)
+        for name, proc in procs.items():
+            code = proc.poll()
+            if code is not None:
+                print(f"[💥 {name.upper()}] Process exited with code {code}, shutting down")
+                exit_code = code
+                break
+    shutdown(None, None)
+    for proc in procs.values():
+        try:
+            proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    sys.exit(exit_code)
+
 if __name__ == '__main__':
+    serve_mode = os.environ.get('SERVE_MODE', 'combined')
     print("=" * 60)
-    print("🚀 Starting combined Discord Bot + Web API service")
+    print(f"🚀 Starting combined Discord Bot + Web API service ({serve_mode} mode)")
     print("=" * 60)
-    
+
+    if serve_mode == 'workers':
+        run_workers()
+
     # Start bot in a separate thread
     bot_thread = threading.Thread(target=run_bot, daemon=True)
     bot_thread.start()
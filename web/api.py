@@ -3,18 +3,76 @@ Flask API for Discord Bot Log Dashboard
 Provides REST endpoints to access bot logs, search, and manage custom logs
 """
 import os
+import sys
 import json
+import time
 import pathlib
 import requests as http_requests
-from datetime import datetime
-from flask import Flask, jsonify, request, send_file, send_from_directory
+from datetime import datetime, timedelta
+from flask import Flask, Response, g, jsonify, request, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
+from discord_rest import DiscordRestClient, TTLCache
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))  # project root, for shared/
+from shared.log import get_logger
+from shared import log as shared_log
+from shared.metrics import SIZE_BUCKETS, Counter, Gauge, Registry
+from shared.logstore import (
+    LOCAL_TIMEZONE_OFFSET, delete_log, iter_entries, list_logs, load_entries, physical_path, stored_size,
+)
+from shared.partition import ScanExecutor
+from shared.columns import missing_columns, prepare_columns, snapshot, type_index
+from shared.sketch import prepare_sketches, range_sketch, stale_sketches
+from shared.timeseries import (
+    BUCKETS, GROUPS, MAX_BUCKETS, bucket_range, missing_series, parse_local, prepare_series, series_logs, timeseries,
+)
+from shared.query import QueryError, decode_cursor, encode_cursor, finish_page, page_logs, page_scan, parse_query
+from shared.postings import incomplete_days, index_days, lookup, read_found, reply_tree
+from shared.logtext import iter_text, text_available, text_file
+
+logger = get_logger("api")
 
 # Serve React build in production
 build_folder = os.path.join(os.path.dirname(__file__), 'build')
 app = Flask(__name__, static_folder=build_folder, static_url_path='')
 CORS(app)
 
+# --- REQUEST METRICS ---
+# Per-process: under gunicorn each worker reports its own numbers
+metrics = Registry()
+REQUEST_LATENCY = metrics.histogram("api_request_duration_seconds", "Time to produce a response (headers, for streamed bodies)", ("route", "method"))
+REQUEST_COUNT = metrics.counter("api_requests_total", "Requests handled", ("route", "method", "status"))
+RESPONSE_SIZE = metrics.histogram("api_response_size_bytes", "Response body size (non-streamed responses)", ("route",), SIZE_BUCKETS)
+IN_FLIGHT = metrics.gauge("api_requests_in_flight", "Requests currently being handled")
+
+@metrics.add_collector
+def logging_metrics():
+    dropped = Counter("api_log_records_dropped_total", "Log records dropped because the log queue was full")
+    dropped.inc(amount=shared_log.dropped_records)
+    return [dropped]
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is not None:
+        # Label by URL rule rather than path so the label set stays small
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - start, route, request.method)
+        REQUEST_COUNT.inc(route, request.method, str(response.status_code))
+        if response.content_length is not None:
+            RESPONSE_SIZE.observe(response.content_length, route)
+    return response
+
+@app.teardown_request
+def finish_request_timer(exc):
+    if g.pop('request_start', None) is not None:
+        IN_FLIGHT.dec()
+
 
 # --- PATHS (same as bot.py) ---
 RAILWAY_DIR = pathlib.Path("/mnt/data")
@@ -22,33 +80,48 @@ RAILWAY_APP_DIR = pathlib.Path("/app/data")
 LOCAL_DIR = pathlib.Path(__file__).parent.parent / "data"  # Project root / data
 
 # Check Railway paths first (both common mount points)
-print(f"[🔍 PATH] Checking /mnt/data exists: {RAILWAY_DIR.exists()}, writable: {os.access(RAILWAY_DIR, os.W_OK) if RAILWAY_DIR.exists() else False}")
-print(f"[🔍 PATH] Checking /app/data exists: {RAILWAY_APP_DIR.exists()}, writable: {os.access(RAILWAY_APP_DIR, os.W_OK) if RAILWAY_APP_DIR.exists() else False}")
+for candidate in (RAILWAY_DIR, RAILWAY_APP_DIR):
+    logger.debug("Checking data dir", path=str(candidate), exists=candidate.exists(),
+                 writable=os.access(candidate, os.W_OK) if candidate.exists() else False)
 
 if RAILWAY_DIR.exists() and os.access(RAILWAY_DIR, os.W_OK):
     BASE_LOG_DIR = RAILWAY_DIR
-    print(f"[✅ PATH] Using /mnt/data")
 elif RAILWAY_APP_DIR.exists() and os.access(RAILWAY_APP_DIR, os.W_OK):
     BASE_LOG_DIR = RAILWAY_APP_DIR
-    print(f"[✅ PATH] Using /app/data")
 else:
     LOCAL_DIR.mkdir(parents=True, exist_ok=True)
     BASE_LOG_DIR = LOCAL_DIR
-    print(f"[✅ PATH] Using local dir: {LOCAL_DIR}")
 
 LIVE_MESSAGES_FILE = BASE_LOG_DIR / "live_messages.json"
 DREAMS_FILE = BASE_LOG_DIR / "dreams.json"
-print(f"[✅ PATH] Final BASE_LOG_DIR: {BASE_LOG_DIR}")
-print(f"[✅ PATH] Final LIVE_MESSAGES_FILE: {LIVE_MESSAGES_FILE}")
-print(f"[✅ PATH] Final DREAMS_FILE: {DREAMS_FILE}")
-
-# Timezone configuration
-LOCAL_TIMEZONE_OFFSET = 11  # UTC+11 for Australian Eastern Daylight Time
+BOT_METRICS_FILE = BASE_LOG_DIR / "bot_metrics.prom"  # written by the bot every 15s
+BOT_METRICS_MAX_AGE = 120  # seconds before the bot's snapshot is considered stale
+logger.info("Using data dir", base_log_dir=str(BASE_LOG_DIR))
+
+# Search and stats scans fan out one day per task; under gunicorn each worker has its own pool.
+# Threads by default: request threads are running by the time a pool would fork on demand.
+SCAN_POOL = os.getenv("SCAN_POOL", "thread")  # "thread", "process" or "inline"
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", 0)) or None  # default: up to 4, by CPU count
+scan_executor = ScanExecutor(SCAN_WORKERS, SCAN_POOL)
+# A process pool forks here, at import: gunicorn loads the app before starting a worker's threads
+scan_executor.start()
+CREATE = type_index("create")  # type column value of messages in the column snapshot
+SEARCH_PAGE_SIZE = 200
+MAX_SEARCH_PAGE = 1000
+USER_PAGE_SIZE = 100
+THREAD_DEPTH = 10
+MAX_THREAD_DEPTH = 50
+THREAD_SIZE = 200
+MAX_THREAD_SIZE = 1000
 
 # In-memory storage for live messages (since volumes can't be shared)
 live_messages_cache = []
 MAX_LIVE_CACHE = 5000  # Store full day of messages
 last_reset_date = None
+# (mtime, size) of today's log when it was last loaded. Each gunicorn worker keeps
+# its own cache, so the bot's log file is what keeps them in sync.
+last_loaded_stat = None
+live_cache_stats = {"hits": 0, "misses": 0}
 
 def get_today_log_path():
     """Get today's log file path in local timezone"""
@@ -58,8 +131,8 @@ def get_today_log_path():
     return BASE_LOG_DIR / today_str
 
 def load_today_into_cache():
-    """Load today's log file into the live cache"""
-    global live_messages_cache, last_reset_date
+    """Load today's log file into the live cache (skipped if the file is unchanged)"""
+    global live_messages_cache, last_reset_date, last_loaded_stat
     from datetime import datetime, timedelta
     
     # Get today's date in local timezone
@@ -68,34 +141,30 @@ def load_today_into_cache():
     
     # Check if we need to reset (new day in local timezone)
     if last_reset_date and last_reset_date != today:
-        print(f"[🔄 CACHE] New day detected (local time), clearing cache")
+        logger.info("New day detected (local time), clearing live cache")
         live_messages_cache = []
+        last_loaded_stat = None
     
     last_reset_date = today
     
-    # Load today's log if it exists
+    # Load today's log if it exists and changed since the last load
     today_log = get_today_log_path()
-    if today_log.exists():
+    if physical_path(today_log).exists():
         try:
+            st = physical_path(today_log).stat()
+            if last_loaded_stat == (st.st_mtime_ns, st.st_size):
+                live_cache_stats["hits"] += 1
+                return
+            live_cache_stats["misses"] += 1
             messages = load_log(today_log)
             live_messages_cache = messages[-MAX_LIVE_CACHE:]
+            last_loaded_stat = (st.st_mtime_ns, st.st_size)
         except Exception as e:
-            print(f"[💥 CACHE] Error loading today's log: {e}")
+            logger.error("Error loading today's log", error=str(e))
 
 def load_log(log_path: pathlib.Path):
-    """Load a JSON log file"""
-    if not log_path.exists():
-        return []
-    try:
-        return json.loads(log_path.read_text(encoding="utf-8"))
-    except json.JSONDecodeError:
-        return []
-
-def fuzzy_contains(text, keyword, tolerance=2):
-    """Simple fuzzy matching"""
-    text = (text or "").lower()
-    keyword = (keyword or "").lower()
-    return keyword in text
+    """Load a log file, re-hydrating normalized entries"""
+    return load_entries(log_path)
 
 def check_day_rollover():
     """Check if a new day started and reload cache if so"""
@@ -104,7 +173,7 @@ def check_day_rollover():
     local_time = datetime.utcnow() + timedelta(hours=LOCAL_TIMEZONE_OFFSET)
     today = local_time.date()
     if last_reset_date and last_reset_date != today:
-        print(f"[🔄 CACHE] New day detected (local time), reloading cache")
+        logger.info("New day detected (local time), reloading live cache")
         load_today_into_cache()
 
 # Load today's log into cache on startup
@@ -115,14 +184,14 @@ load_today_into_cache()
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
     """List all available log files"""
-    files = sorted(BASE_LOG_DIR.glob("logs_*.json"))
-    custom = sorted(BASE_LOG_DIR.glob("custom_*.json"))
+    files = list_logs(BASE_LOG_DIR, "logs_")
+    custom = list_logs(BASE_LOG_DIR, "custom_")
     all_files = files + custom
     
     result = []
     for f in all_files:
         date_str = f.stem.replace("logs_", "").replace("custom_", "")
-        size_kb = f.stat().st_size // 1024
+        size_kb = stored_size(f) // 1024
         is_custom = f.stem.startswith("custom_")
         result.append({
             "name": date_str,
@@ -136,69 +205,95 @@ def get_logs():
 
 @app.route('/api/logs/<filename>', methods=['GET'])
 def get_log_content(filename):
-    """Get content of a specific log file"""
+    """Stream content of a specific log file.
+    Query params:
+      offset: number of entries to skip (default 0)
+      limit: max number of entries to return (default all)
+      fields: comma-separated keys to keep in each entry (default all)
+    """
     log_path = BASE_LOG_DIR / filename
-    if not log_path.exists():
+    if not physical_path(log_path).exists():
         return jsonify({"error": "Log file not found"}), 404
-    
-    data = load_log(log_path)
-    return jsonify(data)
+
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = request.args.get('limit')
+        limit = max(int(limit), 0) if limit is not None else None
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+
+    def generate():
+        yield "["
+        sent = 0
+        # Archived days seek straight to the block holding `offset`
+        for entry in iter_entries(log_path, start=offset):
+            if limit is not None and sent >= limit:
+                break
+            if fields and isinstance(entry, dict):
+                entry = {k: entry[k] for k in fields if k in entry}
+            yield ("," if sent else "") + json.dumps(entry)
+            sent += 1
+        yield "]"
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @app.route('/api/logs/<filename>/download', methods=['GET'])
 def download_log(filename):
-    """Download a log file"""
-    # Support both .json and .txt
+    """Download a log as text, rendered from the log on demand"""
     base_name = filename.replace('.json', '').replace('.txt', '')
-    txt_path = BASE_LOG_DIR / f"{base_name}.txt"
-    json_path = BASE_LOG_DIR / f"{base_name}.json"
-    
-    # Prefer txt file for download
-    if txt_path.exists():
-        return send_file(txt_path, as_attachment=True, download_name=txt_path.name)
-    elif json_path.exists():
-        return send_file(json_path, as_attachment=True, download_name=json_path.name)
-    else:
+    log_path = BASE_LOG_DIR / f"{base_name}.json"
+    if not text_available(log_path):
         return jsonify({"error": "Log file not found"}), 404
 
+    # Closed days are rendered once and cached; today's log is streamed
+    text_path = text_file(log_path, closed=log_path != get_today_log_path())
+    if text_path:
+        return send_file(text_path, as_attachment=True, download_name=f"{base_name}.txt")
+    return Response(stream_with_context(iter_text(log_path)), mimetype='text/plain; charset=utf-8',
+                    headers={"Content-Disposition": f"attachment; filename={base_name}.txt"})
+
 @app.route('/api/search', methods=['POST'])
 def search_logs():
-    """Search across all logs"""
-    data = request.get_json()
+    """Search across all logs, one page at a time: pass back `next_cursor` as `cursor` for the next page"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "JSON object body required"}), 400
     term = data.get('term', '')
-    max_results = data.get('max_results', 200)
+    cursor = data.get('cursor')
+    if not isinstance(term, str) or not isinstance(cursor, (str, type(None))):
+        return jsonify({"error": "term and cursor must be strings"}), 400
+    try:
+        page_size = max(1, min(int(data.get('max_results', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE))
+    except (TypeError, ValueError):
+        return jsonify({"error": "max_results must be a number"}), 400
     
-    if not term:
+    try:
+        start = None
+        if cursor:
+            term, log_name, skip = decode_cursor(cursor)
+            start = (log_name, skip)
+        query = parse_query(term)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    if query.is_empty():
         return jsonify({"error": "Search term required"}), 400
     
-    results = []
-    for log_file in sorted(BASE_LOG_DIR.glob("*.json")):
-        log_data = load_log(log_file)
-        for entry in log_data:
-            if fuzzy_contains(entry.get("content", ""), term):
-                entry['log_file'] = log_file.stem
-                results.append(entry)
-            if len(results) >= max_results:
-                break
-        if len(results) >= max_results:
-            break
+    log_files = page_logs(query, list_logs(BASE_LOG_DIR), start)
+    results = scan_executor.run(page_scan, log_files, query, start, page_size + 1, max_results=page_size + 1)
+    results, next_cursor = finish_page(term, results, page_size, start)
     
     return jsonify({
         "term": term,
         "count": len(results),
-        "results": results
+        "results": results,
+        "next_cursor": next_cursor
     })
 
 @app.route('/api/logs/custom/<name>', methods=['DELETE'])
 def delete_custom_log(name):
     """Delete a custom log"""
-    removed = False
-    for ext in [".json", ".txt"]:
-        p = BASE_LOG_DIR / f"custom_{name}{ext}"
-        if p.exists():
-            p.unlink()
-            removed = True
-    
-    if removed:
+    if delete_log(BASE_LOG_DIR / f"custom_{name}.json"):
         return jsonify({"message": f"Deleted custom log: {name}"})
     else:
         return jsonify({"error": "Log not found"}), 404
@@ -206,12 +301,12 @@ def delete_custom_log(name):
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get overall statistics"""
-    total_logs = len(list(BASE_LOG_DIR.glob("logs_*.json")))
-    custom_logs = len(list(BASE_LOG_DIR.glob("custom_*.json")))
+    total_logs = len(list_logs(BASE_LOG_DIR, "logs_"))
+    custom_logs = len(list_logs(BASE_LOG_DIR, "custom_"))
     
-    # Count total messages
-    total_messages = 0
-    for log_file in BASE_LOG_DIR.glob("*.json"):
+    # Count total messages: daily logs from the column snapshot, custom logs by loading them
+    total_messages = len(load_snapshot())
+    for log_file in list_logs(BASE_LOG_DIR, "custom_"):
         data = load_log(log_file)
         total_messages += len(data)
     
@@ -224,73 +319,148 @@ def get_stats():
 @app.route('/api/channels', methods=['GET'])
 def get_channels():
     """Get list of all channels seen in logs"""
-    from collections import Counter
-    channel_counter = Counter()
-    for log_file in sorted(BASE_LOG_DIR.glob("logs_*.json")):
-        data = load_log(log_file)
-        for entry in data:
-            ch = entry.get("channel")
-            if ch:
-                channel_counter[ch] += 1
+    cols = load_snapshot()
+    channel_counter = cols.channel_names(cols.count_by("channel"))
     channels = [{"name": ch, "message_count": count} for ch, count in channel_counter.most_common()]
     return jsonify(channels)
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
     """Get list of all users seen in logs"""
-    from collections import Counter
-    user_map = {}
-    for log_file in sorted(BASE_LOG_DIR.glob("logs_*.json")):
-        data = load_log(log_file)
-        for entry in data:
-            uid = str(entry.get("author_id", ""))
-            if uid and entry.get("type") == "create":
-                name = entry.get("author_display") or entry.get("author", "Unknown")
-                avatar = entry.get("avatar_url", "")
-                if uid not in user_map:
-                    user_map[uid] = {"id": uid, "name": name, "avatar_url": avatar, "count": 0}
-                user_map[uid]["count"] += 1
-                user_map[uid]["name"] = name
-                if avatar:
-                    user_map[uid]["avatar_url"] = avatar
-    users = sorted(user_map.values(), key=lambda x: x["count"], reverse=True)
+    cols = load_snapshot()
+    users = [{"id": cols.authors[i]["id"], "name": cols.authors[i]["name"], "avatar_url": cols.authors[i]["avatar_url"],
+              "count": count}
+             for i, count in cols.count_by("author", type=CREATE).most_common()
+             if cols.authors[i]["id"] is not None]
     return jsonify(users)
 
+@app.route('/api/users/<user_id>/messages', methods=['GET'])
+def get_user_messages(user_id):
+    """A user's messages, newest first, from the author posting lists (shared/postings.py).
+    Pass back `next_cursor` as `cursor` for the next page."""
+    if not user_id.isdigit():
+        return jsonify({"error": "user_id must be a Discord user ID"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', USER_PAGE_SIZE)), MAX_SEARCH_PAGE))
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+    before = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_user, log_name, position = decode_cursor(cursor)
+        except QueryError as e:
+            return jsonify({"error": str(e)}), 400
+        if cursor_user != user_id:
+            return jsonify({"error": "cursor belongs to another user"}), 400
+        before = (log_name, position)
+    
+    log_files = [lf for lf in list_logs(BASE_LOG_DIR, "logs_") if before is None or lf.name <= before[0]]
+    pending = incomplete_days(log_files)
+    if pending:
+        # Days logged before posting lists existed are indexed once, one day per task
+        scan_executor.run(index_days, pending)
+    found = lookup(BASE_LOG_DIR, "author", user_id, [lf.name for lf in log_files], tags=("create",))
+    if before is not None:
+        found = [f for f in found if f[:2] < before]
+    found.reverse()
+    
+    messages = []
+    next_cursor = None
+    last = None  # (log name, position) of the last message returned
+    for log_name, position, _, entry in read_found(BASE_LOG_DIR, "author", user_id, found):
+        if len(messages) == limit:
+            next_cursor = encode_cursor(user_id, *last)
+            break
+        entry["log_file"] = pathlib.Path(log_name).stem
+        messages.append(entry)
+        last = (log_name, position)
+    
+    return jsonify({
+        "user_id": user_id,
+        "count": len(messages),
+        "messages": messages,
+        "next_cursor": next_cursor
+    })
+
+@app.route('/api/messages/<message_id>/history', methods=['GET'])
+def get_message_history(message_id):
+    """Everything logged about one message, across days, from the message posting lists:
+    the original, its edits and reaction updates in order, and its delete"""
+    if not message_id.isdigit():
+        return jsonify({"error": "message_id must be a Discord message ID"}), 400
+    log_files = list_logs(BASE_LOG_DIR, "logs_")
+    pending = incomplete_days(log_files)
+    if pending:
+        scan_executor.run(index_days, pending)
+    found = lookup(BASE_LOG_DIR, "message", message_id, [lf.name for lf in log_files])
+    if not found:
+        return jsonify({"error": "No log entries for this message"}), 404
+    
+    history = {"original": None, "edits": [], "reactions": [], "deleted": None}
+    events = 0
+    for log_name, _, tag, entry in read_found(BASE_LOG_DIR, "message", message_id, found):
+        events += 1
+        entry["log_file"] = pathlib.Path(log_name).stem
+        if tag == "create":
+            history["original"] = entry
+        elif tag == "edit":
+            history["edits"].append(entry)
+        elif tag == "reaction":
+            history["reactions"].append(entry)
+        elif tag == "delete":
+            history["deleted"] = entry
+    
+    return jsonify({"message_id": message_id, "events": events, **history})
+
+@app.route('/api/threads/<message_id>', methods=['GET'])
+def get_thread(message_id):
+    """The reply tree holding a message, from its top message down, through the reply
+    posting lists. `depth` and `limit` bound the levels and messages returned."""
+    if not message_id.isdigit():
+        return jsonify({"error": "message_id must be a Discord message ID"}), 400
+    try:
+        depth = max(1, min(int(request.args.get('depth', THREAD_DEPTH)), MAX_THREAD_DEPTH))
+        limit = max(1, min(int(request.args.get('limit', THREAD_SIZE)), MAX_THREAD_SIZE))
+    except ValueError:
+        return jsonify({"error": "depth and limit must be numbers"}), 400
+    log_files = list_logs(BASE_LOG_DIR, "logs_")
+    pending = incomplete_days(log_files)
+    if pending:
+        scan_executor.run(index_days, pending)
+    root, size, truncated = reply_tree(BASE_LOG_DIR, [lf.name for lf in log_files], message_id, depth, limit)
+    if root is None:
+        return jsonify({"error": "Message not found in logs"}), 404
+    
+    return jsonify({
+        "message_id": message_id,
+        "count": size,
+        "truncated": truncated,
+        "root": root
+    })
+
 @app.route('/api/stats/enhanced', methods=['GET'])
 def get_enhanced_stats():
-    """Get enhanced statistics for the dashboard"""
-    from collections import Counter
-    total_logs = len(list(BASE_LOG_DIR.glob("logs_*.json")))
-    custom_logs = len(list(BASE_LOG_DIR.glob("custom_*.json")))
-    total_messages = 0
-    total_edits = 0
-    total_deletes = 0
-    channel_counter = Counter()
-    user_counter = Counter()
-    hourly = Counter()
-    daily = Counter()
-    for log_file in sorted(BASE_LOG_DIR.glob("logs_*.json")):
-        data = load_log(log_file)
-        for entry in data:
-            t = entry.get("type", "create")
-            if t == "create":
-                total_messages += 1
-                user_counter[entry.get("author_display") or entry.get("author", "Unknown")] += 1
-                channel_counter[entry.get("channel", "unknown")] += 1
-                try:
-                    ts = datetime.fromisoformat(entry["created_at"])
-                    hourly[ts.hour] += 1
-                    daily[ts.strftime("%Y-%m-%d")] += 1
-                except:
-                    pass
-            elif t == "edit":
-                total_edits += 1
-            elif t == "delete":
-                total_deletes += 1
+    """Get enhanced statistics for the dashboard.
+    With approx=true, counts come from the per-day sketches (shared/sketch.py)
+    instead of a scan of every log: totals, hourly and daily counts stay exact,
+    top users and channels are estimates, plus distinct users and top words."""
+    daily_logs = list_logs(BASE_LOG_DIR, "logs_")
+    total_logs = len(daily_logs)
+    custom_logs = len(list_logs(BASE_LOG_DIR, "custom_"))
+    if request.args.get("approx", "").lower() in ("1", "true", "yes"):
+        return jsonify({"total_logs": total_logs, "custom_logs": custom_logs, **approx_stats(daily_logs)})
+    cols = load_snapshot()
+    types = cols.count_by("type")
+    total_messages, total_edits, total_deletes = (types[type_index(t)] for t in ("create", "edit", "delete"))
+    user_counter = cols.author_names(cols.count_by("name", type=CREATE))
+    channel_counter = cols.channel_names(cols.count_by("channel", type=CREATE))
+    hourly = cols.count_by("hour", type=CREATE)
+    daily = [(day, cols.count(lo, hi, type=CREATE)) for day, lo, hi in cols.day_rows()]
     top_users = [{"name": n, "count": c} for n, c in user_counter.most_common(10)]
     top_channels = [{"name": n, "count": c} for n, c in channel_counter.most_common(10)]
     hourly_data = [{"hour": h, "count": hourly.get(h, 0)} for h in range(24)]
-    daily_data = [{"date": d, "count": c} for d, c in sorted(daily.items())[-30:]]
+    daily_data = [{"date": d, "count": c} for d, c in daily if c][-30:]
     return jsonify({
         "total_logs": total_logs,
         "custom_logs": custom_logs,
@@ -303,6 +473,78 @@ def get_enhanced_stats():
         "daily_activity": daily_data,
     })
 
+def load_snapshot():
+    """Columnar snapshot of every daily log (shared/columns.py); the columns of closed
+    days that have none yet are built on the scan pool first"""
+    daily_logs = list_logs(BASE_LOG_DIR, "logs_")
+    pending = missing_columns(daily_logs)
+    if pending:
+        scan_executor.run(prepare_columns, pending)
+    return snapshot(daily_logs)
+
+def approx_stats(daily_logs):
+    pending = stale_sketches(daily_logs)
+    if pending:
+        scan_executor.run(prepare_sketches, pending)
+    sketch = range_sketch(daily_logs)
+    return {
+        "approx": True,
+        "total_messages": sketch.messages,
+        "total_edits": sketch.edits,
+        "total_deletes": sketch.deletes,
+        "distinct_users": sketch.distinct_users(),
+        "top_users": [{"name": n, "count": c} for n, c in sketch.top("users", 10)],
+        "top_channels": [{"name": n, "count": c} for n, c in sketch.top("channels", 10)],
+        "top_words": [{"word": w, "count": c} for w, c in sketch.top("words", 20)],
+        "hourly_activity": [{"hour": h, "count": sketch.hourly.get(h, 0)} for h in range(24)],
+        "daily_activity": [{"date": d, "count": c} for d, c in sorted(sketch.daily.items())[-30:]],
+    }
+
+@app.route('/api/stats/timeseries', methods=['GET'])
+def get_stats_timeseries():
+    """Messages per time bucket, from per-minute counters of each day (shared/timeseries.py).
+    Query params (times are local, LOCAL_TIMEZONE_OFFSET):
+      from, to: YYYY-MM-DD or YYYY-MM-DDTHH:MM, `to` exclusive (default the last 24 hours)
+      bucket: 5m, 1h or 1d (default 1h)
+      by: channel or user, for one series per channel or user instead of the total
+      limit: how many of the busiest channels or users to return with `by` (default 10)
+    """
+    bucket = request.args.get("bucket", "1h")
+    by = request.args.get("by") or None
+    if bucket not in BUCKETS:
+        return jsonify({"error": f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+    if by is not None and by not in GROUPS:
+        return jsonify({"error": f"by must be one of {', '.join(GROUPS)}"}), 400
+    try:
+        limit = int(request.args.get("limit", 10))
+        now = datetime.utcnow() + timedelta(hours=LOCAL_TIMEZONE_OFFSET)
+        end = parse_local(request.args["to"]) if request.args.get("to") else now
+        start = parse_local(request.args["from"]) if request.args.get("from") else end - timedelta(days=1)
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO dates or times, limit an integer"}), 400
+    if start >= end:
+        return jsonify({"error": "from must be before to"}), 400
+    if bucket_range(start, end, bucket)[2] > MAX_BUCKETS:
+        return jsonify({"error": f"At most {MAX_BUCKETS} buckets per request; use a larger bucket"}), 400
+    try:
+        log_files = series_logs(list_logs(BASE_LOG_DIR, "logs_"), start, end)
+        pending = missing_series(log_files)
+        if pending:
+            scan_executor.run(prepare_series, pending)
+        times, series = timeseries(log_files, start, end, bucket, by, limit)
+        return jsonify({
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "bucket": bucket,
+            "by": by,
+            "timezone_offset": LOCAL_TIMEZONE_OFFSET,
+            "buckets": [t.isoformat() for t in times],
+            "series": [{"name": name, "total": sum(counts), "counts": counts} for name, counts in series],
+        })
+    except Exception as e:
+        logger.exception("Error in get_stats_timeseries")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/live', methods=['GET'])
 def get_live_messages():
     """Get live messages from in-memory cache"""
@@ -327,7 +569,7 @@ def get_live_messages():
         recent_messages = deduped[-500:]
         return jsonify(recent_messages)
     except Exception as e:
-        print(f"[💥 API] Error in get_live_messages: {e}")
+        logger.exception("Error in get_live_messages")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/live/history', methods=['GET'])
@@ -345,7 +587,7 @@ def get_live_history():
         limit = min(limit, 10)  # cap at 10 files
 
         # Get all log files sorted descending (newest first)
-        all_logs = sorted(BASE_LOG_DIR.glob("logs_*.json"), reverse=True)
+        all_logs = list_logs(BASE_LOG_DIR, "logs_")[::-1]
         
         messages = []
         files_loaded = 0
@@ -368,7 +610,8 @@ def get_live_history():
             else:
                 remaining_count += 1
 
-        print(f"[📜 HISTORY] Loaded {len(messages)} messages from {files_loaded} files before {before_date_str}, {remaining_count} older files remain")
+        logger.debug("Loaded history", messages=len(messages), files=files_loaded,
+                     before=before_date_str, remaining_files=remaining_count)
         return jsonify({
             "messages": messages,
             "files_loaded": files_loaded,
@@ -376,7 +619,7 @@ def get_live_history():
             "oldest_date": oldest_loaded_date
         })
     except Exception as e:
-        print(f"[💥 API] Error in get_live_history: {e}")
+        logger.exception("Error in get_live_history")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/live', methods=['POST'])
@@ -390,11 +633,11 @@ def add_live_message():
         live_messages_cache = live_messages_cache[-MAX_LIVE_CACHE:]
         
         # Note: Bot already writes to the log file, so we only maintain the in-memory cache here
-        print(f"[🔴 API] Added message, cache now has {len(live_messages_cache)} messages")
+        logger.debug("Added live message", cache_size=len(live_messages_cache), sample=50)
         
         return jsonify({"status": "ok"}), 200
     except Exception as e:
-        print(f"[💥 API] Error adding live message: {e}")
+        logger.exception("Error adding live message")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/health', methods=['GET'])
@@ -402,20 +645,65 @@ def health():
     """Health check endpoint"""
     return jsonify({"status": "ok", "timestamp": datetime.utcnow().isoformat()})
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request and cache metrics in Prometheus text exposition format,
+    followed by the bot's handler metrics if its snapshot is fresh"""
+    body = metrics.render()
+    try:
+        if time.time() - BOT_METRICS_FILE.stat().st_mtime < BOT_METRICS_MAX_AGE:
+            body += BOT_METRICS_FILE.read_text(encoding="utf-8")
+    except OSError:
+        pass
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
 # --- DISCORD REST API PROXY ---
-DISCORD_API = "https://discord.com/api/v10"
+# DISCORD_API_URL can point at a local stub server for testing
+DISCORD_API = os.getenv("DISCORD_API_URL", "https://discord.com/api/v10")
 DISCORD_TOKEN = os.getenv("TOKEN")
-
-def discord_headers():
-    return {"Authorization": f"Bot {DISCORD_TOKEN}", "Content-Type": "application/json"}
+DISCORD_LIST_TTL = 60  # seconds to cache guild and channel listings
+
+discord_client = DiscordRestClient(DISCORD_API, DISCORD_TOKEN)
+guilds_cache = TTLCache(DISCORD_LIST_TTL)
+channels_cache = TTLCache(DISCORD_LIST_TTL)
+
+@metrics.add_collector
+def cache_metrics():
+    """Hit/miss counters and hit ratios for the API's in-memory caches"""
+    caches = {
+        "discord_guilds": (guilds_cache.hits, guilds_cache.misses),
+        "discord_channels": (channels_cache.hits, channels_cache.misses),
+        "live_messages": (live_cache_stats["hits"], live_cache_stats["misses"]),
+    }
+    hits = Counter("api_cache_hits_total", "Cache lookups served from memory", ("cache",))
+    misses = Counter("api_cache_misses_total", "Cache lookups that had to load data", ("cache",))
+    ratio = Gauge("api_cache_hit_ratio", "Fraction of cache lookups served from memory", ("cache",))
+    for name, (h, m) in caches.items():
+        hits.inc(name, amount=h)
+        misses.inc(name, amount=m)
+        ratio.set(name, value=round(h / (h + m), 4) if h + m else 0)
+    return [hits, misses, ratio]
+
+def discord_error_response(e):
+    """Turn an HTTPError from the Discord API into a Flask error response"""
+    if e.response is None:
+        return jsonify({"error": str(e)}), 500
+    try:
+        err_body = e.response.json()
+    except ValueError:
+        err_body = e.response.text or str(e)
+    return jsonify({"error": err_body}), e.response.status_code
 
 @app.route('/api/discord/guilds', methods=['GET'])
 def get_discord_guilds():
     """Get bot's guilds"""
     try:
-        r = http_requests.get(f"{DISCORD_API}/users/@me/guilds", headers=discord_headers())
-        r.raise_for_status()
-        guilds = [{"id": g["id"], "name": g["name"], "icon": g.get("icon")} for g in r.json()]
+        guilds = guilds_cache.get("guilds")
+        if guilds is None:
+            r = discord_client.request("GET", "/users/@me/guilds")
+            r.raise_for_status()
+            guilds = [{"id": g["id"], "name": g["name"], "icon": g.get("icon")} for g in r.json()]
+            guilds_cache.set("guilds", guilds)
         return jsonify(guilds)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -424,14 +712,17 @@ def get_discord_guilds():
 def get_discord_channels(guild_id):
     """Get text channels for a guild from Discord API (with IDs)"""
     try:
-        r = http_requests.get(f"{DISCORD_API}/guilds/{guild_id}/channels", headers=discord_headers())
-        r.raise_for_status()
-        # Filter to text channels (type 0) and voice channels are excluded
-        text_channels = [
-            {"id": c["id"], "name": c["name"], "type": c["type"], "position": c.get("position", 0), "parent_id": c.get("parent_id")}
-            for c in r.json() if c["type"] in (0, 5, 15)  # text, announcement, forum
-        ]
-        text_channels.sort(key=lambda c: c["position"])
+        text_channels = channels_cache.get(guild_id)
+        if text_channels is None:
+            r = discord_client.request("GET", "/guilds/{guild_id}/channels", route_params={"guild_id": guild_id})
+            r.raise_for_status()
+            # Filter to text channels (type 0) and voice channels are excluded
+            text_channels = [
+                {"id": c["id"], "name": c["name"], "type": c["type"], "position": c.get("position", 0), "parent_id": c.get("parent_id")}
+                for c in r.json() if c["type"] in (0, 5, 15)  # text, announcement, forum
+            ]
+            text_channels.sort(key=lambda c: c["position"])
+            channels_cache.set(guild_id, text_channels)
         return jsonify(text_channels)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -449,16 +740,15 @@ def discord_send_message():
         payload = {"content": content}
         if reply_to:
             payload["message_reference"] = {"message_id": str(reply_to)}
-        r = http_requests.post(
-            f"{DISCORD_API}/channels/{channel_id}/messages",
-            headers=discord_headers(),
+        r = discord_client.request(
+            "POST", "/channels/{channel_id}/messages",
+            route_params={"channel_id": channel_id},
             json=payload
         )
         r.raise_for_status()
         return jsonify(r.json()), 200
     except http_requests.exceptions.HTTPError as e:
-        err_body = e.response.json() if e.response else str(e)
-        return jsonify({"error": err_body}), e.response.status_code if e.response else 500
+        return discord_error_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -472,15 +762,14 @@ def discord_react():
         emoji = data.get("emoji")  # URL-encoded emoji e.g. '%F0%9F%91%8D' or 'name:id' for custom
         if not all([channel_id, message_id, emoji]):
             return jsonify({"error": "channel_id, message_id, and emoji are required"}), 400
-        r = http_requests.put(
-            f"{DISCORD_API}/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
-            headers=discord_headers()
+        r = discord_client.request(
+            "PUT", "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+            route_params={"channel_id": channel_id, "message_id": message_id, "emoji": emoji}
         )
         r.raise_for_status()
         return jsonify({"status": "ok"}), 200
     except http_requests.exceptions.HTTPError as e:
-        err_body = e.response.json() if e.response else str(e)
-        return jsonify({"error": err_body}), e.response.status_code if e.response else 500
+        return discord_error_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -488,18 +777,151 @@ def discord_react():
 def discord_delete_message(channel_id, message_id):
     """Delete a message from a Discord channel"""
     try:
-        r = http_requests.delete(
-            f"{DISCORD_API}/channels/{channel_id}/messages/{message_id}",
-            headers=discord_headers()
+        r = discord_client.request(
+            "DELETE", "/channels/{channel_id}/messages/{message_id}",
+            route_params={"channel_id": channel_id, "message_id": message_id}
         )
         r.raise_for_status()
         return jsonify({"status": "deleted"}), 200
     except http_requests.exceptions.HTTPError as e:
-        err_body = e.response.json() if e.response else str(e)
-        return jsonify({"error": err_body}), e.response.status_code if e.response else 500
+        return discord_error_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# --- DISCORD BATCH ACTIONS ---
+MAX_BATCH_ITEMS = 500
+BULK_DELETE_MAX = 100  # Discord's bulk-delete limit per request
+BULK_DELETE_MAX_AGE_MS = 14 * 24 * 3600 * 1000 - 60 * 1000  # 14 days, with a minute of slack
+DISCORD_EPOCH_MS = 1420070400000
+
+def snowflake_age_ms(snowflake):
+    """Age of a Discord snowflake ID in milliseconds"""
+    created_ms = (int(snowflake) >> 22) + DISCORD_EPOCH_MS
+    return time.time() * 1000 - created_ms
+
+def batch_items(key):
+    """Read the list of batch items from the request body, or return an error response"""
+    data = request.get_json() or {}
+    items = data.get(key)
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"error": f"{key} must be a non-empty list"}), 400)
+    if len(items) > MAX_BATCH_ITEMS:
+        return None, (jsonify({"error": f"At most {MAX_BATCH_ITEMS} {key} per batch"}), 400)
+    return items, None
+
+def stream_batch_results(jobs, errors, on_success):
+    """Run batch jobs and stream one NDJSON line per item as results arrive.
+    `jobs` keys are lists of item indexes so one request can cover several items;
+    `errors` holds validation failures as (index, message) pairs."""
+    def generate():
+        for index, message in errors:
+            yield json.dumps({"index": index, "ok": False, "error": message}) + "\n"
+        for indexes, response, error in discord_client.run_batch(jobs):
+            if error is None and response.ok:
+                for index in indexes:
+                    yield json.dumps({"index": index, "ok": True, **on_success(response, index)}) + "\n"
+                continue
+            if error is not None:
+                status, body = 500, str(error)
+            else:
+                status = response.status_code
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = response.text
+            for index in indexes:
+                yield json.dumps({"index": index, "ok": False, "status": status, "error": body}) + "\n"
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/discord/send/batch', methods=['POST'])
+def discord_send_batch():
+    """Send several messages. Body: {"messages": [{"channel_id", "content", "reply_to"?}, ...]}
+    Streams one JSON line per message: {"index", "ok", "id"} or {"index", "ok", "status", "error"}."""
+    items, error = batch_items("messages")
+    if error:
+        return error
+    jobs, errors = [], []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append((i, "each item must be an object"))
+            continue
+        channel_id = item.get("channel_id")
+        content = (item.get("content") or "").strip()
+        if not channel_id or not content:
+            errors.append((i, "channel_id and content are required"))
+            continue
+        payload = {"content": content}
+        if item.get("reply_to"):
+            payload["message_reference"] = {"message_id": str(item["reply_to"])}
+        jobs.append(([i], "POST", "/channels/{channel_id}/messages",
+                     {"route_params": {"channel_id": channel_id}, "json": payload}))
+    return stream_batch_results(jobs, errors, lambda r, i: {"id": r.json().get("id")})
+
+@app.route('/api/discord/react/batch', methods=['POST'])
+def discord_react_batch():
+    """Add several reactions. Body: {"reactions": [{"channel_id", "message_id", "emoji"}, ...]}
+    Streams one JSON line per reaction."""
+    items, error = batch_items("reactions")
+    if error:
+        return error
+    jobs, errors = [], []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append((i, "each item must be an object"))
+            continue
+        channel_id, message_id, emoji = item.get("channel_id"), item.get("message_id"), item.get("emoji")
+        if not all([channel_id, message_id, emoji]):
+            errors.append((i, "channel_id, message_id, and emoji are required"))
+            continue
+        jobs.append(([i], "PUT", "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+                     {"route_params": {"channel_id": channel_id, "message_id": message_id, "emoji": emoji}}))
+    return stream_batch_results(jobs, errors, lambda r, i: {})
+
+@app.route('/api/discord/messages/bulk-delete', methods=['POST'])
+def discord_bulk_delete():
+    """Delete several messages. Body: {"messages": [{"channel_id", "message_id"}, ...]}
+    Messages younger than 14 days are deleted with Discord's bulk-delete route in
+    chunks of up to 100 per channel; the rest are deleted one by one. A message
+    listed twice is deleted once and both items get that result.
+    Streams one JSON line per message."""
+    items, error = batch_items("messages")
+    if error:
+        return error
+    errors = []
+    by_channel = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append((i, "each item must be an object"))
+            continue
+        channel_id, message_id = item.get("channel_id"), item.get("message_id")
+        if not channel_id or not message_id:
+            errors.append((i, "channel_id and message_id are required"))
+            continue
+        try:
+            recent = snowflake_age_ms(message_id) < BULK_DELETE_MAX_AGE_MS
+        except (TypeError, ValueError):
+            errors.append((i, "message_id must be a Discord snowflake"))
+            continue
+        # message ID -> indexes of the items naming it; bulk-delete rejects repeated IDs
+        bulk, single = by_channel.setdefault(str(channel_id), ({}, {}))
+        (bulk if recent else single).setdefault(str(message_id), []).append(i)
+
+    jobs = []
+    for channel_id, (bulk, single) in by_channel.items():
+        bulk = list(bulk.items())
+        for start in range(0, len(bulk), BULK_DELETE_MAX):
+            chunk = bulk[start:start + BULK_DELETE_MAX]
+            if len(chunk) == 1:
+                # bulk-delete needs at least two messages
+                single.update(chunk)
+                continue
+            jobs.append(([i for _, indexes in chunk for i in indexes], "POST", "/channels/{channel_id}/messages/bulk-delete",
+                         {"route_params": {"channel_id": channel_id}, "json": {"messages": [m for m, _ in chunk]}}))
+        for message_id, indexes in single.items():
+            jobs.append((indexes, "DELETE", "/channels/{channel_id}/messages/{message_id}",
+                         {"route_params": {"channel_id": channel_id, "message_id": message_id}}))
+    return stream_batch_results(jobs, errors, lambda r, i: {"status": "deleted"})
+
 # --- HOSPITALITY STATS ENDPOINTS ---
 HOSPITALITY_STATS_FILE = BASE_LOG_DIR / "hospitality_stats.json"
 MANAGER_REPORTS_FILE = BASE_LOG_DIR / "manager_reports.json"
@@ -519,7 +941,7 @@ def save_hospitality_stats(stats):
     HOSPITALITY_STATS_FILE.parent.mkdir(parents=True, exist_ok=True)
     with open(HOSPITALITY_STATS_FILE, "w", encoding="utf-8") as f:
         json.dump(stats, f, indent=2, ensure_ascii=False)
-    print(f"[📊 HOSPITALITY] Saved {len(stats)} entries to {HOSPITALITY_STATS_FILE}")
+    logger.debug("Saved hospitality stats", entries=len(stats))
 
 @app.route('/api/hospitality/stats', methods=['GET'])
 def get_hospitality_stats():
@@ -528,7 +950,7 @@ def get_hospitality_stats():
         stats = load_hospitality_stats()
         return jsonify(stats)
     except Exception as e:
-        print(f"[💥 API] Error loading hospitality stats: {e}")
+        logger.exception("Error loading hospitality stats")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/hospitality/stats', methods=['POST'])
@@ -565,11 +987,12 @@ def add_hospitality_stat():
         # Save back to file
         save_hospitality_stats(stats)
         
-        print(f"[📊 HOSPITALITY] Added stat: {data['date']} {data['meal_period']} - MIV: {data['miv']}, A$: {data['average_spend']}, Staff: {data['staff_member']}")
+        logger.info("Added hospitality stat", date=data['date'], meal_period=data['meal_period'],
+                    miv=data['miv'], average_spend=data['average_spend'], staff=data['staff_member'])
         
         return jsonify({"status": "ok", "entry": data}), 201
     except Exception as e:
-        print(f"[💥 API] Error adding hospitality stat: {e}")
+        logger.exception("Error adding hospitality stat")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/hospitality/stats/<entry_id>', methods=['PUT'])
@@ -592,16 +1015,14 @@ def update_hospitality_stat(entry_id):
                 stats[index]['updated_at'] = datetime.utcnow().isoformat()
                 
                 save_hospitality_stats(stats)
-                print(f"[📊 HOSPITALITY] Updated entry {index}: {stats[index]}")
+                logger.info("Updated hospitality stat", index=index)
                 return jsonify({"status": "ok", "entry": stats[index]})
             else:
                 return jsonify({"error": "Entry not found"}), 404
         except ValueError:
             return jsonify({"error": "Invalid entry ID"}), 400
     except Exception as e:
-        print(f"[💥 API] Error updating hospitality stat: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error updating hospitality stat")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/hospitality/stats/<entry_id>', methods=['DELETE'])
@@ -609,28 +1030,22 @@ def delete_hospitality_stat(entry_id):
     """Delete a hospitality statistic entry"""
     try:
         stats = load_hospitality_stats()
-        print(f"[📊 HOSPITALITY] Delete request for index {entry_id}")
-        print(f"[📊 HOSPITALITY] Current stats count: {len(stats)}")
-        print(f"[📊 HOSPITALITY] Stats data: {stats}")
         
         # Find and remove entry by index
         try:
             index = int(entry_id)
-            print(f"[📊 HOSPITALITY] Parsed index: {index}, Valid range: 0 to {len(stats)-1}")
             if 0 <= index < len(stats):
                 removed = stats.pop(index)
                 save_hospitality_stats(stats)
-                print(f"[📊 HOSPITALITY] Deleted entry {index}: {removed}")
+                logger.info("Deleted hospitality stat", index=index)
                 return jsonify({"status": "ok", "removed": removed})
             else:
-                print(f"[💥 HOSPITALITY] Index {index} out of range (0-{len(stats)-1})")
+                logger.warning("Hospitality stat index out of range", index=index, total=len(stats))
                 return jsonify({"error": "Entry not found", "index": index, "total": len(stats)}), 404
         except ValueError:
             return jsonify({"error": "Invalid entry ID"}), 400
     except Exception as e:
-        print(f"[💥 API] Error deleting hospitality stat: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error deleting hospitality stat")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/hospitality/analytics', methods=['GET'])
@@ -734,9 +1149,7 @@ def get_hospitality_analytics():
             "overall_avg_spend": round(total_spend / len(stats), 2)
         })
     except Exception as e:
-        print(f"[💥 API] Error calculating analytics: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error calculating hospitality analytics")
         return jsonify({"error": str(e)}), 500
 
 # --- MANAGER REPORTS ENDPOINTS ---
@@ -755,7 +1168,7 @@ def save_manager_reports(reports):
     MANAGER_REPORTS_FILE.parent.mkdir(parents=True, exist_ok=True)
     with open(MANAGER_REPORTS_FILE, "w", encoding="utf-8") as f:
         json.dump(reports, f, indent=2, ensure_ascii=False)
-    print(f"[📊 MANAGER] Saved {len(reports)} reports to {MANAGER_REPORTS_FILE}")
+    logger.debug("Saved manager reports", reports=len(reports))
 
 @app.route('/api/manager/reports', methods=['GET'])
 def get_manager_reports():
@@ -764,7 +1177,7 @@ def get_manager_reports():
         reports = load_manager_reports()
         return jsonify(reports)
     except Exception as e:
-        print(f"[💥 API] Error loading manager reports: {e}")
+        logger.exception("Error loading manager reports")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/manager/reports', methods=['POST'])
@@ -786,11 +1199,11 @@ def add_manager_report():
         # Save back to file
         save_manager_reports(reports)
         
-        print(f"[📊 MANAGER] Added report: {data.get('date')} - Managers: {data.get('managers', [])}")
+        logger.info("Added manager report", date=data.get('date'), managers=data.get('managers', []))
         
         return jsonify({"status": "ok", "report": data}), 201
     except Exception as e:
-        print(f"[💥 API] Error adding manager report: {e}")
+        logger.exception("Error adding manager report")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/manager/reports/<report_id>', methods=['DELETE'])
@@ -804,14 +1217,14 @@ def delete_manager_report(report_id):
             if 0 <= index < len(reports):
                 removed = reports.pop(index)
                 save_manager_reports(reports)
-                print(f"[📊 MANAGER] Deleted report {index}")
+                logger.info("Deleted manager report", index=index)
                 return jsonify({"status": "ok", "removed": removed})
             else:
                 return jsonify({"error": "Report not found"}), 404
         except ValueError:
             return jsonify({"error": "Invalid report ID"}), 400
     except Exception as e:
-        print(f"[💥 API] Error deleting manager report: {e}")
+        logger.exception("Error deleting manager report")
         return jsonify({"error": str(e)}), 500
 
 # --- DREAM LOGGING FUNCTIONS ---
@@ -822,8 +1235,8 @@ def load_dreams():
             with open(DREAMS_FILE, 'r', encoding='utf-8') as f:
                 return json.load(f)
         return []
-    except Exception as e:
-        print(f"[💥 DREAMS] Error loading dreams: {e}")
+    except Exception:
+        logger.exception("Error loading dreams")
         return []
 
 def save_dreams(dreams):
@@ -832,8 +1245,8 @@ def save_dreams(dreams):
         with open(DREAMS_FILE, 'w', encoding='utf-8') as f:
             json.dump(dreams, f, indent=2, ensure_ascii=False)
         return True
-    except Exception as e:
-        print(f"[💥 DREAMS] Error saving dreams: {e}")
+    except Exception:
+        logger.exception("Error saving dreams")
         return False
 
 def extract_keywords(text, min_word_length=3):
@@ -934,7 +1347,7 @@ def get_dreams():
         
         return jsonify(dreams)
     except Exception as e:
-        print(f"[💥 API] Error getting dreams: {e}")
+        logger.exception("Error getting dreams")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/dreams', methods=['POST'])
@@ -962,10 +1375,10 @@ def create_dream():
         dreams.append(new_dream)
         save_dreams(dreams)
         
-        print(f"[✨ DREAMS] Created new dream: {new_dream['title']}")
+        logger.info("Created dream", id=new_dream['id'], title=new_dream['title'])
         return jsonify(new_dream), 201
     except Exception as e:
-        print(f"[💥 API] Error creating dream: {e}")
+        logger.exception("Error creating dream")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/dreams/<int:dream_id>', methods=['PUT'])
@@ -996,10 +1409,10 @@ def update_dream(dream_id):
         
         save_dreams(dreams)
         
-        print(f"[✏️ DREAMS] Updated dream {dream_id}")
+        logger.info("Updated dream", id=dream_id)
         return jsonify(dreams[dream_index])
     except Exception as e:
-        print(f"[💥 API] Error updating dream: {e}")
+        logger.exception("Error updating dream")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/dreams/<int:dream_id>', methods=['DELETE'])
@@ -1016,10 +1429,10 @@ def delete_dream(dream_id):
         removed = dreams.pop(dream_index)
         save_dreams(dreams)
         
-        print(f"[🗑️ DREAMS] Deleted dream {dream_id}")
+        logger.info("Deleted dream", id=dream_id)
         return jsonify({"status": "ok", "removed": removed})
     except Exception as e:
-        print(f"[💥 API] Error deleting dream: {e}")
+        logger.exception("Error deleting dream")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/dreams/stats', methods=['GET'])
@@ -1030,32 +1443,29 @@ def get_dream_stats():
         stats = calculate_dream_stats(dreams)
         return jsonify(stats)
     except Exception as e:
-        print(f"[💥 API] Error getting dream stats: {e}")
+        logger.exception("Error getting dream stats")
         return jsonify({"error": str(e)}), 500
 
 # Explicit route for hospitality (React Router will handle it)
 @app.route('/hospitality')
 def serve_hospitality():
     """Serve hospitality-specific HTML with correct manifest"""
-    print(f"[🌐 ROUTE] Hospitality route hit!")
     try:
         # Try to serve hospitality.html first (for PWA)
         hospitality_html = os.path.join(app.static_folder, 'hospitality.html')
         if os.path.exists(hospitality_html):
-            print(f"[🌐 ROUTE] Serving hospitality.html")
             return send_from_directory(app.static_folder, 'hospitality.html')
         else:
-            print(f"[🌐 ROUTE] hospitality.html not found, serving index.html")
+            logger.debug("hospitality.html not found, serving index.html")
             return send_from_directory(app.static_folder, 'index.html')
     except Exception as e:
-        print(f"[🌐 ROUTE] Error: {e}")
+        logger.exception("Error serving hospitality page")
         return jsonify({"error": str(e)}), 500
 
 # Service Worker route (must be at root for proper scope)
 @app.route('/service-worker.js')
 def serve_service_worker():
     """Serve service worker with correct MIME type and no caching"""
-    print(f"[🌐 ROUTE] Service worker requested")
     try:
         response = send_from_directory(app.static_folder, 'service-worker.js')
         response.headers['Content-Type'] = 'application/javascript'
@@ -1063,18 +1473,17 @@ def serve_service_worker():
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         return response
     except Exception as e:
-        print(f"[🌐 ROUTE] Service worker error: {e}")
+        logger.error("Service worker not served", error=str(e))
         return jsonify({"error": "Service worker not found"}), 404
 
 # Explicit route for dreams (let React Router handle it)
 @app.route('/dreams')
 def serve_dreams():
     """Serve main index.html - React Router will handle the /dreams route"""
-    print(f"[🌐 ROUTE] Dreams route hit - serving index.html for React Router")
     try:
         return send_from_directory(app.static_folder, 'index.html')
     except Exception as e:
-        print(f"[🌐 ROUTE] Error: {e}")
+        logger.exception("Error serving dreams page")
         return jsonify({"error": str(e)}), 500
 
 # Catch-all route for React app (must be last!)
@@ -1082,10 +1491,8 @@ def serve_dreams():
 @app.route('/<path:path>')
 def serve_react(path):
     """Serve React app for all non-API routes"""
-    print(f"[🌐 ROUTE] Requested path: '{path}'")
-    print(f"[🌐 ROUTE] Static folder: {app.static_folder}")
-    print(f"[🌐 ROUTE] Static folder exists: {os.path.exists(app.static_folder)}")
-    
+    logger.debug("Serving React route", path=path, sample=100)
+
     # Skip API routes
     if path.startswith('api/'):
         return jsonify({"error": "Not found"}), 404
@@ -1093,21 +1500,16 @@ def serve_react(path):
     # Serve static files (CSS, JS, images, etc.)
     static_file_path = os.path.join(app.static_folder, path)
     if path != "" and os.path.exists(static_file_path):
-        print(f"[🌐 ROUTE] Serving static file: {path}")
         return send_from_directory(app.static_folder, path)
     
     # For all other routes (including /hospitality), serve index.html
     # This allows React Router to handle client-side routing
     try:
         index_path = os.path.join(app.static_folder, 'index.html')
-        print(f"[🌐 ROUTE] Checking index.html at: {index_path}")
-        print(f"[🌐 ROUTE] Index exists: {os.path.exists(index_path)}")
-        
         if os.path.exists(index_path):
-            print(f"[🌐 ROUTE] ✅ Serving index.html for path: {path}")
             return send_from_directory(app.static_folder, 'index.html')
         else:
-            print(f"[🌐 ROUTE] ❌ Index.html not found!")
+            logger.error("index.html not found", index_path=index_path)
             return jsonify({
                 "error": "Build folder not found",
                 "static_folder": app.static_folder,
@@ -1117,9 +1519,8 @@ def serve_react(path):
                 "build_contents": os.listdir(app.static_folder) if os.path.exists(app.static_folder) else "folder not found"
             }), 500
     except Exception as e:
-        print(f"[🌐 ROUTE] ❌ Exception: {e}")
+        logger.exception("Error serving React app", path=path)
         import traceback
-        traceback.print_exc()
         return jsonify({
             "error": "Error serving React app",
             "static_folder": app.static_folder,
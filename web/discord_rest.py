@@ -0,0 +1,171 @@
+"""
+Discord REST client for the dashboard API
+Keeps one pooled keep-alive session, caches read-only listings for a short TTL,
+and tracks Discord's per-route rate-limit buckets so requests wait for a bucket
+to reset instead of failing with 429.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Parameters that give a route its own rate limit (Discord's "major parameters")
+MAJOR_PARAMS = ("channel_id", "guild_id", "webhook_id")
+
+
+class TTLCache:
+    """Small thread-safe cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item and item[0] > time.monotonic():
+                self.hits += 1
+                return item[1]
+            self._data.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RateLimitBucket:
+    """Remaining requests and reset time for one Discord rate-limit bucket"""
+
+    def __init__(self):
+        self.limit = 1
+        self.remaining = 1
+        self.reset_at = 0.0
+
+
+class DiscordRestClient:
+    """Thread-safe Discord REST client shared by all request handlers"""
+
+    def __init__(self, base_url, token, max_retries=3, pool_size=20):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": f"Bot {token}", "Content-Type": "application/json"})
+        self._lock = threading.Lock()
+        self._route_buckets = {}  # route -> bucket hash reported by Discord
+        self._buckets = {}        # (bucket hash or route, major params) -> RateLimitBucket
+        self._global_reset = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="discord-rest")
+
+    def _bucket_key(self, route, params):
+        major = tuple(str(params[p]) for p in MAJOR_PARAMS if p in params)
+        return (self._route_buckets.get(route, route), major)
+
+    def _acquire(self, route, params):
+        """Block until the route's bucket (and the global limit) allows a request"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._global_reset - now
+                bucket = self._buckets.get(self._bucket_key(route, params))
+                if bucket:
+                    if bucket.reset_at <= now:
+                        bucket.remaining = bucket.limit
+                    if bucket.remaining <= 0:
+                        wait = max(wait, bucket.reset_at - now)
+                if wait <= 0:
+                    if bucket:
+                        bucket.remaining -= 1
+                    return
+            time.sleep(wait)
+
+    def _update(self, route, params, response):
+        """Record the rate-limit headers Discord returned for a route"""
+        headers = response.headers
+        with self._lock:
+            bucket_hash = headers.get("X-RateLimit-Bucket")
+            if bucket_hash:
+                self._route_buckets[route] = bucket_hash
+            if "X-RateLimit-Remaining" not in headers:
+                return
+            key = self._bucket_key(route, params)
+            bucket = self._buckets.setdefault(key, RateLimitBucket())
+            try:
+                bucket.limit = int(headers.get("X-RateLimit-Limit", bucket.limit))
+                bucket.remaining = int(headers["X-RateLimit-Remaining"])
+                bucket.reset_at = time.monotonic() + float(headers.get("X-RateLimit-Reset-After", 0))
+            except ValueError:
+                pass
+
+    def _retry_after(self, response):
+        """Seconds to wait after a 429, and whether the limit is global"""
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        retry_after = body.get("retry_after") or response.headers.get("Retry-After") or 1
+        is_global = bool(body.get("global")) or response.headers.get("X-RateLimit-Global") == "true"
+        return float(retry_after), is_global
+
+    def request(self, method, route, **kwargs):
+        """Send a request to a route such as "/channels/{channel_id}/messages".
+        Path parameters are passed as `route_params`; everything else goes to requests."""
+        params = kwargs.pop("route_params", {})
+        timeout = kwargs.pop("timeout", 15)
+        route_key = f"{method} {route}"
+        url = self.base_url + route.format(**params)
+        for attempt in range(self.max_retries + 1):
+            self._acquire(route_key, params)
+            response = self.session.request(method, url, timeout=timeout, **kwargs)
+            self._update(route_key, params, response)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            retry_after, is_global = self._retry_after(response)
+            if is_global:
+                with self._lock:
+                    self._global_reset = time.monotonic() + retry_after
+            else:
+                with self._lock:
+                    bucket = self._buckets.setdefault(self._bucket_key(route_key, params), RateLimitBucket())
+                    bucket.remaining = 0
+                    bucket.reset_at = time.monotonic() + retry_after
+        return response
+
+    def run_batch(self, jobs):
+        """Run many requests concurrently and yield (key, response, error) as each finishes.
+        Each job is (key, method, route, kwargs). Jobs sharing a rate-limit bucket run
+        one after another on the same worker so they queue on the bucket rather than
+        tying up several threads; different buckets run in parallel."""
+        groups = {}
+        for job in jobs:
+            key, method, route, kwargs = job
+            with self._lock:
+                bucket_key = self._bucket_key(f"{method} {route}", kwargs.get("route_params", {}))
+            groups.setdefault(bucket_key, []).append(job)
+
+        results = queue.Queue()
+
+        def run_group(group):
+            for key, method, route, kwargs in group:
+                try:
+                    results.put((key, self.request(method, route, **dict(kwargs)), None))
+                except Exception as e:
+                    results.put((key, None, e))
+
+        for group in groups.values():
+            self._executor.submit(run_group, group)
+        for _ in range(len(jobs)):
+            yield results.get()
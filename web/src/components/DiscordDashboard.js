@@ -33,6 +33,8 @@ function DiscordDashboard({ darkMode, setDarkMode }) {
   const [logContent, setLogContent] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
   const [searchResults, setSearchResults] = useState([]);
+  const [searchCursor, setSearchCursor] = useState(null);
+  const [loadingSearchPage, setLoadingSearchPage] = useState(false);
   const [, setStats] = useState(null);
   const [enhancedStats, setEnhancedStats] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -289,11 +291,25 @@ function DiscordDashboard({ darkMode, setDarkMode }) {
     try {
       const res = await axios.post('/api/search', { term: searchTerm, max_results: 200 });
       setSearchResults(res.data.results);
+      setSearchCursor(res.data.next_cursor || null);
       setDisplayCount(50);
     } catch (e) { console.error('Error searching:', e); }
     finally { setLoading(false); }
   };
 
+  // Search results come a page at a time; the cursor fetches the next page
+  const fetchMoreSearchResults = async () => {
+    if (!searchCursor || loadingSearchPage) return;
+    setLoadingSearchPage(true);
+    try {
+      const res = await axios.post('/api/search', { cursor: searchCursor, max_results: 200 });
+      setSearchResults(prev => [...prev, ...res.data.results]);
+      setSearchCursor(res.data.next_cursor || null);
+      setDisplayCount(prev => prev + res.data.results.length);
+    } catch (e) { console.error('Error loading more search results:', e); }
+    finally { setLoadingSearchPage(false); }
+  };
+
   const handleDownload = async (filename) => {
     try {
       const res = await axios.get(`/api/logs/${filename}/download`, { responseType: 'blob' });
@@ -383,6 +399,9 @@ function DiscordDashboard({ darkMode, setDarkMode }) {
     const { scrollTop, scrollHeight, clientHeight } = el;
     // Track if user is near the bottom (within 150px)
     isNearBottomRef.current = scrollHeight - scrollTop - clientHeight < 150;
+    if (isNearBottomRef.current && activeTab === 'search' && searchCursor) {
+      fetchMoreSearchResults();
+    }
     // Load more displayed messages when scrolling near the top
     if (scrollTop < 300 && !loading) {
       if (hasMore) {
@@ -583,7 +602,7 @@ function DiscordDashboard({ darkMode, setDarkMode }) {
         </div>
 
         <div className="dc-stats-section">
-          <h3><Clock size={16} /> Hourly Activity (UTC)</h3>
+          <h3><Clock size={16} /> Hourly Activity (local time)</h3>
           <div className="dc-activity-chart">
             {s.hourly_activity?.map((h) => {
               const max = Math.max(...s.hourly_activity.map(x => x.count), 1);
@@ -777,6 +796,8 @@ function DiscordDashboard({ darkMode, setDarkMode }) {
                     {!loadingHistory && !hasMore && !historyHasMore && activeTab === 'live' && <div className="dc-loading-more" style={{color:'#4e5058'}}>Beginning of message history</div>}
                     <div className="dc-msg-count">{allFiltered.length.toLocaleString()} messages {hasActiveFilters ? '(filtered)' : ''}</div>
                     {displayedData.map((entry, i) => renderMessage(entry, i))}
+                    {activeTab === 'search' && loadingSearchPage && <div className="dc-loading-more"><RefreshCw className="spin" size={14} /> Loading more results...</div>}
+                    {activeTab === 'search' && !loadingSearchPage && searchCursor && <div className="dc-loading-more">Scroll down for more results...</div>}
                     <div ref={messagesEndRef} />
                   </>
                 )}